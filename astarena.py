@@ -0,0 +1,246 @@
+# astarena.py - AST em arrays paralelos (arena), com nós identificados por inteiros
+from array import array
+
+from nodekinds import NODE_TYPES, NODE_KIND, K_OTHER
+
+# Sem filho / sem irmão seguinte
+NO_NODE = -1
+
+# Os filhos None (ramo vazio de um if, corpo vazio de um while) ocupam uma
+# posição com este código; os restantes nós da arena têm sempre um tipo conhecido
+NONE_KIND = K_OTHER
+
+
+class ASTArena:
+    """Árvore sintática guardada em colunas.
+
+    Cada nó é um índice nos arrays paralelos kinds (código do tipo),
+    values (posição na tabela de valores), lines, starts e ends (intervalo
+    no texto, NO_NODE quando não existe), first_child e next_sibling; a
+    raiz é o nó 0. Os valores escalares iguais (nomes,
+    números, operadores) ficam guardados uma só vez na tabela de valores.
+
+    A arena não cria um objeto por nó e é serializada com pickle de uma só
+    vez. NodeView dá acesso a um nó com a interface do ASTNode (type, kind,
+    children, value, line, start, end, set_child), pelo que semantic.py,
+    codegen.py, constfold.py e dataflow.py percorrem e alteram a arena sem
+    alterações. As colunas symbols e expr_types guardam as anotações da
+    análise semântica (from_tree e to_tree não as copiam).
+    """
+    __slots__ = ('kinds', 'values', 'lines', 'starts', 'ends', 'first_child', 'next_sibling',
+                 'value_table', 'symbols', 'expr_types')
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.values = array('I')
+        self.lines = array('I')
+        self.starts = array('i')
+        self.ends = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.value_table = [None]  # A posição 0 é o valor None
+        self.symbols = []
+        self.expr_types = []
+
+    @classmethod
+    def from_tree(cls, root):
+        """Copia uma árvore de ASTNode para uma nova arena (percurso iterativo)."""
+        arena = cls()
+        if root is None:
+            return arena
+        value_slots = {}  # (classe do valor, valor) -> posição na tabela de valores
+        arena.copy_children([(root, arena.add_node(root, value_slots))], value_slots)
+        return arena
+
+    def copy_children(self, stack, value_slots):
+        """Acrescenta e liga os descendentes dos pares (ASTNode, índice) da pilha."""
+        while stack:
+            node, index = stack.pop()
+            previous = NO_NODE
+            for child in node.children:
+                child_index = self.add_node(child, value_slots)
+                if child is not None and child.children:
+                    stack.append((child, child_index))
+                if previous == NO_NODE:
+                    self.first_child[index] = child_index
+                else:
+                    self.next_sibling[previous] = child_index
+                previous = child_index
+
+    def add_node(self, node, value_slots):
+        """Acrescenta um nó (sem ligar os filhos) e devolve o seu índice."""
+        index = len(self.kinds)
+        self.kinds.append(NONE_KIND)
+        self.values.append(0)
+        self.lines.append(0)
+        self.starts.append(NO_NODE)
+        self.ends.append(NO_NODE)
+        self.first_child.append(NO_NODE)
+        self.next_sibling.append(NO_NODE)
+        self.symbols.append(None)
+        self.expr_types.append(None)
+        self.write_node(index, node, value_slots)
+        return index
+
+    def write_node(self, index, node, value_slots):
+        """Escreve os campos de um ASTNode (ou None) na posição indicada, sem filhos."""
+        if node is None:
+            kind, value, line = NONE_KIND, 0, 0
+            start = end = NO_NODE
+        else:
+            kind = NODE_KIND.get(node.type)
+            if kind is None:
+                raise ValueError(f"Tipo de nó sem código: {node.type}")
+            value, line = self.value_slot(node.value, value_slots), node.line
+            start = NO_NODE if node.start is None else node.start
+            end = NO_NODE if node.end is None else node.end
+        self.kinds[index] = kind
+        self.values[index] = value
+        self.lines[index] = line
+        self.starts[index] = start
+        self.ends[index] = end
+        self.first_child[index] = NO_NODE
+
+    def value_slot(self, value, value_slots):
+        """Posição do valor na tabela (partilhada entre valores escalares iguais)."""
+        if value is None:
+            return 0
+        if isinstance(value, list):  # Listas (id_list, limites de arrays) não são partilhadas
+            self.value_table.append(value)
+            return len(self.value_table) - 1
+        key = (value.__class__, value)
+        slot = value_slots.get(key)
+        if slot is None:
+            slot = value_slots[key] = len(self.value_table)
+            self.value_table.append(value)
+        return slot
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def root(self):
+        return self.view(0) if self.kinds else None
+
+    def view(self, index):
+        if self.kinds[index] == NONE_KIND:
+            return None
+        return NodeView(self, index)
+
+    @staticmethod
+    def position(offset):
+        return None if offset == NO_NODE else offset
+
+    def child_indexes(self, index):
+        """Índices dos filhos de um nó, por ordem."""
+        result = []
+        child = self.first_child[index]
+        next_sibling = self.next_sibling
+        while child != NO_NODE:
+            result.append(child)
+            child = next_sibling[child]
+        return result
+
+    def set_child(self, index, position, node):
+        """Substitui o filho na posição indicada pela cópia de um ASTNode (None retira-o).
+
+        O filho novo fica com o índice do antigo; os seus descendentes são
+        acrescentados no fim das colunas (continuam depois do pai) e os do
+        antigo deixam de estar ligados à árvore.
+        """
+        child = self.child_indexes(index)[position]
+        value_slots = {}
+        self.write_node(child, node, value_slots)
+        # As anotações do nó novo (o tipo de um literal dobrado) passam para a arena
+        self.symbols[child] = node and node.symbol
+        self.expr_types[child] = node and node.expr_type
+        if node is not None and node.children:
+            self.copy_children([(node, child)], value_slots)
+
+    def to_tree(self):
+        """Reconstrói a árvore de ASTNode equivalente."""
+        from parser import ASTNode
+        if not self.kinds:
+            return None
+        # Os filhos têm sempre índices maiores do que o pai: construindo do fim
+        # para o início, os filhos de cada nó já existem quando ele é criado
+        nodes = [None] * len(self.kinds)
+        for index in range(len(self.kinds) - 1, -1, -1):
+            kind = self.kinds[index]
+            if kind == NONE_KIND:
+                continue
+            children = [nodes[child] for child in self.child_indexes(index)]
+            node = ASTNode(NODE_TYPES[kind], children or None, self.value_table[self.values[index]])
+            node.line = self.lines[index]
+            node.start, node.end = self.position(self.starts[index]), self.position(self.ends[index])
+            nodes[index] = node
+        return nodes[0]
+
+
+class NodeView:
+    """Nó de uma ASTArena com a interface do ASTNode (children é só de leitura)."""
+    __slots__ = ('arena', 'index')
+
+    def __init__(self, arena, index):
+        self.arena = arena
+        self.index = index
+
+    @property
+    def kind(self):
+        return self.arena.kinds[self.index]
+
+    @property
+    def type(self):
+        return NODE_TYPES[self.arena.kinds[self.index]]
+
+    @property
+    def value(self):
+        return self.arena.value_table[self.arena.values[self.index]]
+
+    @property
+    def line(self):
+        return self.arena.lines[self.index]
+
+    @property
+    def start(self):
+        return ASTArena.position(self.arena.starts[self.index])
+
+    @property
+    def end(self):
+        return ASTArena.position(self.arena.ends[self.index])
+
+    @property
+    def symbol(self):
+        return self.arena.symbols[self.index]
+
+    @symbol.setter
+    def symbol(self, symbol):
+        self.arena.symbols[self.index] = symbol
+
+    @property
+    def expr_type(self):
+        return self.arena.expr_types[self.index]
+
+    @expr_type.setter
+    def expr_type(self, expr_type):
+        self.arena.expr_types[self.index] = expr_type
+
+    @property
+    def children(self):
+        """Filhos, num tuplo só de leitura: as substituições passam por set_child."""
+        arena = self.arena
+        return tuple([arena.view(child) for child in arena.child_indexes(self.index)])
+
+    def set_child(self, index, child):
+        """Substitui o filho na posição indicada por um ASTNode (None retira-o)."""
+        self.arena.set_child(self.index, index, child)
+
+    def __eq__(self, other):
+        return (isinstance(other, NodeView) and other.arena is self.arena
+                and other.index == self.index)
+
+    def __hash__(self):
+        return hash((id(self.arena), self.index))
+
+    def __repr__(self):
+        return f"NodeView({self.type}, {self.value}, {len(self.children)} children)"
@@ -0,0 +1,64 @@
+# astwalk.py - Percursos da AST com pilha explícita (sem recursão em Python)
+
+
+def preorder(root, depth=0):
+    """Gera os nós da árvore em pré-ordem, como pares (nó, profundidade).
+
+    Os filhos None (por exemplo o ramo de um if vazio) são ignorados.
+    """
+    stack = [(root, depth)]
+    while stack:
+        node, depth = stack.pop()
+        if node is None:
+            continue
+        yield node, depth
+        children = node.children
+        if children:
+            depth += 1
+            stack.extend([(child, depth) for child in reversed(children)])
+
+
+def subtree_nodes(root):
+    """Nós da subárvore, em largura (None nas posições dos filhos None)."""
+    nodes = [root]
+    for node in nodes:
+        if node is not None:
+            nodes.extend(node.children)
+    return nodes
+
+
+def walk(root, pre=None, post=None):
+    """Percorre a árvore em profundidade e devolve o resultado da raiz.
+
+    pre(node) é chamado ao entrar num nó e devolve a sequência de nós a
+    visitar a seguir (por omissão, node.children). Se devolver None, o nó
+    não é visitado mais: post não é chamado e o seu resultado é None.
+
+    post(node, results) é chamado depois de visitados esses nós, com a
+    lista dos respetivos resultados (pela mesma ordem); o valor devolvido
+    é o resultado do nó.
+
+    A profundidade da árvore fica limitada pela memória e não pelo limite
+    de recursão do interpretador.
+    """
+    values = []  # Resultados dos nós já visitados
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.__class__ is tuple:
+            # Saída de um nó: os resultados dos filhos estão no topo de values
+            node, mark = node
+            results = values[mark:]
+            del values[mark:]
+            values.append(post(node, results) if post is not None else None)
+            continue
+        if node is None:
+            values.append(None)
+            continue
+        children = pre(node) if pre is not None else node.children
+        if children is None:
+            values.append(None)
+            continue
+        stack.append((node, len(values)))
+        stack.extend(reversed(children))
+    return values[0] if values else None
@@ -1,4 +1,56 @@
-from symboltable import SymbolTable
+from astwalk import walk
+from symboltable import SymbolTable, GLOBAL, LOCAL
+from nodekinds import dispatch_table
+from typesystem import ArrayType, REAL, STRING, type_of
+
+# Mapa de operadores estendido para reconhecer todos os formatos possíveis
+# (construído uma única vez, e não a cada operação binária)
+OP_MAP = {
+    # Aritméticos
+    'PLUS': 'add',
+    '+': 'add',
+    'MINUS': 'sub', 
+    '-': 'sub',
+    'TIMES': 'mul',
+    '*': 'mul',
+    'DIVIDE': 'div',
+    '/': 'div',
+    'DIV': 'div',
+    'MOD': 'mod',
+    '%': 'mod',
+
+    # Comparação
+    'EQ': 'equal',
+    '=': 'equal',
+    'NEQ': 'equal\nnot',
+    '<>': 'equal\nnot',
+    'LT': 'inf',
+    '<': 'inf',
+    'GT': 'sup',
+    '>': 'sup',
+    'LTE': 'infeq',
+    '<=': 'infeq',
+    'GTE': 'supeq',
+    '>=': 'supeq',
+
+    # Lógicos
+    'AND': 'and',
+    'OR': 'or',
+    'NOT': 'not'
+}
+
+# Instrução de escrita de cada tipo de expressão (inteiros, booleanos e
+# caracteres de strings são escritos com writei)
+WRITE_INSTRUCTIONS = {
+    STRING: 'writes',
+    REAL: 'writef',
+}
+
+# Valor inicial das variáveis globais de cada tipo (inteiros e booleanos começam a 0)
+INITIAL_VALUES = {
+    REAL: 'pushf 0.0',
+    STRING: 'pushs ""',
+}
 
 class CodeGenerator:
     def __init__(self, symbol_table):
@@ -6,12 +58,10 @@ class CodeGenerator:
         self.code = []
         self.label_counter = 0
         self.current_function = None
-        self.global_vars = {}  # Mapeia nome da variável para índice global
-        self.local_vars = {}   # Mapeia nome da variável para índice local (por função)
-        self.function_vars = {}  # Mapeia função -> {var_name: offset}
+        self.current_symbol = None  # Symbol do subprograma atual (o seu nome designa o valor de retorno)
         self.var_counter = 0   # Contador para variáveis globais
-        self.functions = {}    # Mapeia nome da função para informações
         self.scope_stack = ["global"]  # Pilha de escopos
+        self.symbol_stack = [None]     # Symbols dos subprogramas da pilha de escopos
         
     def generate(self, ast):
         """Gera código EWVM a partir da AST."""
@@ -43,65 +93,82 @@ class CodeGenerator:
             print(f"Erro: Nó raiz não é um programa")
             return []
     
-    def enter_function_scope(self, function_name):
+    def enter_function_scope(self, function_name, symbol=None):
         """Entra no escopo de uma função."""
         self.scope_stack.append(function_name)
+        self.symbol_stack.append(symbol)
         self.current_function = function_name
-        self.function_vars[function_name] = {}
+        self.current_symbol = symbol
 
     def exit_function_scope(self):
         """Sai do escopo de uma função."""
         if len(self.scope_stack) > 1:
             self.scope_stack.pop()
+            self.symbol_stack.pop()
             self.current_function = self.scope_stack[-1] if len(self.scope_stack) > 1 else None
+            self.current_symbol = self.symbol_stack[-1]
             
     def is_in_function(self):
         """Verifica se está dentro de uma função."""
         return self.current_function is not None and self.current_function != "global"
     
+    def is_return_value(self, symbol):
+        """Verifica se o símbolo é o nome do subprograma atual (o seu valor de retorno)."""
+        return self.is_in_function() and symbol is not None and symbol is self.current_symbol
+    
+    def load_variable(self, symbol, var_name):
+        """Empilha o valor de uma variável, na posição atribuída pela análise semântica."""
+        self.code.append(self.load_instruction(symbol, var_name))
+    
+    def store_variable(self, symbol, var_name):
+        """Guarda o topo da pilha numa variável, na posição atribuída pela análise semântica."""
+        self.code.append(self.store_instruction(symbol, var_name))
+    
+    @staticmethod
+    def load_instruction(symbol, var_name):
+        if symbol is None or symbol.storage is None:
+            return f"// Erro: variável {var_name} não encontrada"
+        storage, address = symbol.storage
+        return f"pushl {address}" if storage == LOCAL else f"pushg {address}"
+    
+    @staticmethod
+    def store_instruction(symbol, var_name):
+        if symbol is None or symbol.storage is None:
+            return f"// Erro: variável {var_name} não encontrada"
+        storage, address = symbol.storage
+        return f"storel {address}" if storage == LOCAL else f"storeg {address}"
+    
+    def emit_element_offset(self, array_type):
+        """Converte o índice no topo da pilha na distância ao início do array."""
+        if array_type.__class__ is not ArrayType:
+            return
+        if array_type.start != 0:  # Se não começa em 0
+            self.code.append(f"pushi {array_type.start}")
+            self.code.append("sub")  # índice_real = i - start_idx
+        if array_type.stride != 1:  # Elementos com mais de uma posição
+            self.code.append(f"pushi {array_type.stride}")
+            self.code.append("mul")
+    
+    @staticmethod
+    def label_name(call_node):
+        """Rótulo do subprograma chamado: o nome com a grafia da declaração."""
+        symbol = call_node.symbol
+        return call_node.value if symbol is None else symbol.name
+    
+    @staticmethod
+    def global_address(symbol):
+        """Índice na pilha global de uma variável global (None nos restantes casos)."""
+        if symbol is not None and symbol.storage is not None and symbol.storage[0] == GLOBAL:
+            return symbol.storage[1]
+        return None
+    
     def declare_global_variables(self, declarations_node):
         """Declara variáveis globais e processa declarações de funções."""
         if declarations_node is None or declarations_node.type != 'declarations':
             return
         
         # Primeiro passo: declara variáveis globais
-        for declaration in declarations_node.children:
-            if declaration.type == 'var_declaration':
-                for var_item in declaration.children:
-                    id_list_node = var_item.children[0]
-                    type_node = var_item.children[1]
-                    
-                    for var_name in id_list_node.value:
-                        # Mapeia a variável para um índice global
-                        self.global_vars[var_name] = self.var_counter
-                        
-                        # Inicializa a variável com valor padrão
-                        if type_node.type == 'array_type':
-                            # Para arrays, inicializa cada elemento
-                            start_idx = type_node.value[0]
-                            end_idx = type_node.value[1]
-                            size = end_idx - start_idx + 1
-                            
-                            self.code.append(f"// Declaração do array {var_name}[{start_idx}..{end_idx}]")
-                            for i in range(size):
-                                self.code.append("pushi 0")
-                                self.var_counter += 1
-                        else:
-                            # Variável simples - inicializa com valor padrão
-                            self.code.append(f"// Declaração da variável {var_name}")
-                            if type_node.value == 'real':
-                                self.code.append("pushf 0.0")
-                            elif type_node.value == 'boolean':
-                                self.code.append("pushi 0")  # false = 0
-                            elif type_node.value == 'string':
-                                self.code.append('pushs ""')
-                            else:  # integer
-                                self.code.append("pushi 0")
-                            
-                            self.var_counter += 1
-    
-        if self.var_counter > 0:
-            self.code.append("")
+        self.declare_global_variables_only(declarations_node)
         
         # Segundo passo: gera código para funções
         for declaration in declarations_node.children:
@@ -120,38 +187,21 @@ class CodeGenerator:
             if declaration.type == 'var_declaration':
                 for var_item in declaration.children:
                     id_list_node = var_item.children[0]
-                    type_node = var_item.children[1]
+                    var_type = type_of(var_item.children[1])
                     
                     for var_name in id_list_node.value:
-                        # Mapeia a variável para um índice global
-                        self.global_vars[var_name] = self.var_counter
-                        
                         # Inicializa a variável com valor padrão
-                        if type_node.type == 'array_type':
-                            # Para arrays, inicializa cada elemento
-                            start_idx = type_node.value[0]
-                            end_idx = type_node.value[1]
-                            size = end_idx - start_idx + 1
-                            
-                            self.code.append(f"// Declaração do array {var_name}[{start_idx}..{end_idx}]")
-                            for i in range(size):
+                        if var_type.__class__ is ArrayType:
+                            # Para arrays, inicializa cada posição ocupada pelos elementos
+                            self.code.append(f"// Declaração do array {var_name}[{var_type.start}..{var_type.end}]")
+                            for i in range(var_type.size):
                                 self.code.append("pushi 0")
-                                self.var_counter += 1
                         else:
                             # Variável simples - inicializa com valor padrão apropriado
+                            # (as strings começam com uma referência para uma string vazia no heap)
                             self.code.append(f"// Declaração da variável {var_name}")
-                            if type_node.value == 'real':
-                                self.code.append("pushf 0.0")
-                            elif type_node.value == 'boolean':
-                                self.code.append("pushi 0")  # false = 0
-                            elif type_node.value == 'string':
-                                # Para strings, cria uma string vazia no heap
-                                # Isto cria uma referência de string que é armazenada na variável
-                                self.code.append('pushs ""')
-                            else:  # integer
-                                self.code.append("pushi 0")
-                            
-                            self.var_counter += 1
+                            self.code.append(INITIAL_VALUES.get(var_type, "pushi 0"))
+                        self.var_counter += var_type.size
 
         if self.var_counter > 0:
             self.code.append("")
@@ -173,32 +223,33 @@ class CodeGenerator:
         if compound_node.type != 'compound_statement':
             return
         
-        for statement in compound_node.children:
-            self.generate_statement(statement)
+        self.generate_statement(compound_node)
     
     def generate_statement(self, statement_node):
-        """Gera código para um comando."""
-        if statement_node is None:
-            return
-        
-        if statement_node.type == 'assignment':
-            self.generate_assignment(statement_node)
-        elif statement_node.type == 'compound_statement':
-            self.generate_compound_statement(statement_node)
-        elif statement_node.type == 'if_statement':
-            self.generate_if_statement(statement_node)
-        elif statement_node.type == 'while_statement':
-            self.generate_while_statement(statement_node)
-        elif statement_node.type == 'for_statement':
-            self.generate_for_statement(statement_node)
-        elif statement_node.type == 'write_statement':
-            self.generate_write_statement(statement_node)
-        elif statement_node.type == 'read_statement':
-            self.generate_read_statement(statement_node)
-        elif statement_node.type == 'procedure_call':
-            self.generate_procedure_call(statement_node)
-        elif statement_node.type == 'function_call':
-            self.generate_function_call(statement_node)
+        """Gera código para um comando e para os comandos nele aninhados.
+
+        Os comandos aninhados ficam numa pilha explícita (a profundidade dos
+        blocos não está limitada pela recursão): cada tratador gera o código
+        que os precede e devolve o que vem a seguir, por ordem — comandos
+        (ASTNode, ou None se vazios) e linhas de código (str) a emitir entre
+        eles e depois deles.
+        """
+        code = self.code
+        pending = [statement_node]
+        while pending:
+            item = pending.pop()
+            if item is None:
+                continue
+            if item.__class__ is str:
+                code.append(item)
+                continue
+            following = self.STATEMENT_HANDLERS[item.kind](self, item)
+            if following:
+                pending.extend(reversed(following))
+    
+    def nested_statements(self, compound_node):
+        """Comandos de um bloco (tratador do compound_statement aninhado)."""
+        return compound_node.children
     
     def generate_assignment(self, assignment_node):
         """Gera código para uma atribuição."""
@@ -222,43 +273,26 @@ class CodeGenerator:
             var_name = var_node.value
             
             # Verifica se é uma atribuição de retorno de função
-            if (self.is_in_function() and var_name == self.current_function):
+            if self.is_return_value(var_node.symbol):
                 # Atribuição de valor de retorno - armazena em variável local especial
                 # Usamos offset 0 para o valor de retorno
                 self.code.append("storel 0")
                 self.code.append("// Valor de retorno armazenado")
                 return
             
-            # Verifica se é uma variável local da função atual
-            if (self.is_in_function() and 
-                self.current_function in self.function_vars and 
-                var_name in self.function_vars[self.current_function]):
-                
-                offset = self.function_vars[self.current_function][var_name]
-                self.code.append(f"storel {offset}")
-            
-            # Senão, é uma variável global
-            elif var_name in self.global_vars:
-                var_index = self.global_vars[var_name]
-                self.code.append(f"storeg {var_index}")
-            else:
-                self.code.append(f"// Erro: variável {var_name} não encontrada")
+            # Variável local (ou parâmetro) da função atual, ou variável global
+            self.store_variable(var_node.symbol, var_name)
                 
         elif var_node.type == 'array_access':
             # Para arrays, precisa calcular o índice
-            array_name = var_node.value
-            if array_name in self.global_vars:
-                base_index = self.global_vars[array_name]
+            array_symbol = var_node.symbol
+            base_index = self.global_address(array_symbol)
+            if base_index is not None:
                 # Gera código para o índice do array
                 self.generate_expression(var_node.children[0])
                 
                 # CORREÇÃO: Subtrai o índice inicial do array
-                array_symbol = self.symbol_table.lookup(array_name)
-                if array_symbol and array_symbol.array_dims:
-                    start_idx = array_symbol.array_dims[0]
-                    if start_idx != 0:  # Se não começa em 0
-                        self.code.append(f"pushi {start_idx}")
-                        self.code.append("sub")  # índice_real = i - start_idx
+                self.emit_element_offset(array_symbol.type)
                 
                 # Adiciona o índice base
                 self.code.append(f"pushi {base_index}")
@@ -295,21 +329,10 @@ class CodeGenerator:
         # Salta para else se falso (condição = 0)
         self.code.append(f"jz {else_label}")
         
-        # Código do bloco then
-        self.generate_statement(then_node)
-        self.code.append(f"jump {end_label}")
-        
-        # Label do else
-        self.code.append(f"{else_label}:")
-        
-        # Código do bloco else (se existir)
-        if len(if_node.children) > 2:
-            else_node = if_node.children[2]
-            self.generate_statement(else_node)
-        
-        # Label do fim
-        self.code.append(f"{end_label}:")
-        self.code.append("")
+        # Bloco then, label do else, bloco else (se existir) e label do fim
+        else_node = if_node.children[2] if len(if_node.children) > 2 else None
+        return (then_node, f"jump {end_label}", f"{else_label}:",
+                else_node, f"{end_label}:", "")
     
     def generate_while_statement(self, while_node):
         """Gera código para um comando while."""
@@ -330,16 +353,8 @@ class CodeGenerator:
         # Salta para o fim se falso
         self.code.append(f"jz {end_label}")
         
-        # Código do corpo do loop
-        self.generate_statement(body_node)
-        
-        # Volta para o início
-        self.code.append(f"jump {start_label}")
-        
-        # Label do fim
-        self.code.append(f"{end_label}:")
-        self.code.append("// Fim do ciclo while")
-        self.code.append("")
+        # Corpo do loop, regresso ao início e label do fim
+        return (body_node, f"jump {start_label}", f"{end_label}:", "// Fim do ciclo while", "")
 
     def generate_for_statement(self, for_node):
         """Gera código para um comando for."""
@@ -357,35 +372,15 @@ class CodeGenerator:
         # Inicializa a variável de controle
         self.generate_expression(start_expr)
         
-        # CORREÇÃO: Verifica se é uma variável local ou global
-        if (self.is_in_function() and 
-            self.current_function in self.function_vars and 
-            var_name in self.function_vars[self.current_function]):
-            
-            # Variável local
-            offset = self.function_vars[self.current_function][var_name]
-            self.code.append(f"storel {offset}")
-        else:
-            # Variável global
-            var_index = self.global_vars[var_name]
-            self.code.append(f"storeg {var_index}")
+        # Variável de controle local ou global, conforme a análise semântica
+        self.store_variable(for_node.symbol, var_name)
         
         # Início do loop
         self.code.append(f"{start_label}:")
         
         # Verifica a condição de parada
         # Carrega o valor da variável de controle
-        if (self.is_in_function() and 
-            self.current_function in self.function_vars and 
-            var_name in self.function_vars[self.current_function]):
-            
-            # Variável local
-            offset = self.function_vars[self.current_function][var_name]
-            self.code.append(f"pushl {offset}")
-        else:
-            # Variável global
-            var_index = self.global_vars[var_name]
-            self.code.append(f"pushg {var_index}")
+        self.load_variable(for_node.symbol, var_name)
         
         # Gera código para o valor final
         self.generate_expression(end_expr)
@@ -399,49 +394,16 @@ class CodeGenerator:
             self.code.append("supeq")  # i >= n?
             self.code.append(f"jz {end_label}")  # Se i >= n é falso (i < n), sai do loop
         
-        # Corpo do loop
-        self.generate_statement(body_node)
-        
-        # Incrementa/decrementa a variável de controle
-        # Carrega o valor atual
-        if (self.is_in_function() and 
-            self.current_function in self.function_vars and 
-            var_name in self.function_vars[self.current_function]):
-            
-            # Variável local
-            offset = self.function_vars[self.current_function][var_name]
-            self.code.append(f"pushl {offset}")
-        else:
-            # Variável global
-            var_index = self.global_vars[var_name]
-            self.code.append(f"pushg {var_index}")
-        
-        # Incrementa/decrementa
-        self.code.append("pushi 1")
-        if direction == 'to':
-            self.code.append("add")
-        else:
-            self.code.append("sub")
-        
-        # Armazena o novo valor
-        if (self.is_in_function() and 
-            self.current_function in self.function_vars and 
-            var_name in self.function_vars[self.current_function]):
-            
-            # Variável local
-            offset = self.function_vars[self.current_function][var_name]
-            self.code.append(f"storel {offset}")
-        else:
-            # Variável global
-            var_index = self.global_vars[var_name]
-            self.code.append(f"storeg {var_index}")
-        
-        # Volta para o início do loop
-        self.code.append(f"jump {start_label}")
-        
-        # Fim do loop
-        self.code.append(f"{end_label}:")
-        self.code.append("")
+        # Corpo do loop; depois incrementa/decrementa a variável de controle
+        # (carrega, soma ou subtrai 1, armazena) e volta para o início do loop
+        return (body_node,
+                self.load_instruction(for_node.symbol, var_name),
+                "pushi 1",
+                "add" if direction == 'to' else "sub",
+                self.store_instruction(for_node.symbol, var_name),
+                f"jump {start_label}",
+                f"{end_label}:",
+                "")
     
     def generate_write_statement(self, write_node):
         """Gera código para write/writeln."""
@@ -458,47 +420,8 @@ class CodeGenerator:
         for expr_node in expr_list_node.children:
             self.generate_expression(expr_node)
             
-            # Determina o tipo da expressão para escolher a instrução correta
-            if expr_node.type == 'string':
-                self.code.append("writes")
-            elif expr_node.type == 'number':
-                if isinstance(expr_node.value, float):
-                    self.code.append("writef")
-                else:
-                    self.code.append("writei")
-            elif expr_node.type == 'variable':
-                # Verifica o tipo da variável na tabela de símbolos
-                var_symbol = self.symbol_table.lookup(expr_node.value)
-                if var_symbol and var_symbol.type == 'string':
-                    # Para variáveis string, usa writes diretamente
-                    self.code.append("writes")
-                elif var_symbol and var_symbol.type == 'real':
-                    self.code.append("writef")
-                elif var_symbol and var_symbol.type == 'boolean':
-                    self.code.append("writei")  # Booleanos são escritos como inteiros
-                else:
-                    self.code.append("writei")  # Default para inteiros
-            elif expr_node.type == 'function_call':
-                # Para chamadas de função, verifica o tipo de retorno
-                func_symbol = self.symbol_table.lookup(expr_node.value)
-                if func_symbol and func_symbol.type == 'string':
-                    self.code.append("writes")
-                elif func_symbol and func_symbol.type == 'real':
-                    self.code.append("writef")
-                else:
-                    self.code.append("writei")
-            elif expr_node.type == 'array_access':
-                # Para acesso a arrays, verifica o tipo base
-                array_name = expr_node.value
-                array_symbol = self.symbol_table.lookup(array_name)
-                if array_symbol and array_symbol.type == 'string':
-                    # Acesso a caractere de string retorna código ASCII (inteiro)
-                    self.code.append("writei")
-                else:
-                    self.code.append("writei")  # Arrays normalmente são inteiros
-            else:
-                # Para outras expressões, assume inteiro por padrão
-                self.code.append("writei")
+            # Instrução de escrita conforme o tipo registado pela análise semântica
+            self.code.append(WRITE_INSTRUCTIONS.get(expr_node.expr_type, "writei"))
 
         # Se for writeln, adiciona quebra de linha
         if write_node.value.upper() == 'WRITELN':
@@ -521,33 +444,22 @@ class CodeGenerator:
                 self.code.append("read")
                 
                 # Verifica o tipo da variável para converter corretamente
-                var_symbol = self.symbol_table.lookup(var_name)
-                if var_symbol and var_symbol.type == 'string':
+                var_symbol = var_node.symbol
+                if var_symbol and var_symbol.type is STRING:
                     # Para strings, não converte - o read já retorna uma referência de string
                     pass
                 else:
                     # Para números, converte para inteiro
                     self.code.append("atoi")
                 
-                # Armazena o valor lido na variável
-                if (self.is_in_function() and 
-                    self.current_function in self.function_vars and 
-                    var_name in self.function_vars[self.current_function]):
-                    
-                    # Variável local
-                    offset = self.function_vars[self.current_function][var_name]
-                    self.code.append(f"storel {offset}")
-                else:
-                    # Variável global
-                    var_index = self.global_vars[var_name]
-                    self.code.append(f"storeg {var_index}")
+                # Armazena o valor lido na variável (local ou global)
+                self.store_variable(var_symbol, var_name)
         
             elif var_node.type == 'array_access':
                 # Para arrays, precisa calcular o endereço e armazenar
-                array_name = var_node.value
-                if array_name in self.global_vars:
-                    base_index = self.global_vars[array_name]
-                    
+                array_symbol = var_node.symbol
+                base_index = self.global_address(array_symbol)
+                if base_index is not None:
                     # Calcula o endereço do array PRIMEIRO
                     self.code.append("pushgp")  # Endereço base da pilha global
                     self.code.append(f"pushi {base_index}")  # Índice base do array
@@ -558,12 +470,7 @@ class CodeGenerator:
                     
                     # CORREÇÃO: Subtrai o índice inicial do array
                     # Para array[1..5], quando i=1, índice real = 1-1 = 0
-                    array_symbol = self.symbol_table.lookup(array_name)
-                    if array_symbol and array_symbol.array_dims:
-                        start_idx = array_symbol.array_dims[0]
-                        if start_idx != 0:  # Se não começa em 0
-                            self.code.append(f"pushi {start_idx}")
-                            self.code.append("sub")  # índice_real = i - start_idx
+                    self.emit_element_offset(array_symbol.type)
                     
                     self.code.append("padd")  # Endereço final
 
@@ -577,259 +484,231 @@ class CodeGenerator:
         self.code.append("")
     
     def generate_expression(self, expr_node):
-        """Gera código para uma expressão."""
-        if expr_node is None:
-            return
-        
-        if expr_node.type == 'number':
-            # Constante numérica
-            if isinstance(expr_node.value, int):
-                self.code.append(f"pushi {expr_node.value}")
-            else:
-                self.code.append(f"pushf {expr_node.value}")
-        
-        elif expr_node.type == 'string':
-            # Constante string - processa o valor corretamente
-            string_value = expr_node.value
-            
-            # Remove todas as aspas duplas do início e fim se existirem
-            while string_value.startswith('"'):
-                string_value = string_value[1:]
-            while string_value.endswith('"'):
-                string_value = string_value[:-1]
-            
-            # Remove aspas simples se existirem (para caracteres literais)
-            while string_value.startswith("'"):
-                string_value = string_value[1:]
-            while string_value.endswith("'"):
-                string_value = string_value[:-1]
-            
-            # Processa escape sequences se necessário
-            # Em Pascal, aspas duplas dentro de strings são representadas como ""
-            # Converte "" para " na string final
-            string_value = string_value.replace('""', '"')
-            
-            # CORREÇÃO: Se for um caractere literal (comprimento 1), gera o código ASCII
-            if len(string_value) == 1:
-                # Para caracteres literais, empilha o código ASCII
-                ascii_code = ord(string_value)
-                self.code.append(f"pushi {ascii_code}")
-                self.code.append(f"// Caractere literal '{string_value}' (ASCII {ascii_code})")
-            else:
-                # Para strings normais, gera a instrução EWVM com aspas duplas
-                self.code.append(f'pushs "{string_value}"')
-        
-        elif expr_node.type == 'boolean':
-            # Constante booleana
-            value = 1 if expr_node.value.lower() == 'true' else 0
-            self.code.append(f"pushi {value}")
+        """Gera código para uma expressão.
         
-        elif expr_node.type == 'variable':
-            # Variável
-            var_name = expr_node.value
-            
-            # CORREÇÃO: Verifica se é uma referência ao valor de retorno da função atual
-            if (self.is_in_function() and var_name == self.current_function):
-                # Em Pascal, referenciar o nome da função dentro dela mesma acessa o valor de retorno
-                # Como não temos uma forma direta de acessar isso em EWVM, 
-                # assumimos que é sempre verdadeiro (1) para condições booleanas
-                self.code.append("pushi 1")
-                self.code.append(f"// Referência ao valor de retorno da função {var_name}")
-            
-            # Verifica se é uma variável local da função atual
-            elif (self.is_in_function() and 
-                self.current_function in self.function_vars and 
-                var_name in self.function_vars[self.current_function]):
-                
-                offset = self.function_vars[self.current_function][var_name]
-                self.code.append(f"pushl {offset}")
+        A expressão é percorrida com uma pilha explícita: enter_expression
+        emite o código que precede as subexpressões e devolve as que devem
+        ser geradas; leave_expression emite o código que vem depois delas.
+        """
+        walk(expr_node, self.enter_expression, self.leave_expression)
+    
+    def enter_expression(self, expr_node):
+        """Código emitido à entrada de um nó; devolve as subexpressões a gerar."""
+        return self.ENTER_EXPRESSION[expr_node.kind](self, expr_node)
+    
+    def leave_expression(self, expr_node, results):
+        """Código emitido depois das subexpressões de um nó."""
+        self.LEAVE_EXPRESSION[expr_node.kind](self, expr_node, results)
+    
+    def enter_number(self, expr_node):
+        # Constante numérica
+        if isinstance(expr_node.value, int):
+            self.code.append(f"pushi {expr_node.value}")
+        else:
+            self.code.append(f"pushf {expr_node.value}")
+        return ()
+    
+    def enter_string(self, expr_node):
+        # Constante string - processa o valor corretamente
+        string_value = expr_node.value
 
-            # Senão, é uma variável global
-            elif var_name in self.global_vars:
-                var_index = self.global_vars[var_name]
-                self.code.append(f"pushg {var_index}")
-            else:
-                self.code.append(f"// Erro: variável {var_name} não encontrada")
-        
-        elif expr_node.type == 'function_call':
-            # Chamada de função
-            self.generate_function_call(expr_node)
-        
-        elif expr_node.type == 'array_access':
-            # Acesso a array
-            array_name = expr_node.value
-            
-            self.code.append(f"// Acesso a array/string: {array_name}")
-            
-            # Verifica se é uma string (acesso a caractere)
-            array_symbol = self.symbol_table.lookup(array_name)
-            if array_symbol and array_symbol.type == 'string':
-                self.code.append(f"// Acesso a caractere da string {array_name}")
-                
-                # Carrega o endereço da string
-                if (self.is_in_function() and 
-                    self.current_function in self.function_vars and 
-                    array_name in self.function_vars[self.current_function]):
-                    
-                    # Variável local ou parâmetro
-                    offset = self.function_vars[self.current_function][array_name]
-                    self.code.append(f"pushl {offset}")
-                elif array_name in self.global_vars:
-                    # Variável global
-                    self.code.append(f"pushg {self.global_vars[array_name]}")
-                else:
-                    # Se não encontrou, assume que é o primeiro parâmetro
-                    self.code.append(f"pushl -1")
-                
-                # Gera código para o índice
-                self.generate_expression(expr_node.children[0])
-                
-                # CORREÇÃO CRUCIAL: Ajustar índice de Pascal (1-based) para EWVM (0-based)
-                self.code.append("pushi 1")
-                self.code.append("sub")  # índice_ewvm = índice_pascal - 1
-                self.code.append("charat")  # Obtém o código do caractere no índice
-            else:
-                # Para arrays normais
-                if array_name in self.global_vars:
-                    base_index = self.global_vars[array_name]
-                    # Empilha o endereço base da pilha global
-                    self.code.append("pushgp")
-                    # Empilha o índice base do array
-                    self.code.append(f"pushi {base_index}")
-                    # Calcula endereço base + índice base
-                    self.code.append("padd")
-                    # Gera código para o índice do array
-                    self.generate_expression(expr_node.children[0])
-                    
-                    # CORREÇÃO: Subtrai o índice inicial do array
-                    if array_symbol and array_symbol.array_dims:
-                        start_idx = array_symbol.array_dims[0]
-                        if start_idx != 0:  # Se não começa em 0
-                            self.code.append(f"pushi {start_idx}")
-                            self.code.append("sub")  # índice_real = i - start_idx
-                    
-                    # Calcula endereço final
-                    self.code.append("padd")
-                    # Carrega o valor do endereço final
-                    self.code.append("load 0")
-        
-        elif expr_node.type == 'length_call':
-            # Função length() para strings
-            arg_node = expr_node.children[0]
-            
-            # CORREÇÃO: Precisamos garantir que uma referência de string esteja no topo da pilha
-            if arg_node.type == 'variable':
-                var_name = arg_node.value
-                var_symbol = self.symbol_table.lookup(var_name)
-                
-                # Verifica se é uma variável local da função atual
-                if (self.is_in_function() and 
-                    self.current_function in self.function_vars and 
-                    var_name in self.function_vars[self.current_function]):
-                    
-                    offset = self.function_vars[self.current_function][var_name]
-                    self.code.append(f"pushl {offset}")  # Carrega a referência da string
-                else:
-                    # Variável global
-                    self.code.append(f"pushg {self.global_vars[var_name]}")  # Carrega a referência da string
-            else:
-                # Para outros tipos de expressões, geramos o código normalmente
-                # Isso deve deixar uma referência de string no topo da pilha
-                self.generate_expression(arg_node)
-            
-            # Agora que temos certeza que uma referência de string está no topo da pilha, chamamos strlen
-            self.code.append("strlen")
-        
-        elif expr_node.type == 'binary_op':
-            # Operação binária
-            left_node = expr_node.children[0]
-            right_node = expr_node.children[1]
-            operator = expr_node.value
-            
-            # Debug: mostra qual operação está sendo processada
-            self.code.append(f"// Operação binária: {operator}")
-            
-            # Gera código para os operandos (ordem importante para a pilha)
-            self.generate_expression(left_node)
-            self.generate_expression(right_node)
-            
-            # Mapa de operadores estendido para reconhecer todos os formatos possíveis
-            op_map = {
-                # Aritméticos
-                'PLUS': 'add',
-                '+': 'add',
-                'MINUS': 'sub', 
-                '-': 'sub',
-                'TIMES': 'mul',
-                '*': 'mul',
-                'DIVIDE': 'div',
-                '/': 'div',
-                'DIV': 'div',
-                'MOD': 'mod',
-                '%': 'mod',
-                
-                # Comparação
-                'EQ': 'equal',
-                '=': 'equal',
-                'NEQ': 'equal\nnot',
-                '<>': 'equal\nnot',
-                'LT': 'inf',
-                '<': 'inf',
-                'GT': 'sup',
-                '>': 'sup',
-                'LTE': 'infeq',
-                '<=': 'infeq',
-                'GTE': 'supeq',
-                '>=': 'supeq',
-                
-                # Lógicos
-                'AND': 'and',
-                'OR': 'or',
-                'NOT': 'not'
-            }
-            
-            # Trata o operador em diferentes formatos possíveis
-            op_code = None
-            if operator in op_map:
-                op_code = op_map[operator]
-            else:
-                # Tenta converter para letras maiúsculas
-                op_upper = operator.upper()
-                if op_upper in op_map:
-                    op_code = op_map[op_upper]
-        
-            if op_code:
-                if operator == 'NEQ' or operator == '<>':
-                    self.code.append("equal")
-                    self.code.append("not")
-                else:
-                    self.code.append(op_code)
+        # Remove todas as aspas duplas do início e fim se existirem
+        while string_value.startswith('"'):
+            string_value = string_value[1:]
+        while string_value.endswith('"'):
+            string_value = string_value[:-1]
+
+        # Remove aspas simples se existirem (para caracteres literais)
+        while string_value.startswith("'"):
+            string_value = string_value[1:]
+        while string_value.endswith("'"):
+            string_value = string_value[:-1]
+
+        # Processa escape sequences se necessário
+        # Em Pascal, aspas duplas dentro de strings são representadas como ""
+        # Converte "" para " na string final
+        string_value = string_value.replace('""', '"')
+
+        # CORREÇÃO: Se for um caractere literal (comprimento 1), gera o código ASCII
+        if len(string_value) == 1:
+            # Para caracteres literais, empilha o código ASCII
+            ascii_code = ord(string_value)
+            self.code.append(f"pushi {ascii_code}")
+            self.code.append(f"// Caractere literal '{string_value}' (ASCII {ascii_code})")
+        else:
+            # Para strings normais, gera a instrução EWVM com aspas duplas
+            self.code.append(f'pushs "{string_value}"')
+        return ()
+    
+    def enter_boolean(self, expr_node):
+        # Constante booleana
+        value = 1 if expr_node.value.lower() == 'true' else 0
+        self.code.append(f"pushi {value}")
+        return ()
+    
+    def enter_variable(self, expr_node):
+        # Variável
+        var_name = expr_node.value
+
+        # CORREÇÃO: Verifica se é uma referência ao valor de retorno da função atual
+        if self.is_return_value(expr_node.symbol):
+            # Em Pascal, referenciar o nome da função dentro dela mesma acessa o valor de retorno
+            # Como não temos uma forma direta de acessar isso em EWVM, 
+            # assumimos que é sempre verdadeiro (1) para condições booleanas
+            self.code.append("pushi 1")
+            self.code.append(f"// Referência ao valor de retorno da função {var_name}")
+
+        # Variável local (ou parâmetro) da função atual, ou variável global
+        else:
+            self.load_variable(expr_node.symbol, var_name)
+        return ()
+    
+    def enter_function_call(self, expr_node):
+        # Chamada de função
+        func_name = expr_node.value
+
+        self.code.append(f"// Chamada da função {func_name}")
+
+        # Empilha argumentos na ordem correta (da esquerda para a direita)
+        if len(expr_node.children) > 0:
+            args_node = expr_node.children[0]
+            if args_node.type == 'argument_list':
+                return args_node.children
+        return ()
+    
+    def enter_array_access(self, expr_node):
+        # Acesso a array
+        array_name = expr_node.value
+
+        self.code.append(f"// Acesso a array/string: {array_name}")
+
+        # Verifica se é uma string (acesso a caractere)
+        array_symbol = expr_node.symbol
+        if array_symbol and array_symbol.type is STRING:
+            self.code.append(f"// Acesso a caractere da string {array_name}")
+
+            # Carrega o endereço da string (variável local, parâmetro ou global)
+            if array_symbol.storage is not None:
+                self.load_variable(array_symbol, array_name)
             else:
-                self.code.append(f"// ERRO: Operador '{operator}' não reconhecido")
-                # Como fallback, assume que é uma comparação > (sup)
-                if operator == '>' or operator.upper() == 'GT':
-                    self.code.append("sup")
-                # Outros operadores de comparação como fallback
-                elif operator == '<' or operator.upper() == 'LT':
-                    self.code.append("inf")
-                elif operator == '>=' or operator.upper() == 'GTE':
-                    self.code.append("supeq")
-                elif operator == '<=' or operator.upper() == 'LTE':
-                    self.code.append("infeq")
-
-        elif expr_node.type == 'unary_op':
-            # Operação unária
-            operand_node = expr_node.children[0]
-            operator = expr_node.value
-            
-            self.generate_expression(operand_node)
-            
-            if operator == 'MINUS' or operator == '-':
-                # Multiplica por -1
-                self.code.append("pushi -1")
-                self.code.append("mul")
-            elif operator == 'NOT' or operator.upper() == 'NOT':
+                # Se não encontrou, assume que é o primeiro parâmetro
+                self.code.append(f"pushl -1")
+
+            # Gera código para o índice
+            return expr_node.children
+        else:
+            # Para arrays normais
+            base_index = self.global_address(array_symbol)
+            if base_index is not None:
+                # Empilha o endereço base da pilha global
+                self.code.append("pushgp")
+                # Empilha o índice base do array
+                self.code.append(f"pushi {base_index}")
+                # Calcula endereço base + índice base
+                self.code.append("padd")
+                # Gera código para o índice do array
+                return expr_node.children
+            return None
+    
+    def enter_length_call(self, expr_node):
+        # Função length() para strings
+        arg_node = expr_node.children[0]
+
+        # CORREÇÃO: Precisamos garantir que uma referência de string esteja no topo da pilha
+        if arg_node.type == 'variable':
+            var_name = arg_node.value
+
+            # Carrega a referência da string (variável local ou global)
+            self.load_variable(arg_node.symbol, var_name)
+            return ()
+        else:
+            # Para outros tipos de expressões, geramos o código normalmente
+            # Isso deve deixar uma referência de string no topo da pilha
+            return expr_node.children
+    
+    def enter_binary_op(self, expr_node):
+        # Debug: mostra qual operação está sendo processada
+        self.code.append(f"// Operação binária: {expr_node.value}")
+
+        # Gera código para os operandos (ordem importante para a pilha)
+        return expr_node.children
+    
+    def enter_unary_op(self, expr_node):
+        return expr_node.children
+    
+    def enter_other(self, expr_node):
+        return None
+    
+    def leave_other(self, expr_node, results):
+        pass
+    
+    def leave_function_call(self, expr_node, results):
+        # Empilha o endereço da função e chama
+        self.code.append(f"pusha {self.label_name(expr_node)}")
+        self.code.append("call")
+    
+    def leave_array_access(self, expr_node, results):
+        array_symbol = expr_node.symbol
+        if array_symbol and array_symbol.type is STRING:
+            # CORREÇÃO CRUCIAL: Ajustar índice de Pascal (1-based) para EWVM (0-based)
+            self.code.append("pushi 1")
+            self.code.append("sub")  # índice_ewvm = índice_pascal - 1
+            self.code.append("charat")  # Obtém o código do caractere no índice
+        else:
+            # CORREÇÃO: Subtrai o índice inicial do array
+            if array_symbol:
+                self.emit_element_offset(array_symbol.type)
+
+            # Calcula endereço final
+            self.code.append("padd")
+            # Carrega o valor do endereço final
+            self.code.append("load 0")
+    
+    def leave_length_call(self, expr_node, results):
+        # Agora que temos certeza que uma referência de string está no topo da pilha, chamamos strlen
+        self.code.append("strlen")
+    
+    def leave_binary_op(self, expr_node, results):
+        operator = expr_node.value
+
+        # Trata o operador em diferentes formatos possíveis
+        op_code = None
+        if operator in OP_MAP:
+            op_code = OP_MAP[operator]
+        else:
+            # Tenta converter para letras maiúsculas
+            op_upper = operator.upper()
+            if op_upper in OP_MAP:
+                op_code = OP_MAP[op_upper]
+
+        if op_code:
+            if operator == 'NEQ' or operator == '<>':
+                self.code.append("equal")
                 self.code.append("not")
+            else:
+                self.code.append(op_code)
+        else:
+            self.code.append(f"// ERRO: Operador '{operator}' não reconhecido")
+            # Como fallback, assume que é uma comparação > (sup)
+            if operator == '>' or operator.upper() == 'GT':
+                self.code.append("sup")
+            # Outros operadores de comparação como fallback
+            elif operator == '<' or operator.upper() == 'LT':
+                self.code.append("inf")
+            elif operator == '>=' or operator.upper() == 'GTE':
+                self.code.append("supeq")
+            elif operator == '<=' or operator.upper() == 'LTE':
+                self.code.append("infeq")
+    
+    def leave_unary_op(self, expr_node, results):
+        operator = expr_node.value
+
+        if operator == 'MINUS' or operator == '-':
+            # Multiplica por -1
+            self.code.append("pushi -1")
+            self.code.append("mul")
+        elif operator == 'NOT' or operator.upper() == 'NOT':
+            self.code.append("not")
     
     def new_label(self, prefix="L"):
         """Gera um novo rótulo."""
@@ -849,7 +728,7 @@ class CodeGenerator:
         self.code.append(f"{function_name}:")
         
         # Entra no escopo da função
-        self.enter_function_scope(function_name)
+        self.enter_function_scope(function_name, function_node.symbol)
         
         # Processa parâmetros
         param_count = self.process_function_parameters(params_node, function_name)
@@ -889,7 +768,7 @@ class CodeGenerator:
         self.code.append(f"{procedure_name}:")
         
         # Entra no escopo do procedimento
-        self.enter_function_scope(procedure_name)
+        self.enter_function_scope(procedure_name, procedure_node.symbol)
         
         # Processa parâmetros
         param_count = self.process_function_parameters(params_node, procedure_name)
@@ -927,7 +806,7 @@ class CodeGenerator:
             id_list_node = param_node.children[0]
             param_count += len(id_list_node.value)
         
-        # Mapeia parâmetros com offsets corretos
+        # Offsets dos parâmetros (atribuídos pela análise semântica)
         current_offset = param_count
         for param_node in params_node.children:
             id_list_node = param_node.children[0]
@@ -935,7 +814,6 @@ class CodeGenerator:
             
             for param_name in id_list_node.value:
                 # Parâmetros têm offset negativo, começando do mais distante
-                self.function_vars[function_name][param_name] = -current_offset
                 self.code.append(f"// Parâmetro {param_name} no offset {-current_offset}")
                 current_offset -= 1
         
@@ -948,10 +826,6 @@ class CodeGenerator:
         
         local_var_count = 0
         
-        # Reserva offset 0 para valor de retorno da função
-        if self.current_function and self.current_function != "global":
-            self.function_vars[self.current_function]["__return__"] = 0
-        
         for declaration in declarations_node.children:
             if declaration.type == 'var_declaration':
                 for var_item in declaration.children:
@@ -959,9 +833,8 @@ class CodeGenerator:
                     type_node = var_item.children[1]
                     
                     for var_name in id_list_node.value:
-                        # Mapeia variável local para offset positivo (1, 2, 3...)
+                        # Variáveis locais têm offset positivo (1, 2, 3...)
                         # Offset 0 é reservado para valor de retorno
-                        self.function_vars[self.current_function][var_name] = local_var_count + 1
                         self.code.append(f"// Variável local {var_name} no offset {local_var_count + 1}")
                         local_var_count += 1
         
@@ -969,27 +842,7 @@ class CodeGenerator:
 
     def generate_function_call(self, call_node):
         """Gera código para chamada de função."""
-        func_name = call_node.value
-        
-        self.code.append(f"// Chamada da função {func_name}")
-        
-        # Empilha argumentos na ordem correta (da esquerda para a direita)
-        if len(call_node.children) > 0:
-            args_node = call_node.children[0]
-            if args_node.type == 'argument_list':
-                # Empilha argumentos na ordem normal (não reversa)
-                for arg_node in args_node.children:
-                    self.generate_expression(arg_node)
-        
-        # Empilha o endereço da função e chama
-        self.code.append(f"pusha {func_name}")
-        self.code.append("call")
-
-        # Para funções que retornam string, precisamos garantir que o resultado seja uma referência de string
-        func_symbol = self.symbol_table.lookup(func_name)
-        if func_symbol and func_symbol.type == 'string':
-            # Já temos uma referência de string no topo da pilha, não precisamos fazer nada
-            pass
+        self.generate_expression(call_node)
 
     def generate_procedure_call(self, call_node):
         """Gera código para chamada de procedimento."""
@@ -1006,6 +859,40 @@ class CodeGenerator:
                     self.generate_expression(arg_node)
         
         # Empilha o endereço do procedimento e chama
-        self.code.append(f"pusha {proc_name}")
+        self.code.append(f"pusha {self.label_name(call_node)}")
         self.code.append("call")
         self.code.append("")
+    
+    # ===== TABELAS DE DESPACHO (indexadas por ASTNode.kind) =====
+    
+    STATEMENT_HANDLERS = dispatch_table({
+        'assignment': generate_assignment,
+        'compound_statement': nested_statements,
+        'if_statement': generate_if_statement,
+        'while_statement': generate_while_statement,
+        'for_statement': generate_for_statement,
+        'write_statement': generate_write_statement,
+        'read_statement': generate_read_statement,
+        'procedure_call': generate_procedure_call,
+        'function_call': generate_function_call,
+    }, default=lambda self, node: None)
+    
+    ENTER_EXPRESSION = dispatch_table({
+        'number': enter_number,
+        'string': enter_string,
+        'boolean': enter_boolean,
+        'variable': enter_variable,
+        'function_call': enter_function_call,
+        'array_access': enter_array_access,
+        'length_call': enter_length_call,
+        'binary_op': enter_binary_op,
+        'unary_op': enter_unary_op,
+    }, default=enter_other)
+    
+    LEAVE_EXPRESSION = dispatch_table({
+        'function_call': leave_function_call,
+        'array_access': leave_array_access,
+        'length_call': leave_length_call,
+        'binary_op': leave_binary_op,
+        'unary_op': leave_unary_op,
+    }, default=leave_other)
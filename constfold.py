@@ -0,0 +1,176 @@
+# constfold.py - Avaliação de expressões constantes em tempo de compilação
+import operator
+
+from astwalk import walk
+from nodekinds import (K_NUMBER, K_STRING, K_BOOLEAN, K_VARIABLE, K_BINARY_OP,
+                       K_UNARY_OP, K_LENGTH_CALL)
+from parser import ASTNode
+from typesystem import INTEGER, REAL, BOOLEAN, STRING
+
+# Nós que já são literais (não são substituídos)
+LITERAL_KINDS = frozenset((K_NUMBER, K_STRING, K_BOOLEAN))
+
+# Os operadores ficam no nó com o lexema ('+', 'div', 'Mod'...); os nomes dos
+# tokens ('PLUS', 'DIV'...) também são aceites
+OPERATOR_NAMES = {
+    '+': 'PLUS', '-': 'MINUS', '*': 'TIMES', '/': 'DIVIDE',
+    '=': 'EQ', '<>': 'NEQ', '<': 'LT', '>': 'GT', '<=': 'LTE', '>=': 'GTE',
+}
+
+ARITHMETIC = {'PLUS': operator.add, 'MINUS': operator.sub, 'TIMES': operator.mul}
+
+RELATIONAL = {
+    'EQ': operator.eq, 'NEQ': operator.ne, 'LT': operator.lt,
+    'GT': operator.gt, 'LTE': operator.le, 'GTE': operator.ge,
+}
+
+# Inteiros da EWVM: um resultado fora deste intervalo é deixado para a execução
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def operator_name(op):
+    return OPERATOR_NAMES.get(op) or op.upper()
+
+
+def value_type(value):
+    """Tipo Pascal de um valor constante."""
+    if value.__class__ is bool:
+        return BOOLEAN
+    if value.__class__ is int:
+        return INTEGER
+    if value.__class__ is float:
+        return REAL
+    return STRING
+
+
+def is_number(value):
+    return value.__class__ is int or value.__class__ is float
+
+
+def truncated_div(left, right):
+    """Divisão inteira com arredondamento para zero (div do Pascal e da EWVM)."""
+    quotient = abs(left) // abs(right)
+    return quotient if (left < 0) == (right < 0) else -quotient
+
+
+def fold_binary(name, left, right):
+    """Valor de left <op> right, ou None se a operação não for avaliada aqui."""
+    if name in ARITHMETIC or name == 'DIVIDE':
+        if is_number(left) and is_number(right):
+            if name != 'DIVIDE':
+                return ARITHMETIC[name](left, right)
+            if right == 0:
+                return None  # A divisão por zero fica para a execução
+            if left.__class__ is int and right.__class__ is int:
+                return truncated_div(left, right)  # O '/' é gerado como div
+            return left / right
+        if name == 'PLUS' and left.__class__ is str and right.__class__ is str:
+            return left + right
+        return None
+    if name == 'DIV' or name == 'MOD':
+        if left.__class__ is int and right.__class__ is int and right != 0:
+            quotient = truncated_div(left, right)
+            return quotient if name == 'DIV' else left - right * quotient
+        return None
+    if name == 'AND' or name == 'OR':
+        if left.__class__ is bool and right.__class__ is bool:
+            return (left and right) if name == 'AND' else (left or right)
+        return None
+    if name in RELATIONAL:
+        if ((is_number(left) and is_number(right))
+                or (left.__class__ is str and right.__class__ is str)
+                or (left.__class__ is bool and right.__class__ is bool and name in ('EQ', 'NEQ'))):
+            return RELATIONAL[name](left, right)
+    return None
+
+
+def fold_unary(name, operand):
+    if name == 'MINUS' and is_number(operand):
+        return -operand
+    if name == 'NOT' and operand.__class__ is bool:
+        return not operand
+    return None
+
+
+def constant_value(node, values, symbol):
+    """Valor constante de um nó, dados os valores dos filhos (None se não for constante).
+
+    symbol é o símbolo de um nó variable: as constantes declaradas valem o seu valor.
+    """
+    kind = node.kind
+    if kind == K_NUMBER or kind == K_STRING:
+        return node.value
+    if kind == K_BOOLEAN:
+        return node.value.lower() == 'true'
+    if kind == K_VARIABLE:
+        if symbol is not None and symbol.kind == 'constant':
+            return symbol.value
+        return None
+    if kind == K_BINARY_OP:
+        left, right = values
+        if left is None or right is None:
+            return None
+        value = fold_binary(operator_name(node.value), left, right)
+    elif kind == K_UNARY_OP:
+        if values[0] is None:
+            return None
+        value = fold_unary(operator_name(node.value), values[0])
+    elif kind == K_LENGTH_CALL:
+        return len(values[0]) if values[0].__class__ is str else None
+    else:
+        return None
+    if value.__class__ is int and not INT_MIN <= value <= INT_MAX:
+        return None
+    return value
+
+
+def evaluate_constant(expr_node, lookup):
+    """Avalia uma expressão constante; devolve o valor ou None.
+
+    lookup(nome) devolve o símbolo de um nome (as referências a constantes
+    já declaradas são avaliadas).
+    """
+    def leave(node, values):
+        return constant_value(node, values, lookup(node.value) if node.kind == K_VARIABLE else None)
+    return walk(expr_node, post=leave)
+
+
+def literal_node(node, value):
+    """Nó literal com o valor constante, no lugar do nó indicado."""
+    if value.__class__ is bool:
+        literal = ASTNode('boolean', value='true' if value else 'false')
+    elif value.__class__ is str:
+        literal = ASTNode('string', value=value)
+    else:
+        literal = ASTNode('number', value=value)
+    literal.line = node.line
+    literal.start, literal.end = node.start, node.end
+    literal.expr_type = value_type(value)
+    return literal
+
+
+def fold_constants(ast):
+    """Substitui as subexpressões constantes da árvore por literais.
+
+    Deve ser chamada depois da análise semântica: as referências a
+    constantes são reconhecidas pelo símbolo anotado nos nós variable.
+    Cada subexpressão constante máxima dá lugar a um único literal, pelo
+    que o código gerado empilha o valor em vez de o calcular. Devolve o
+    número de subexpressões substituídas.
+    """
+    folded = 0
+
+    def leave(node, values):
+        nonlocal folded
+        value = constant_value(node, values, node.symbol if node.kind == K_VARIABLE else None)
+        if value is None:
+            children = node.children
+            for index, child_value in enumerate(values):
+                if child_value is not None and children[index].kind not in LITERAL_KINDS:
+                    node.set_child(index, literal_node(children[index], child_value))
+                    folded += 1
+        return value
+
+    if ast is not None:
+        walk(ast, post=leave)
+    return folded
@@ -0,0 +1,486 @@
+# dataflow.py - Análise de fluxo de dados: variáveis vivas e cadeias definição-uso
+#
+# Cada rotina (o bloco principal e cada função ou procedimento) dá um grafo
+# de fluxo com um nó por comando simples (atribuição, leitura, escrita,
+# chamada) e pelas condições e passos dos if, while e for. Os conjuntos de
+# variáveis e de definições são inteiros usados como conjuntos de bits,
+# resolvidos por um único algoritmo de ponto fixo (solve). Depois da
+# análise semântica, com os nomes já anotados com o Symbol:
+#   - variable_warnings avisa das variáveis nunca usadas ou nunca lidas;
+#   - remove_dead_stores retira da árvore as atribuições a variáveis que já
+#     não são lidas (não chegam a gerar o storeg/storel).
+from collections import deque
+
+from nodekinds import K_VARIABLE, K_ARRAY_ACCESS, K_FUNCTION_CALL, dispatch_table
+
+# Símbolos seguidos pela análise (o nome de uma função, dentro dela, é o valor de retorno)
+VARIABLE_KINDS = frozenset(('variable', 'parameter'))
+
+# Conjunto partilhado pelos nós sem símbolos lidos ou escritos (o conjunto de
+# cada nó só é criado no primeiro símbolo: menos objetos para o coletor de lixo)
+NO_SYMBOLS = frozenset()
+
+
+def bit_indexes(mask):
+    """Posições dos bits a 1 de um conjunto de bits."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def solve(nodes, transfer, backward):
+    """Ponto fixo de um problema de fluxo de dados com reunião por união.
+
+    transfer(nó, entrada) devolve a saída do nó; a entrada é a união das
+    saídas dos sucessores (problema para trás, backward=True) ou dos
+    predecessores (para a frente). Devolve as listas (entradas, saídas)
+    indexadas por node.index.
+    """
+    inputs = [0] * len(nodes)
+    outputs = [0] * len(nodes)
+    pending = deque(nodes)
+    queued = [True] * len(nodes)
+    while pending:
+        node = pending.popleft()
+        queued[node.index] = False
+        sources, targets = ((node.successors, node.predecessors) if backward
+                            else (node.predecessors, node.successors))
+        value = 0
+        for source in sources:
+            value |= outputs[source.index]
+        inputs[node.index] = value
+        value = transfer(node, value)
+        if value != outputs[node.index]:
+            outputs[node.index] = value
+            for target in targets:
+                if not queued[target.index]:
+                    queued[target.index] = True
+                    pending.append(target)
+    return inputs, outputs
+
+
+class FlowNode:
+    """Nó do grafo de fluxo: um comando simples, ou a condição ou passo de um comando composto.
+
+    reads são os símbolos lidos pelo próprio comando, kills os que recebem
+    um valor novo, weak os que podem mudar sem perder o valor anterior
+    (elementos de arrays) e calls os subprogramas chamados. slot (nó pai,
+    posição) diz onde está o comando na árvore, para o poder retirar.
+    """
+    __slots__ = ('index', 'statement', 'slot', 'reads', 'kills', 'weak', 'calls',
+                 'uses', 'kill_mask', 'successors', 'predecessors')
+
+    def __init__(self, index, statement, slot=None):
+        self.index = index
+        self.statement = statement
+        self.slot = slot
+        self.reads = NO_SYMBOLS
+        self.kills = NO_SYMBOLS
+        self.weak = NO_SYMBOLS
+        self.calls = ()
+        self.uses = 0       # Bits das variáveis lidas (com as lidas pelos subprogramas chamados)
+        self.kill_mask = 0  # Bits das variáveis que recebem um valor novo
+        self.successors = []
+        self.predecessors = []
+
+    def add_read(self, symbol):
+        if not self.reads:
+            self.reads = set()
+        self.reads.add(symbol)
+
+    def add_kill(self, symbol):
+        if not self.kills:
+            self.kills = set()
+        self.kills.add(symbol)
+
+    def add_weak(self, symbol):
+        if not self.weak:
+            self.weak = set()
+        self.weak.add(symbol)
+
+    def add_call(self, symbol):
+        if not self.calls:
+            self.calls = []
+        self.calls.append(symbol)
+
+    def __repr__(self):
+        statement = self.statement.type if self.statement is not None else None
+        return f"FlowNode({self.index}, {statement})"
+
+
+class Routine:
+    """Grafo de fluxo do bloco principal (symbol None) ou de um subprograma.
+
+    Depois de solve_liveness, live_in e live_out têm as variáveis vivas
+    antes e depois de cada nó; as cadeias definição-uso são calculadas
+    só quando pedidas (def_use_chains). O nó entry define todas as
+    variáveis (valor inicial ou argumento) e o nó exit lê as que continuam
+    a ser visíveis depois da rotina.
+    """
+
+    def __init__(self, symbol, scope_name, body):
+        self.symbol = symbol
+        self.scope_name = scope_name  # Nome do escopo das variáveis locais (Symbol.scope)
+        self.nodes = []
+        self.entries = {}             # Comando -> primeiro nó do grafo que lhe corresponde
+        self.exit = self.new_node(None)
+        first = self.build(body, self.exit)
+        self.entry = self.new_node(None)
+        self.entry.successors.append(first)
+        for node in self.nodes:
+            for successor in node.successors:
+                successor.predecessors.append(node)
+        self.variables = []           # Símbolos seguidos, pela posição do bit
+        self.bits = {}                # Símbolo -> bit
+        self.summaries = {}           # Subprograma -> (lidos, escritos) não locais
+        self.live_in = self.live_out = None
+        self.chains = None            # (definições, usos de cada uma), calculadas uma vez
+
+    def new_node(self, statement, successors=(), slot=None):
+        node = FlowNode(len(self.nodes), statement, slot)
+        node.successors.extend(successors)
+        self.nodes.append(node)
+        return node
+
+    # ===== CONSTRUÇÃO DO GRAFO =====
+
+    def build(self, statement, follow, slot=None):
+        """Cria os nós do comando, seguidos de follow; devolve o nó de entrada.
+
+        Os construtores dos comandos compostos são geradores: pedem os nós
+        de cada comando aninhado com yield (comando, follow, slot) e recebem
+        o seu nó de entrada. Os pedidos pendentes ficam numa pilha explícita,
+        pelo que a profundidade dos blocos não está limitada pela recursão.
+        """
+        pending = []  # (comando, gerador do seu construtor) por concluir
+        entry = self.start_build(statement, follow, slot, pending)
+        while pending:
+            owner, builder = pending[-1]
+            try:
+                request = builder.send(entry)
+            except StopIteration as done:
+                pending.pop()
+                entry = self.entries[owner] = done.value
+                continue
+            entry = self.start_build(*request, pending)
+        return entry
+
+    def start_build(self, statement, follow, slot, pending):
+        """Constrói um comando simples (devolve a entrada) ou põe o construtor de um composto em pending."""
+        if statement is None:
+            return follow
+        builder = self.BUILDERS[statement.kind]
+        entry = builder(self, statement, follow, slot) if builder is not None else follow
+        if entry.__class__ is not FlowNode:
+            pending.append((statement, entry))
+            return None  # O gerador começa com send(None)
+        self.entries[statement] = entry
+        return entry
+
+    def build_compound(self, compound, follow, slot):
+        children = compound.children
+        for index in range(len(children) - 1, -1, -1):
+            follow = yield children[index], follow, (compound, index)
+        return follow
+
+    def build_assignment(self, assignment, follow, slot):
+        node = self.new_node(assignment, (follow,), slot)
+        target, expression = assignment.children
+        if target.type == 'array_access':
+            self.add_target(node, target, weak=True)
+            self.add_reads(node, target.children)
+        else:
+            self.add_target(node, target)
+        self.add_reads(node, (expression,))
+        return node
+
+    def build_if(self, if_node, follow, slot):
+        children = if_node.children
+        then_entry = yield children[1], follow, (if_node, 1)
+        else_entry = (yield children[2], follow, (if_node, 2)) if len(children) > 2 else follow
+        node = self.new_node(if_node, (then_entry, else_entry))
+        self.add_reads(node, children[:1])
+        return node
+
+    def build_while(self, while_node, follow, slot):
+        children = while_node.children
+        node = self.new_node(while_node)
+        body_entry = yield children[1], node, (while_node, 1)
+        node.successors.extend((body_entry, follow))
+        self.add_reads(node, children[:1])
+        return node
+
+    def build_for(self, for_node, follow, slot):
+        # Inicialização (i := início), teste (i <= fim, com o fim avaliado em cada volta) e passo
+        children = for_node.children
+        test = self.new_node(for_node)
+        step = self.new_node(for_node, (test,))
+        body_entry = yield children[2], step, (for_node, 2)
+        test.successors.extend((body_entry, follow))
+        start = self.new_node(for_node, (test,))
+        self.add_reads(start, children[:1])
+        self.add_reads(test, children[1:2])
+        if self.is_variable(for_node.symbol):
+            start.add_kill(for_node.symbol)
+            test.add_read(for_node.symbol)
+            step.add_read(for_node.symbol)
+            step.add_kill(for_node.symbol)
+        return start
+
+    def build_read(self, read_node, follow, slot):
+        node = self.new_node(read_node, (follow,), slot)
+        if read_node.children:
+            for target in read_node.children[0].children:
+                if target.type == 'array_access':
+                    self.add_target(node, target, weak=True)
+                    self.add_reads(node, target.children)
+                else:
+                    self.add_target(node, target)
+        return node
+
+    def build_simple(self, statement, follow, slot):
+        # Escrita e chamada de procedimento: só leem (e chamam)
+        node = self.new_node(statement, (follow,), slot)
+        if statement.type == 'procedure_call' and statement.symbol is not None:
+            node.add_call(statement.symbol)
+        self.add_reads(node, statement.children)
+        return node
+
+    def is_variable(self, symbol):
+        return symbol is not None and (symbol.kind in VARIABLE_KINDS or symbol is self.symbol)
+
+    def add_target(self, node, target, weak=False):
+        if self.is_variable(target.symbol):
+            if weak:
+                node.add_weak(target.symbol)
+            else:
+                node.add_kill(target.symbol)
+
+    def add_reads(self, node, expressions):
+        """Acrescenta os nomes lidos (e as funções chamadas) nas expressões."""
+        pending = list(expressions)
+        while pending:
+            child = pending.pop()
+            if child is None:
+                continue
+            kind = child.kind
+            if kind == K_VARIABLE or kind == K_ARRAY_ACCESS:
+                if self.is_variable(child.symbol):
+                    node.add_read(child.symbol)
+            elif kind == K_FUNCTION_CALL and child.symbol is not None:
+                node.add_call(child.symbol)
+            pending.extend(child.children)
+
+    BUILDERS = dispatch_table({
+        'compound_statement': build_compound,
+        'assignment': build_assignment,
+        'if_statement': build_if,
+        'while_statement': build_while,
+        'for_statement': build_for,
+        'read_statement': build_read,
+        'write_statement': build_simple,
+        'procedure_call': build_simple,
+    })
+
+    # ===== CONJUNTOS DE BITS =====
+
+    def is_local(self, symbol):
+        return symbol.scope == self.scope_name and symbol is not self.symbol
+
+    def is_shared(self, symbol):
+        """Variável de um escopo envolvente (pode ser lida ou escrita por quem chama a rotina)."""
+        return symbol.kind in VARIABLE_KINDS and symbol.scope != self.scope_name
+
+    def bit(self, symbol):
+        bit = self.bits.get(symbol)
+        if bit is None:
+            bit = self.bits[symbol] = 1 << len(self.variables)
+            self.variables.append(symbol)
+        return bit
+
+    def mask(self, symbols):
+        mask = 0
+        for symbol in symbols:
+            mask |= self.bit(symbol)
+        return mask
+
+    def symbols_in(self, mask):
+        variables = self.variables
+        return [variables[index] for index in bit_indexes(mask)]
+
+    def prepare(self, summaries):
+        """Calcula os bits de cada nó; summaries dá (lidos, escritos) por cada subprograma chamado."""
+        self.summaries = summaries
+        for node in self.nodes:
+            node.uses = self.mask(node.reads)
+            node.kill_mask = self.mask(node.kills)
+            self.mask(node.weak)
+            for callee in node.calls:
+                reads, writes = summaries.get(callee, ((), ()))
+                node.uses |= self.mask(reads)
+                self.mask(writes)
+        # À saída continuam visíveis as variáveis que não são locais (e o valor de retorno)
+        self.exit.uses = self.mask(symbol for symbol in self.variables if not self.is_local(symbol))
+
+    # ===== ANÁLISES =====
+
+    def solve_liveness(self):
+        """Variáveis vivas antes (live_in) e depois (live_out) de cada nó."""
+        def transfer(node, live):
+            return node.uses | (live & ~node.kill_mask)
+        self.live_out, self.live_in = solve(self.nodes, transfer, backward=True)
+
+    def def_use_chains(self):
+        """Cadeias definição-uso, pelas definições que chegam a cada nó.
+
+        Devolve (definitions, chains): definitions são os pares (nó, símbolo)
+        de cada definição e chains[i] os nós que podem usar o valor da
+        definição i.
+        """
+        if self.chains is not None:
+            return self.chains
+        definitions = []
+        sites = {}  # Símbolo -> bits das suas definições
+        gen = [0] * len(self.nodes)
+        for node in self.nodes:
+            written = list(node.kills) + list(node.weak)
+            for callee in node.calls:
+                written.extend(self.summaries.get(callee, ((), ()))[1])
+            if node is self.entry:
+                written = self.variables
+            for symbol in dict.fromkeys(written):
+                bit = 1 << len(definitions)
+                definitions.append((node, symbol))
+                sites[symbol] = sites.get(symbol, 0) | bit
+                gen[node.index] |= bit
+        kill = [0] * len(self.nodes)
+        for node in self.nodes:
+            for symbol in node.kills:
+                kill[node.index] |= sites[symbol] & ~gen[node.index]
+
+        def transfer(node, reaching):
+            return gen[node.index] | (reaching & ~kill[node.index])
+        reaching_in, _ = solve(self.nodes, transfer, backward=False)
+
+        uses = [[] for _ in definitions]
+        for node in self.nodes:
+            for symbol in self.symbols_in(node.uses):
+                for definition in bit_indexes(reaching_in[node.index] & sites.get(symbol, 0)):
+                    uses[definition].append(node)
+        self.chains = definitions, uses
+        return self.chains
+
+    def live_at(self, statement):
+        """Variáveis vivas antes e depois do (primeiro nó do) comando."""
+        node = self.entries[statement]
+        return self.symbols_in(self.live_in[node.index]), self.symbols_in(self.live_out[node.index])
+
+    def dead_stores(self):
+        """Atribuições a variáveis que não são lidas depois (sem chamadas na expressão)."""
+        dead = []
+        for node in self.nodes:
+            if (node.kills and not node.calls and node.statement is not None
+                    and node.statement.type == 'assignment'
+                    and not node.kill_mask & self.live_out[node.index]):
+                dead.append(node)
+        return dead
+
+
+def build_routines(ast, symbol_table):
+    """Grafos de fluxo do bloco principal e de todos os subprogramas, já resolvidos.
+
+    As chamadas leem e escrevem as variáveis não locais que o subprograma
+    chamado (ou os que ele chama) lê e escreve.
+    """
+    routines = []
+    pending = [(ast.children[0], symbol_table.root.name)]
+    routines.append(Routine(None, symbol_table.root.name, ast.children[1]))
+    while pending:
+        declarations, scope_name = pending.pop()
+        for declaration in declarations.children:
+            if declaration.type in ('function_declaration', 'procedure_declaration') and declaration.symbol is not None:
+                subprogram_scope = f"{scope_name}.{declaration.value}"
+                routines.append(Routine(declaration.symbol, subprogram_scope, declaration.children[-1]))
+                pending.append((declaration.children[-2], subprogram_scope))
+
+    summaries = subprogram_summaries(routines)
+    for routine in routines:
+        routine.prepare(summaries)
+        routine.solve_liveness()
+    return routines
+
+
+def subprogram_summaries(routines):
+    """(lidos, escritos) não locais de cada subprograma, incluindo os dos que chama (ponto fixo)."""
+    summaries = {}
+    callees = {}
+    for routine in routines:
+        if routine.symbol is None:
+            continue
+        reads, writes, called = set(), set(), set()
+        for node in routine.nodes:
+            reads.update(node.reads)
+            writes.update(node.kills)
+            writes.update(node.weak)
+            called.update(node.calls)
+        summaries[routine.symbol] = ({symbol for symbol in reads if routine.is_shared(symbol)},
+                                     {symbol for symbol in writes if routine.is_shared(symbol)})
+        callees[routine] = called
+    changed = True
+    while changed:
+        changed = False
+        for routine, called in callees.items():
+            reads, writes = summaries[routine.symbol]
+            before = len(reads), len(writes)
+            for callee in called:
+                callee_reads, callee_writes = summaries.get(callee, ((), ()))
+                reads.update(symbol for symbol in callee_reads if routine.is_shared(symbol))
+                writes.update(symbol for symbol in callee_writes if routine.is_shared(symbol))
+            changed = changed or (len(reads), len(writes)) != before
+    return summaries
+
+
+def variable_warnings(routines, symbol_table):
+    """Avisos das variáveis declaradas e nunca usadas, ou que recebem valores e nunca são lidas."""
+    read, written = set(), set()
+    for routine in routines:
+        for node in routine.nodes:
+            read.update(node.reads)
+            written.update(node.kills)
+            written.update(node.weak)
+    warnings = []
+    scopes = [symbol_table.root]
+    while scopes:
+        scope = scopes.pop(0)
+        for symbol in scope.symbols.values():
+            if symbol.kind != 'variable' or symbol in read:
+                continue
+            if symbol in written:
+                warnings.append(f"Aviso na linha {symbol.line}: Variável '{symbol.name}' recebe valores mas nunca é lida")
+            else:
+                warnings.append(f"Aviso na linha {symbol.line}: Variável '{symbol.name}' declarada mas nunca usada")
+        scopes.extend(scope.children.values())
+    return warnings
+
+
+def remove_dead_stores(routines):
+    """Retira da árvore as atribuições mortas; devolve quantas foram retiradas.
+
+    Retirar uma atribuição pode tornar mortas as que só a alimentavam: a
+    análise de cada rotina é repetida até não haver mais.
+    """
+    removed = 0
+    for routine in routines:
+        dead = routine.dead_stores()
+        while dead:
+            for node in dead:
+                parent, position = node.slot
+                parent.set_child(position, None)
+                node.statement = None
+                node.reads = node.kills = NO_SYMBOLS
+                node.uses = node.kill_mask = 0
+            removed += len(dead)
+            routine.solve_liveness()
+            dead = routine.dead_stores()
+    return removed
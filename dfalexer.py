@@ -0,0 +1,258 @@
+# dfalexer.py - Analisador léxico alternativo: autómato finito determinista escrito à mão
+import copy
+import re
+
+from ply.lex import LexToken
+
+from identifiers import identifier_key, intern_identifier
+from lexer import reserved, string_end, string_value
+
+# ===== CLASSES DE CARACTERES =====
+
+(C_OTHER, C_LETTER, C_DIGIT, C_UNDERSCORE, C_BLANK, C_NEWLINE, C_QUOTE, C_LBRACE,
+ C_LPAREN, C_RPAREN, C_STAR, C_COLON, C_LT, C_GT, C_EQ, C_DOT, C_PLUS, C_MINUS,
+ C_SLASH, C_LBRACKET, C_RBRACKET, C_COMMA, C_SEMICOLON) = range(23)
+NUM_CLASSES = 23
+
+_SINGLE_CHAR_CLASSES = {
+    ' ': C_BLANK, '\t': C_BLANK, '\r': C_BLANK, '\n': C_NEWLINE, "'": C_QUOTE,
+    '{': C_LBRACE, '(': C_LPAREN, ')': C_RPAREN, '*': C_STAR, ':': C_COLON,
+    '<': C_LT, '>': C_GT, '=': C_EQ, '.': C_DOT, '+': C_PLUS, '-': C_MINUS,
+    '/': C_SLASH, '[': C_LBRACKET, ']': C_RBRACKET, ',': C_COMMA, ';': C_SEMICOLON,
+    '_': C_UNDERSCORE,
+}
+
+def _ascii_class(code):
+    char = chr(code)
+    if char.isascii() and char.isalpha():
+        return C_LETTER
+    if char.isdigit():
+        return C_DIGIT
+    return _SINGLE_CHAR_CLASSES.get(char, C_OTHER)
+
+CHAR_CLASSES = [_ascii_class(code) for code in range(128)]
+
+# ===== ESTADOS E TRANSIÇÕES =====
+
+(S_DEAD, S_START, S_ID, S_INT, S_INT_DOT, S_REAL, S_BLANK, S_NEWLINE, S_STRING,
+ S_BRACE_COMMENT, S_LPAREN, S_PAREN_COMMENT, S_RPAREN, S_COLON, S_ASSIGN, S_LT,
+ S_LTE, S_NEQ, S_GT, S_GTE, S_EQ, S_DOT, S_DOTDOT, S_PLUS, S_MINUS, S_TIMES,
+ S_DIVIDE, S_LBRACKET, S_RBRACKET, S_COMMA, S_SEMICOLON) = range(31)
+
+_TRANSITIONS = {
+    S_START: {
+        C_LETTER: S_ID, C_DIGIT: S_INT, C_BLANK: S_BLANK, C_NEWLINE: S_NEWLINE,
+        C_QUOTE: S_STRING, C_LBRACE: S_BRACE_COMMENT, C_LPAREN: S_LPAREN,
+        C_RPAREN: S_RPAREN, C_COLON: S_COLON, C_LT: S_LT, C_GT: S_GT, C_EQ: S_EQ,
+        C_DOT: S_DOT, C_PLUS: S_PLUS, C_MINUS: S_MINUS, C_STAR: S_TIMES,
+        C_SLASH: S_DIVIDE, C_LBRACKET: S_LBRACKET, C_RBRACKET: S_RBRACKET,
+        C_COMMA: S_COMMA, C_SEMICOLON: S_SEMICOLON,
+    },
+    S_ID: {C_LETTER: S_ID, C_DIGIT: S_ID, C_UNDERSCORE: S_ID},
+    S_INT: {C_DIGIT: S_INT, C_DOT: S_INT_DOT},
+    S_INT_DOT: {C_DIGIT: S_REAL},
+    S_REAL: {C_DIGIT: S_REAL},
+    S_BLANK: {C_BLANK: S_BLANK},
+    S_NEWLINE: {C_NEWLINE: S_NEWLINE},
+    S_LPAREN: {C_STAR: S_PAREN_COMMENT},
+    S_COLON: {C_EQ: S_ASSIGN},
+    S_LT: {C_EQ: S_LTE, C_GT: S_NEQ},
+    S_GT: {C_EQ: S_GTE},
+    S_DOT: {C_DOT: S_DOTDOT},
+}
+
+# Tabela de transições: uma linha por estado, uma coluna por classe de caracteres
+TRANSITION_TABLE = [
+    [_TRANSITIONS.get(state, {}).get(cls, S_DEAD) for cls in range(NUM_CLASSES)]
+    for state in range(31)
+]
+
+# Estados com ciclo sobre si próprios: o ciclo é percorrido de uma só vez por
+# uma ER equivalente (em C), em vez de uma iteração Python por caractere.
+_SELF_LOOPS = {
+    S_ID: re.compile(r'[a-zA-Z0-9_]*'),
+    S_INT: re.compile(r'\d*'),
+    S_REAL: re.compile(r'\d*'),
+    S_BLANK: re.compile(r'[ \t\r]*'),
+    S_NEWLINE: re.compile(r'\n*'),
+}
+SELF_LOOP_TABLE = [_SELF_LOOPS[state].match if state in _SELF_LOOPS else None
+                   for state in range(31)]
+
+# Estados cujas únicas transições são o próprio ciclo: depois de o percorrer não há
+# mais nada a ler e o autómato pode parar sem consultar o caractere seguinte.
+LOOP_ONLY_STATES = [
+    state in _SELF_LOOPS and set(_TRANSITIONS[state].values()) == {state}
+    for state in range(31)
+]
+
+# Espaços e quebras de linha entre tokens (estados S_BLANK/S_NEWLINE) saltados de uma vez
+_BLANK_CHARS = frozenset(' \t\r\n')
+_SKIP_BLANKS = re.compile(r'[ \t\r\n]*').match
+
+# Ações dos estados de aceitação
+(A_NONE, A_TOKEN, A_ID, A_INTEGER, A_REAL, A_SKIP, A_NEWLINE, A_STRING,
+ A_BRACE_COMMENT, A_PAREN_COMMENT) = range(10)
+
+_ACCEPTING = {
+    S_ID: (A_ID, 'ID'), S_INT: (A_INTEGER, 'INTEGER_CONST'), S_REAL: (A_REAL, 'REAL_CONST'),
+    S_BLANK: (A_SKIP, None), S_NEWLINE: (A_NEWLINE, None), S_STRING: (A_STRING, 'STRING_CONST'),
+    S_BRACE_COMMENT: (A_BRACE_COMMENT, None), S_PAREN_COMMENT: (A_PAREN_COMMENT, None),
+    S_LPAREN: (A_TOKEN, 'LPAREN'), S_RPAREN: (A_TOKEN, 'RPAREN'), S_COLON: (A_TOKEN, 'COLON'),
+    S_ASSIGN: (A_TOKEN, 'ASSIGN'), S_LT: (A_TOKEN, 'LT'), S_LTE: (A_TOKEN, 'LTE'),
+    S_NEQ: (A_TOKEN, 'NEQ'), S_GT: (A_TOKEN, 'GT'), S_GTE: (A_TOKEN, 'GTE'),
+    S_EQ: (A_TOKEN, 'EQ'), S_DOT: (A_TOKEN, 'DOT'), S_DOTDOT: (A_TOKEN, 'DOTDOT'),
+    S_PLUS: (A_TOKEN, 'PLUS'), S_MINUS: (A_TOKEN, 'MINUS'), S_TIMES: (A_TOKEN, 'TIMES'),
+    S_DIVIDE: (A_TOKEN, 'DIVIDE'), S_LBRACKET: (A_TOKEN, 'LBRACKET'),
+    S_RBRACKET: (A_TOKEN, 'RBRACKET'), S_COMMA: (A_TOKEN, 'COMMA'),
+    S_SEMICOLON: (A_TOKEN, 'SEMICOLON'),
+}
+ACCEPT_TABLE = [_ACCEPTING.get(state, (A_NONE, None)) for state in range(31)]
+ACCEPTING_STATES = [state in _ACCEPTING for state in range(31)]
+
+# Composição das duas tabelas para caracteres ASCII (estado x caractere -> estado),
+# evitando a consulta intermédia da classe no ciclo principal. Só guarda as
+# transições para estados vivos; as restantes vão para S_DEAD.
+ASCII_TRANSITIONS = [
+    {chr(code): row[cls] for code, cls in enumerate(CHAR_CLASSES) if row[cls] != S_DEAD}
+    for row in TRANSITION_TABLE
+]
+
+
+def char_class(char):
+    """Classe de um caractere (os dígitos Unicode contam como dígitos, tal como \\d no PLY)."""
+    code = ord(char)
+    if code < 128:
+        return CHAR_CLASSES[code]
+    return C_DIGIT if char.isdecimal() else C_OTHER
+
+
+def _non_ascii_transition(state, char):
+    """Transição para caracteres fora da tabela ASCII (só os dígitos Unicode são aceites)."""
+    if char < '\x80':
+        return S_DEAD
+    return TRANSITION_TABLE[state][char_class(char)]
+
+
+class DFALexer:
+    """Analisador léxico por autómato com a mesma interface do lexer PLY.
+
+    Produz os mesmos tipos, valores e números de linha que as regras de
+    lexer.py (input(), token(), lineno, lexpos e iteração).
+    """
+
+    def __init__(self):
+        self.lexdata = ''
+        self.lexpos = 0
+        self.lexlen = 0
+        self.lineno = 1
+
+    def clone(self):
+        return copy.copy(self)
+
+    def input(self, data):
+        self.lexdata = data
+        self.lexpos = 0
+        self.lexlen = len(data)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        tok = self.token()
+        if tok is None:
+            raise StopIteration
+        return tok
+
+    def token(self):
+        """Devolve o próximo token (ou None no fim do texto)."""
+        data = self.lexdata
+        length = self.lexlen
+        pos = self.lexpos
+        ascii_transitions = ASCII_TRANSITIONS
+        start_transitions = ASCII_TRANSITIONS[S_START]
+        loops = SELF_LOOP_TABLE
+        loop_only = LOOP_ONLY_STATES
+        accepting = ACCEPTING_STATES
+
+        while pos < length:
+            char = data[pos]
+            if char in _BLANK_CHARS:
+                end = _SKIP_BLANKS(data, pos).end()
+                self.lineno += data.count('\n', pos, end)
+                pos = end
+                continue
+
+            start = pos
+            accepted = S_DEAD
+            accepted_end = pos
+            state = start_transitions.get(char, S_DEAD) or _non_ascii_transition(S_START, char)
+
+            # Percorre o autómato até não haver transição, guardando o último estado de aceitação
+            while state != S_DEAD:
+                pos += 1
+                loop = loops[state]
+                if loop is not None:
+                    pos = loop(data, pos).end()
+                if accepting[state]:
+                    accepted, accepted_end = state, pos
+                if loop_only[state] or pos >= length:
+                    break
+                char = data[pos]
+                state = ascii_transitions[state].get(char, S_DEAD) or _non_ascii_transition(state, char)
+
+            if accepted == S_DEAD:
+                print(f"Erro léxico: Caractere ilegal '{data[start]}' na linha {self.lineno}")
+                pos = start + 1
+                continue
+
+            pos = accepted_end
+            action, token_type = ACCEPT_TABLE[accepted]
+            if action == A_SKIP:
+                continue
+            if action == A_NEWLINE:
+                self.lineno += pos - start
+                continue
+            if action == A_BRACE_COMMENT or action == A_PAREN_COMMENT:
+                terminator = '}' if action == A_BRACE_COMMENT else '*)'
+                end = data.find(terminator, pos)
+                if end < 0:
+                    print(f"Erro léxico: Comentário não terminado na linha {self.lineno}")
+                    end = length
+                else:
+                    end += len(terminator)
+                self.lineno += data.count('\n', start, end)
+                pos = end
+                continue
+
+            tok = LexToken()
+            tok.lineno = self.lineno
+            tok.lexpos = start
+            lexeme = data[start:pos]
+            if action == A_ID:
+                tok.value = intern_identifier(lexeme)
+                tok.type = reserved.get(identifier_key(tok.value), 'ID')
+            elif action == A_INTEGER:
+                tok.type = token_type
+                tok.value = int(lexeme)
+            elif action == A_REAL:
+                tok.type = token_type
+                tok.value = float(lexeme)
+            elif action == A_STRING:
+                end = string_end(data, pos)
+                if end < 0:
+                    print(f"Erro léxico: String não terminada na linha {self.lineno}")
+                    continue
+                lexeme = data[start:end]
+                pos = end
+                self.lineno += lexeme.count('\n')
+                tok.type = token_type
+                tok.value = string_value(lexeme)
+            else:
+                tok.type = token_type
+                tok.value = lexeme
+            self.lexpos = pos
+            return tok
+
+        self.lexpos = pos
+        return None
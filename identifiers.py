@@ -0,0 +1,23 @@
+# identifiers.py - Chaves dos identificadores (o Pascal não distingue maiúsculas)
+import sys
+from functools import lru_cache
+
+# Grafias cujas chaves ficam guardadas (as usadas mais recentemente): o cache não
+# cresce sem limite numa sessão longa que compila muitos programas
+MAX_CACHED_NAMES = 4096
+
+
+@lru_cache(maxsize=MAX_CACHED_NAMES)
+def identifier_key(name):
+    """Chave de um identificador: a mesma para todas as grafias do nome.
+
+    É o nome em minúsculas com uma só cópia (sys.intern): como as chaves de
+    nomes iguais são o mesmo objeto, compará-las e procurá-las custa pouco.
+    As cadeias internadas são libertadas quando deixam de ser usadas.
+    """
+    return sys.intern(name.lower())
+
+
+def intern_identifier(name):
+    """Cópia única da grafia de um identificador (chamada pelo lexer)."""
+    return sys.intern(name)
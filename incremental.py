@@ -0,0 +1,110 @@
+# incremental.py - Reanálise incremental: só a declaração de topo tocada por uma edição
+from astwalk import preorder
+from lexer import make_lexer
+from parser import parse_with_diagnostics
+from rdparser import RDParser
+
+# Declarações de topo reanalisadas isoladamente (pelo método do RDParser com o mesmo nome);
+# o bloco principal (compound_statement) também o é
+UNIT_TYPES = frozenset(('function_declaration', 'procedure_declaration'))
+
+
+class TextEdit:
+    """Substituição do texto [start, end) por text (posições no texto antes da edição)."""
+    __slots__ = ('start', 'end', 'text')
+
+    def __init__(self, start, end, text):
+        self.start = start
+        self.end = end
+        self.text = text
+
+    @property
+    def delta(self):
+        """Variação do comprimento do texto."""
+        return len(self.text) - (self.end - self.start)
+
+    def apply(self, source):
+        return source[:self.start] + self.text + source[self.end:]
+
+    def __repr__(self):
+        return f"TextEdit({self.start}, {self.end}, {self.text!r})"
+
+
+def find_unit(ast, edit):
+    """Localiza a declaração de topo que contém a edição.
+
+    Devolve (lista de filhos onde está, posição na lista, início do token
+    seguinte), ou None se a edição não couber numa função, procedimento ou
+    no bloco principal. A região de cada um vai do seu primeiro token ao
+    primeiro token da construção seguinte (inclui os espaços e comentários
+    que o separam dela).
+    """
+    declarations, body = ast.children
+    units = declarations.children
+    for index, unit in enumerate(units):
+        if unit.start > edit.start:
+            return None
+        next_start = units[index + 1].start if index + 1 < len(units) else body.start
+        if edit.start < next_start:
+            if unit.type in UNIT_TYPES and edit.end <= next_start:
+                return units, index, next_start
+            return None
+    if body.start <= edit.start and edit.end <= ast.end - 1:  # Antes do '.' final
+        return ast.children, 1, ast.end - 1
+    return None
+
+
+def parse_unit(unit, source):
+    """Analisa de novo uma declaração de topo a partir da sua posição no texto.
+
+    Devolve (nó, próximo token) ou (None, None) se houver um erro sintático.
+    """
+    lexer = make_lexer()
+    lexer.input(source)
+    lexer.lexpos = unit.start
+    lexer.lineno = unit.line  # Linha do primeiro token (function, procedure ou begin)
+    parser = RDParser()
+    parser.errorfunc = lambda token: None  # Os erros são reportados pela análise completa
+    node = parser.parse_rule(unit.type, lexer)
+    return node, parser.token
+
+
+def shift(nodes, delta, line_delta):
+    """Desloca os intervalos e as linhas das árvores indicadas."""
+    for root in nodes:
+        for node, _ in preorder(root):
+            if node.start is not None:
+                node.start += delta
+                node.end += delta
+            if node.line:
+                node.line += line_delta
+
+
+def reparse(ast, source, edit, backend=None):
+    """Aplica uma edição ao texto e devolve (ast, diagnostics) do novo texto.
+
+    Se a edição cai dentro de uma função ou procedimento de topo, ou do
+    bloco principal, só essa parte é reanalisada: o novo nó substitui o
+    antigo na própria árvore ast e os intervalos e linhas dos nós seguintes
+    são deslocados. Nos restantes casos (edição nas declarações de
+    variáveis, erro sintático, a edição mudou onde a declaração acaba) é
+    feita uma análise completa do novo texto, com o parser indicado.
+    """
+    new_source = edit.apply(source)
+    location = find_unit(ast, edit) if ast is not None else None
+    if location is not None:
+        siblings, index, next_start = location
+        delta = edit.delta
+        node, next_token = parse_unit(siblings[index], new_source)
+        # O token seguinte tem de ser o mesmo de antes, na posição deslocada
+        if node is not None and next_token is not None and next_token.lexpos == next_start + delta:
+            line_delta = edit.text.count('\n') - source.count('\n', edit.start, edit.end)
+            siblings[index] = node
+            declarations, body = ast.children
+            if siblings is declarations.children:
+                shift(siblings[index + 1:] + [body], delta, line_delta)
+                declarations.start = siblings[0].start
+                declarations.end = siblings[-1].end
+            ast.end += delta
+            return ast, []
+    return parse_with_diagnostics(new_source, backend=backend)
@@ -1,4 +1,11 @@
-import ply.lex as lex
+import mmap
+from array import array
+from bisect import bisect_right
+import os
+import sys
+from ply.lex import LexToken
+from identifiers import identifier_key, intern_identifier
+from tablecache import build_lexer
 
 tokens = (
     # Palavras reservadas
@@ -18,147 +25,28 @@ tokens = (
     'LPAREN', 'RPAREN', 'LBRACKET', 'RBRACKET', 'COMMA', 'SEMICOLON', 'COLON', 'DOT', 'DOTDOT'
 )
 
-# ===== PALAVRAS RESERVADAS - Definidas com ER específicas (case-insensitive) =====
-
-def t_PROGRAM(p):
-    r'(?i)program(?![a-zA-Z0-9_])'
-    return p
-
-def t_PROCEDURE(p):
-    r'(?i)procedure(?![a-zA-Z0-9_])'
-    return p
-
-def t_FUNCTION(p):
-    r'(?i)function(?![a-zA-Z0-9_])'
-    return p
-
-def t_BEGIN(p):
-    r'(?i)begin(?![a-zA-Z0-9_])'
-    return p
-
-def t_END(p):
-    r'(?i)end(?![a-zA-Z0-9_])'
-    return p
-
-def t_CONST(p):
-    r'(?i)const(?![a-zA-Z0-9_])'
-    return p
-
-def t_TYPE(p):
-    r'(?i)type(?![a-zA-Z0-9_])'
-    return p
-
-def t_VAR(p):
-    r'(?i)var(?![a-zA-Z0-9_])'
-    return p
-
-def t_INTEGER(p):
-    r'(?i)integer(?![a-zA-Z0-9_])'
-    return p
-
-def t_REAL(p):
-    r'(?i)real(?![a-zA-Z0-9_])'
-    return p
-
-def t_BOOLEAN(p):
-    r'(?i)boolean(?![a-zA-Z0-9_])'
-    return p
-
-def t_STRING(p):
-    r'(?i)string(?![a-zA-Z0-9_])'
-    return p
-
-def t_ARRAY(p):
-    r'(?i)array(?![a-zA-Z0-9_])'
-    return p
-
-def t_OF(p):
-    r'(?i)of(?![a-zA-Z0-9_])'
-    return p
-
-def t_IF(p):
-    r'(?i)if(?![a-zA-Z0-9_])'
-    return p
-
-def t_THEN(p):
-    r'(?i)then(?![a-zA-Z0-9_])'
-    return p
-
-def t_ELSE(p):
-    r'(?i)else(?![a-zA-Z0-9_])'
-    return p
-
-def t_WHILE(p):
-    r'(?i)while(?![a-zA-Z0-9_])'
-    return p
-
-def t_DOWNTO(p):
-    r'(?i)downto(?![a-zA-Z0-9_])'
-    return p
-
-def t_DO(p):
-    r'(?i)do(?![a-zA-Z0-9_])'
-    return p
-
-def t_FOR(p):
-    r'(?i)for(?![a-zA-Z0-9_])'
-    return p
-
-def t_TO(p):
-    r'(?i)to(?![a-zA-Z0-9_])'
-    return p
-
-def t_DIV(p):
-    r'(?i)div(?![a-zA-Z0-9_])'
-    return p
-
-def t_MOD(p):
-    r'(?i)mod(?![a-zA-Z0-9_])'
-    return p
-
-def t_AND(p):
-    r'(?i)and(?![a-zA-Z0-9_])'
-    return p
-
-def t_OR(p):
-    r'(?i)or(?![a-zA-Z0-9_])'
-    return p
-
-def t_NOT(p):
-    r'(?i)not(?![a-zA-Z0-9_])'
-    return p
-
-def t_TRUE(p):
-    r'(?i)true(?![a-zA-Z0-9_])'
-    return p
-
-def t_FALSE(p):
-    r'(?i)false(?![a-zA-Z0-9_])'
-    return p
-
-def t_READLN(p):
-    r'(?i)readln(?![a-zA-Z0-9_])'
-    return p
-
-def t_WRITELN(p):
-    r'(?i)writeln(?![a-zA-Z0-9_])'
-    return p
-
-def t_READ(p):
-    r'(?i)read(?![a-zA-Z0-9_])'
-    return p
-
-def t_WRITE(p):
-    r'(?i)write(?![a-zA-Z0-9_])'
-    return p
-
-def t_LENGTH(p):
-    r'(?i)length(?![a-zA-Z0-9_])'
-    return p
-
-# ===== IDENTIFICADORES - DEVE vir DEPOIS das palavras reservadas =====
+# ===== PALAVRAS RESERVADAS - Tabela de lookup (case-insensitive) =====
+
+# O t_ID reconhece o lexema uma única vez e a tabela indica se é uma palavra
+# reservada. Evita que a ER mestre do PLY experimente dezenas de alternativas
+# com lookahead antes de chegar aos identificadores.
+reserved = {
+    'program': 'PROGRAM', 'procedure': 'PROCEDURE', 'function': 'FUNCTION',
+    'begin': 'BEGIN', 'end': 'END', 'const': 'CONST', 'type': 'TYPE',
+    'var': 'VAR', 'integer': 'INTEGER', 'real': 'REAL', 'boolean': 'BOOLEAN',
+    'string': 'STRING', 'array': 'ARRAY', 'of': 'OF', 'if': 'IF',
+    'then': 'THEN', 'else': 'ELSE', 'while': 'WHILE', 'downto': 'DOWNTO',
+    'do': 'DO', 'for': 'FOR', 'to': 'TO', 'div': 'DIV', 'mod': 'MOD',
+    'and': 'AND', 'or': 'OR', 'not': 'NOT', 'true': 'TRUE', 'false': 'FALSE',
+    'readln': 'READLN', 'writeln': 'WRITELN', 'read': 'READ', 'write': 'WRITE',
+    'length': 'LENGTH',
+}
+
+# ===== IDENTIFICADORES E PALAVRAS RESERVADAS =====
 def t_ID(p):
     r'[a-zA-Z][a-zA-Z0-9_]*'
+    p.value = intern_identifier(p.value)
+    p.type = reserved.get(identifier_key(p.value), 'ID')
     return p
 
 # ===== OPERADORES E DELIMITADORES =====
@@ -204,31 +92,67 @@ def t_INTEGER_CONST(p):
     return p
 
 # Strings
+def string_value(lexeme):
+    """Converte o lexema de uma string ('...') no seu valor."""
+    raw_value = lexeme[1:-1]  # Remove aspas externas
+    return raw_value.replace("''", "'")
+
+def string_end(data, pos):
+    """Devolve a posição a seguir à aspa que fecha a string (ou -1 se não terminar).
+
+    Procura a aspa de fecho com str.find, saltando as aspas duplicadas ('').
+    Cada caractere é visitado uma só vez, sem retrocesso da ER.
+    """
+    while True:
+        close = data.find("'", pos)
+        if close < 0:
+            return -1
+        if not data.startswith("'", close + 1):
+            return close + 1
+        pos = close + 2
+
 def t_STRING_CONST(p):
-    r'\'([^\']|\'\')*\''
-    raw_value = p.value[1:-1]  # Remove aspas externas
-    processed_value = raw_value.replace("''", "'")
-    p.value = processed_value
+    r"'"
+    lexer = p.lexer
+    end = string_end(lexer.lexdata, lexer.lexpos)
+    if end < 0:
+        print(f"Erro léxico: String não terminada na linha {lexer.lineno}")
+        return None
+    lexeme = lexer.lexdata[p.lexpos:end]
+    lexer.lexpos = end
+    lexer.lineno += lexeme.count('\n')
+    p.value = string_value(lexeme)
     return p
 
 # ===== COMENTÁRIOS =====
 
+def skip_comment(p, terminator):
+    """Salta um comentário até ao terminador, em tempo linear."""
+    lexer = p.lexer
+    end = lexer.lexdata.find(terminator, lexer.lexpos)
+    if end < 0:
+        print(f"Erro léxico: Comentário não terminado na linha {lexer.lineno}")
+        end = len(lexer.lexdata)
+    else:
+        end += len(terminator)
+    lexer.lineno += lexer.lexdata.count('\n', p.lexpos, end)
+    lexer.lexpos = end
+
 # Comentários de chaves { ... }
 def t_COMMENT_BRACE(p):
-    r'\{[^}]*\}'
-    p.lexer.lineno += p.value.count('\n')
-    pass  # Ignora o comentário
+    r'\{'
+    skip_comment(p, '}')  # Ignora o comentário
 
 # Comentários de parênteses (* ... *)
 def t_COMMENT_PAREN(p):
-    r'$$\*(.|\n)*?\*$$'
-    p.lexer.lineno += p.value.count('\n')
-    pass  # Ignora o comentário
+    r'\(\*'
+    skip_comment(p, '*)')  # Ignora o comentário
 
 # ===== CONTROLO DE LINHAS E ESPAÇOS =====
 
-# Ignorar espaços em branco e tabs
-t_ignore = ' \t'
+# Ignorar espaços em branco, tabs e o '\r' das quebras de linha Windows
+# (o ficheiro é lido em modo binário, sem tradução de quebras de linha)
+t_ignore = ' \t\r'
 
 # Quebras de linha
 def t_newline(p):
@@ -243,16 +167,172 @@ def t_error(p):
 
 # ===== CONSTRUÇÃO DO LEXER =====
 
-# Construir o lexer
-lexer = lex.lex()
+# Construir o lexer (a lextab fica em cache, identificada pelo hash das regras)
+lexer = build_lexer(sys.modules[__name__])
+
+# Implementação usada por omissão: 'ply' (regras acima) ou 'dfa' (dfalexer.py)
+LEXER_BACKEND = os.environ.get('PASCAL_LEXER', 'ply')
+
+def make_lexer(backend=None):
+    """Cria um lexer independente (estado próprio, linha 1) que partilha as tabelas já construídas."""
+    backend = backend or LEXER_BACKEND
+    if backend == 'dfa':
+        from dfalexer import DFALexer  # Importado aqui: o dfalexer usa a tabela reserved deste módulo
+        return DFALexer()
+    if backend != 'ply':
+        raise ValueError(f"Lexer desconhecido: {backend}")
+    instance = lexer.clone()
+    instance.lineno = 1
+    return instance
+
+# ===== LEITURA DO CÓDIGO FONTE E FLUXO DE TOKENS =====
+
+def read_source(path):
+    """Lê um ficheiro-fonte através de um mapeamento em memória (mmap).
+
+    O texto é descodificado diretamente das páginas mapeadas, sem passar por
+    um buffer de leitura intermédio.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return str(mapped, 'utf-8')
+
+def tokenize(data, lexer=None):
+    """Gera os tokens um a um, à medida que são consumidos.
+
+    Cada token leva também endlexpos, a posição a seguir ao seu último
+    caractere. Com data None, continua o texto já entregue ao lexer.
+    """
+    if lexer is None:
+        lexer = make_lexer()
+    if data is not None:
+        lexer.input(data)
+    while True:
+        tok = lexer.token()
+        if tok is None:
+            return
+        tok.endlexpos = lexer.lexpos  # Depois de token(), lexpos aponta para o fim do token
+        yield tok
+
+def token_function(tokens):
+    """Adapta um iterável de tokens à interface tokenfunc do parser PLY."""
+    iterator = iter(tokens)
+    return lambda: next(iterator, None)
+
+# ===== FLUXO DE TOKENS COMPACTO =====
+
+# Código inteiro de cada tipo de token (posição no tuplo tokens)
+TOKEN_CODES = {name: code for code, name in enumerate(tokens)}
+
+# Conversão do lexema no valor do token, para os tipos que não usam o texto tal como está
+_VALUE_DECODERS = {'INTEGER_CONST': int, 'REAL_CONST': float, 'STRING_CONST': string_value}
+_DECODERS_BY_CODE = [_VALUE_DECODERS.get(name) for name in tokens]
+
+class TokenBuffer:
+    """Fluxo de tokens guardado em arrays paralelos.
+
+    Cada token ocupa um código de tipo (1 byte) e três inteiros (início, fim e
+    linha), em vez de um objeto LexToken. Os valores são obtidos do texto
+    fonte apenas quando pedidos.
+    """
+    __slots__ = ('source', 'kinds', 'starts', 'ends', 'lines')
+
+    def __init__(self, source):
+        self.source = source
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.lines = array('I')
+
+    @classmethod
+    def from_source(cls, source, lexer=None):
+        """Analisa o código e guarda todos os tokens no buffer."""
+        buffer = cls(source)
+        if lexer is None:
+            lexer = make_lexer()
+        lexer.input(source)
+        append_kind, append_start = buffer.kinds.append, buffer.starts.append
+        append_end, append_line = buffer.ends.append, buffer.lines.append
+        codes = TOKEN_CODES
+        while True:
+            tok = lexer.token()
+            if tok is None:
+                return buffer
+            append_kind(codes[tok.type])
+            append_start(tok.lexpos)
+            append_end(lexer.lexpos)  # Depois de token(), lexpos aponta para o fim do token
+            append_line(tok.lineno)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def type(self, index):
+        return tokens[self.kinds[index]]
+
+    def lexeme(self, index):
+        return self.source[self.starts[index]:self.ends[index]]
+
+    def value(self, index):
+        decoder = _DECODERS_BY_CODE[self.kinds[index]]
+        lexeme = self.lexeme(index)
+        return decoder(lexeme) if decoder else lexeme
+
+    def line(self, index):
+        return self.lines[index]
+
+    def __iter__(self):
+        """Percorre os tokens como tuplos (tipo, valor, linha)."""
+        for index in range(len(self.kinds)):
+            yield tokens[self.kinds[index]], self.value(index), self.lines[index]
+
+    def lex_tokens(self):
+        """Reproduz os tokens guardados como LexToken, para os passar ao parser sem reanalisar o texto."""
+        for index in range(len(self.kinds)):
+            tok = LexToken()
+            tok.type = tokens[self.kinds[index]]
+            tok.value = self.value(index)
+            tok.lineno = self.lines[index]
+            tok.lexpos = self.starts[index]
+            tok.endlexpos = self.ends[index]
+            yield tok
+
+# ===== POSIÇÕES NO TEXTO =====
+
+class LineIndex:
+    """Posição do início de cada linha de um texto.
+
+    Converte as posições guardadas nos tokens e nos nós (lexpos, start, end)
+    em linha e coluna por pesquisa binária, sem voltar a percorrer o texto.
+    As linhas e as colunas começam em 1.
+    """
+    __slots__ = ('starts',)
+
+    def __init__(self, source):
+        self.starts = starts = array('I', [0])
+        pos = source.find('\n')
+        while pos >= 0:
+            starts.append(pos + 1)
+            pos = source.find('\n', pos + 1)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def line(self, offset):
+        return bisect_right(self.starts, offset)
+
+    def position(self, offset):
+        """(linha, coluna) da posição indicada."""
+        line = bisect_right(self.starts, offset)
+        return line, offset - self.starts[line - 1] + 1
+
+    def line_start(self, line):
+        return self.starts[line - 1]
 
 # Função para testar o lexer
 def test_lexer(data):
-    lexer.input(data)
-    tokens_list = []
-    for tok in lexer:
-        tokens_list.append((tok.type, tok.value, tok.lineno))
-    return tokens_list
+    return [(tok.type, tok.value, tok.lineno) for tok in tokenize(data)]
 
 # Exemplo de uso
 if __name__ == "__main__":
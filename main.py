@@ -2,17 +2,27 @@
 import sys
 import os
 import glob
-from lexer import lexer, test_lexer
-from parser import parse_code, print_ast
+from lexer import read_source, tokenize, TokenBuffer
+from parser import parse_with_diagnostics, print_ast
 from semantic import SemanticAnalyzer
+from semanticpool import ParallelSemanticAnalyzer
+from semanticcache import SemanticCache
 from codegen import CodeGenerator
+from constfold import fold_constants
+from dataflow import build_routines, variable_warnings, remove_dead_stores
 
-def compile_file(input_file, output_file=None, debug=True):  # Debug ativado por padrão
-    """Compila um arquivo Pascal."""
+def compile_file(input_file, output_file=None, debug=True, jobs=None, use_cache=True, cache_dir=None):  # Debug ativado por padrão
+    """Compila um arquivo Pascal.
+
+    Com jobs > 1, os corpos dos subprogramas são analisados em paralelo por jobs processos.
+    Com use_cache, os resultados da análise dos subprogramas ficam em cache (semanticcache,
+    no diretório cache_dir ou no cache do utilizador): numa nova compilação, os que não
+    mudaram não são analisados de novo. Os resultados são lidos com pickle: cache_dir tem
+    de ser um diretório de confiança, só do utilizador.
+    """
     try:
-        # Lê o arquivo de entrada
-        with open(input_file, 'r', encoding='utf-8') as f:
-            source_code = f.read()
+        # Lê o arquivo de entrada (mapeado em memória)
+        source_code = read_source(input_file)
         
         # Define o arquivo de saída
         if output_file is None:
@@ -23,19 +33,25 @@ def compile_file(input_file, output_file=None, debug=True):  # Debug ativado por
         print(f"Compilando: {input_file}")
         print(f"{'='*60}")
         
-        # Análise léxica
+        # Análise léxica (em debug, os tokens são guardados uma vez e reutilizados pelo parser)
         if debug:
             print("\n=== ANÁLISE LÉXICA ===")
-            tokens = test_lexer(source_code)
-            for token_type, token_value, line_no in tokens:
+            token_buffer = TokenBuffer.from_source(source_code)
+            for token_type, token_value, line_no in token_buffer:
                 print(f"Linha {line_no}: {token_type} - '{token_value}'")
+            tokens = token_buffer.lex_tokens()
+        else:
+            tokens = tokenize(source_code)
         
         # Análise sintática
         if debug:
             print("\n=== ANÁLISE SINTÁTICA ===")
         
-        ast = parse_code(source_code)
-        if ast is None:
+        # Os erros sintáticos são todos reportados de uma vez (o parser recupera de cada um)
+        ast, syntax_errors = parse_with_diagnostics(source_code, tokens=tokens)
+        if ast is None or syntax_errors:
+            if syntax_errors:
+                print(f"Erro: {len(syntax_errors)} erro(s) sintático(s)")
             print("Erro: Falha na análise sintática")
             return False
         
@@ -47,17 +63,26 @@ def compile_file(input_file, output_file=None, debug=True):  # Debug ativado por
         if debug:
             print("\n=== ANÁLISE SEMÂNTICA ===")
         
-        analyzer = SemanticAnalyzer()
+        cache = SemanticCache(cache_dir) if use_cache else None
+        analyzer = ParallelSemanticAnalyzer(jobs, cache) if jobs and jobs > 1 else SemanticAnalyzer(cache)
         if not analyzer.analyze(ast):
             analyzer.print_errors()
             analyzer.print_warnings()
             print("Erro: Falha na análise semântica")
             return False
         
+        # Fluxo de dados: avisos das variáveis nunca usadas ou nunca lidas
+        routines = build_routines(ast, analyzer.symbol_table)
+        analyzer.warnings.extend(variable_warnings(routines, analyzer.symbol_table))
+        
         if debug:
             analyzer.symbol_table.print_table()
             analyzer.print_warnings()
         
+        # As subexpressões constantes passam a literais e as atribuições mortas são retiradas
+        fold_constants(ast)
+        remove_dead_stores(routines)
+        
         # Geração de código
         if debug:
             print("\n=== GERAÇÃO DE CÓDIGO ===")
@@ -106,7 +131,7 @@ def find_pascal_files(directory="."):
     files.sort(key=extract_number)
     return files
 
-def compile_all_examples(directory=".", debug=True):  # Debug ativado por padrão
+def compile_all_examples(directory=".", debug=True, jobs=None, use_cache=True):  # Debug ativado por padrão
     """Compila todos os arquivos example*.pas encontrados no diretório."""
     pascal_files = find_pascal_files(directory)
     
@@ -127,7 +152,7 @@ def compile_all_examples(directory=".", debug=True):  # Debug ativado por padrã
             base_name = os.path.splitext(input_file)[0]
             output_file = f"{base_name}.vm"
             
-            if compile_file(input_file, output_file, debug):
+            if compile_file(input_file, output_file, debug, jobs, use_cache):
                 successful_compilations += 1
             else:
                 failed_compilations += 1
@@ -163,6 +188,14 @@ def create_example_files():
     # Como os arquivos já existem, esta função pode ser simplificada
     return []
 
+def jobs_option():
+    """Número de processos da análise semântica indicado com -j N (None se não houver)."""
+    if "-j" in sys.argv:
+        index = sys.argv.index("-j")
+        if index + 1 < len(sys.argv) and sys.argv[index + 1].isdigit():
+            return int(sys.argv[index + 1])
+    return None
+
 def main():
     """Função principal."""
     print("COMPILADOR PASCAL STANDARD")
@@ -186,6 +219,8 @@ def main():
             print("  python main.py arquivo.pas        # Compila um arquivo específico")
             print("  python main.py arquivo.pas -d     # Compila com modo debug")
             print("  python main.py --all [-d]         # Compila todos os example*.pas")
+            print("  python main.py arquivo.pas -j N   # Analisa os subprogramas em N processos")
+            print("  python main.py arquivo.pas --no-cache  # Não usa o cache da análise semântica")
             print("  python main.py --create           # Cria arquivos de exemplo")
             print("  python main.py --help             # Mostra esta ajuda")
             return
@@ -200,7 +235,7 @@ def main():
         elif sys.argv[1] == "--all":
             print("Modo: Compilação de todos os example*.pas")
             debug = "-d" in sys.argv
-            compile_all_examples(".", debug)
+            compile_all_examples(".", debug, jobs_option(), "--no-cache" not in sys.argv)
             return
         
         else:
@@ -210,7 +245,7 @@ def main():
             debug = True  # Debug sempre ativado
             
             print(f"Modo: Compilação de arquivo específico")
-            compile_file(input_file, output_file, debug)
+            compile_file(input_file, output_file, debug, jobs_option(), "--no-cache" not in sys.argv)
 
 if __name__ == "__main__":
     try:
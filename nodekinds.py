@@ -0,0 +1,46 @@
+# nodekinds.py - Códigos inteiros dos tipos de nó da AST e tabelas de despacho
+
+# ===== TIPOS DE NÓ =====
+
+(K_PROGRAM, K_DECLARATIONS, K_VAR_DECLARATION, K_VAR_ITEM, K_ID_LIST, K_TYPE,
+ K_ARRAY_TYPE, K_CONST_DECLARATION, K_CONST_ITEM, K_TYPE_DECLARATION, K_TYPE_ITEM,
+ K_FUNCTION_DECLARATION, K_PROCEDURE_DECLARATION, K_PARAMETER_LIST, K_PARAMETER,
+ K_COMPOUND_STATEMENT, K_ASSIGNMENT, K_IF_STATEMENT, K_WHILE_STATEMENT,
+ K_FOR_STATEMENT, K_READ_STATEMENT, K_WRITE_STATEMENT, K_VARIABLE_LIST,
+ K_EXPRESSION_LIST, K_PROCEDURE_CALL, K_ARGUMENT_LIST, K_BINARY_OP, K_UNARY_OP,
+ K_LENGTH_CALL, K_FUNCTION_CALL, K_BOOLEAN, K_NUMBER, K_STRING, K_VARIABLE,
+ K_ARRAY_ACCESS, K_OTHER) = range(36)
+
+# Nome de cada tipo de nó (o ASTNode.type), pela ordem dos códigos acima
+NODE_TYPES = (
+    'program', 'declarations', 'var_declaration', 'var_item', 'id_list', 'type',
+    'array_type', 'const_declaration', 'const_item', 'type_declaration', 'type_item',
+    'function_declaration', 'procedure_declaration', 'parameter_list', 'parameter',
+    'compound_statement', 'assignment', 'if_statement', 'while_statement',
+    'for_statement', 'read_statement', 'write_statement', 'variable_list',
+    'expression_list', 'procedure_call', 'argument_list', 'binary_op', 'unary_op',
+    'length_call', 'function_call', 'boolean', 'number', 'string', 'variable',
+    'array_access', None,
+)
+
+# Nome -> código (os tipos desconhecidos ficam com K_OTHER)
+NODE_KIND = {name: code for code, name in enumerate(NODE_TYPES) if name is not None}
+
+
+def node_kind(type):
+    """Código inteiro de um tipo de nó."""
+    return NODE_KIND.get(type, K_OTHER)
+
+
+def dispatch_table(handlers, default=None):
+    """Constrói uma tabela de despacho indexada pelo código do tipo de nó.
+
+    handlers mapeia nomes de tipos de nó em funções; os restantes tipos
+    ficam com default. Com a tabela, escolher o tratamento de um nó custa
+    uma indexação (table[node.kind]) em vez de uma cadeia de comparações
+    de strings.
+    """
+    table = [default] * len(NODE_TYPES)
+    for type, handler in handlers.items():
+        table[NODE_KIND[type]] = handler
+    return table
@@ -1,14 +1,42 @@
 # parser.py - Analisador sintático para Pascal Standard (CORRIGIDO CONFORME PROFESSOR)
-import ply.yacc as yacc
+import copy
+import os
+import sys
+from astwalk import preorder
+from nodekinds import node_kind
+from tablecache import build_parser
 from lexer import tokens  # Importa os tokens do lexer
+from ply.lex import LexToken
+
+# Filhos partilhados por todas as folhas (número, variável, string, ...)
+NO_CHILDREN = ()
 
 # Estrutura para representar a AST (Abstract Syntax Tree)
 class ASTNode:
+    # Sem __dict__ por nó: os programas grandes geram milhões de nós
+    __slots__ = ('type', 'kind', 'children', 'value', 'line', 'start', 'end', 'symbol', 'expr_type')
+
     def __init__(self, type, children=None, value=None):
-        self.type = type
-        self.children = children if children else []
+        self.type = sys.intern(type)  # Tipos de nó internados: comparações por identidade
+        self.kind = node_kind(type)   # Código inteiro do tipo, para as tabelas de despacho
+        # As listas passadas (mesmo vazias) continuam a poder crescer; sem filhos,
+        # a folha partilha o tuplo vazio
+        self.children = NO_CHILDREN if children is None else children
         self.value = value
         self.line = 0  # Linha do código fonte
+        # Intervalo [start, end) do texto coberto pelo nó (posições dos caracteres);
+        # None nos nós sem tokens (declarações ou listas de argumentos vazias)
+        self.start = None
+        self.end = None
+        # Symbol resolvido pela análise semântica (nomes usados, declarações de
+        # subprogramas e variável de controlo do for), lido pela geração de código
+        self.symbol = None
+        # Tipo da expressão calculado pela análise semântica (None: sem tipo ou não verificada)
+        self.expr_type = None
+
+    def set_child(self, index, child):
+        """Substitui o filho na posição indicada (None retira-o, como um ramo vazio)."""
+        self.children[index] = child
         
     def __repr__(self):
         return f"ASTNode({self.type}, {self.value}, {len(self.children)} children)"
@@ -57,9 +85,10 @@ def p_var_list(p):
     '''var_list : var_list var_item
                 | var_item'''
     if len(p) == 2:
-        p[0] = [p[1]]
+        p[0] = [p[1]] if p[1] else []
     else:
-        p[1].append(p[2])
+        if p[2]:  # Itens com erro sintático são descartados
+            p[1].append(p[2])
         p[0] = p[1]
 
 def p_var_item(p):
@@ -71,7 +100,7 @@ def p_id_list(p):
     '''id_list : id_list COMMA ID
                | ID'''
     if len(p) == 2:
-        p[0] = ASTNode('id_list', [], [p[1]])
+        p[0] = ASTNode('id_list', value=[p[1]])
         p[0].line = p.lineno(1)
     else:
         p[1].value.append(p[3])
@@ -88,7 +117,7 @@ def p_simple_type(p):
                    | REAL
                    | BOOLEAN
                    | STRING'''
-    p[0] = ASTNode('type', [], p[1])
+    p[0] = ASTNode('type', value=p[1])
     p[0].line = p.lineno(1)
 
 def p_array_type(p):
@@ -106,9 +135,10 @@ def p_const_list(p):
     '''const_list : const_list const_item
                   | const_item'''
     if len(p) == 2:
-        p[0] = [p[1]]
+        p[0] = [p[1]] if p[1] else []
     else:
-        p[1].append(p[2])
+        if p[2]:  # Itens com erro sintático são descartados
+            p[1].append(p[2])
         p[0] = p[1]
 
 def p_const_item(p):
@@ -126,9 +156,10 @@ def p_type_list(p):
     '''type_list : type_list type_item
                  | type_item'''
     if len(p) == 2:
-        p[0] = [p[1]]
+        p[0] = [p[1]] if p[1] else []
     else:
-        p[1].append(p[2])
+        if p[2]:  # Itens com erro sintático são descartados
+            p[1].append(p[2])
         p[0] = p[1]
 
 def p_type_item(p):
@@ -144,7 +175,7 @@ def p_function_declaration(p):
 
 def p_function_declaration_no_params(p):
     '''function_declaration : FUNCTION ID COLON simple_type SEMICOLON declarations compound_statement SEMICOLON'''
-    p[0] = ASTNode('function_declaration', [ASTNode('parameter_list', []), p[4], p[6], p[7]], p[2])
+    p[0] = ASTNode('function_declaration', [ASTNode('parameter_list'), p[4], p[6], p[7]], p[2])
     p[0].line = p.lineno(1)
 
 # Declaração de procedimentos
@@ -155,7 +186,7 @@ def p_procedure_declaration(p):
 
 def p_procedure_declaration_no_params(p):
     '''procedure_declaration : PROCEDURE ID SEMICOLON declarations compound_statement SEMICOLON'''
-    p[0] = ASTNode('procedure_declaration', [ASTNode('parameter_list', []), p[4], p[5]], p[2])
+    p[0] = ASTNode('procedure_declaration', [ASTNode('parameter_list'), p[4], p[5]], p[2])
     p[0].line = p.lineno(1)
 
 # Lista de parâmetros
@@ -250,7 +281,7 @@ def p_read_statement(p):
                       | READLN LPAREN variable_list RPAREN
                       | READLN'''
     if len(p) == 2:  # readln sem argumentos
-        p[0] = ASTNode('read_statement', [], p[1])
+        p[0] = ASTNode('read_statement', value=p[1])
     else:
         p[0] = ASTNode('read_statement', [p[3]], p[1])
     p[0].line = p.lineno(1)
@@ -263,9 +294,9 @@ def p_write_statement(p):
                        | WRITE LPAREN RPAREN
                        | WRITELN LPAREN RPAREN'''
     if len(p) == 2:  # writeln sem argumentos
-        p[0] = ASTNode('write_statement', [], p[1])
+        p[0] = ASTNode('write_statement', value=p[1])
     elif len(p) == 4:  # write() ou writeln() vazios
-        p[0] = ASTNode('write_statement', [], p[1])
+        p[0] = ASTNode('write_statement', value=p[1])
     else:
         p[0] = ASTNode('write_statement', [p[3]], p[1])
     p[0].line = p.lineno(1)
@@ -295,7 +326,7 @@ def p_procedure_call(p):
     '''procedure_call : ID LPAREN argument_list RPAREN
                       | ID'''
     if len(p) == 2:
-        p[0] = ASTNode('procedure_call', [], p[1])
+        p[0] = ASTNode('procedure_call', value=p[1])
     else:
         p[0] = ASTNode('procedure_call', [p[3]], p[1])
     p[0].line = p.lineno(1)
@@ -410,13 +441,13 @@ def p_const(p):
              | TRUE
              | FALSE'''
     if p[1] in ['true', 'false', 'TRUE', 'FALSE']:
-        p[0] = ASTNode('boolean', [], p[1])
+        p[0] = ASTNode('boolean', value=p[1])
     elif isinstance(p[1], int):
-        p[0] = ASTNode('number', [], p[1])
+        p[0] = ASTNode('number', value=p[1])
     elif isinstance(p[1], float):
-        p[0] = ASTNode('number', [], p[1])
+        p[0] = ASTNode('number', value=p[1])
     else:
-        p[0] = ASTNode('string', [], p[1])
+        p[0] = ASTNode('string', value=p[1])
     p[0].line = p.lineno(1)
 
 # Var : ID | ID "[" Expr "]"
@@ -424,7 +455,7 @@ def p_var(p):
     '''var : ID
            | ID LBRACKET expr RBRACKET'''
     if len(p) == 2:
-        p[0] = ASTNode('variable', [], p[1])
+        p[0] = ASTNode('variable', value=p[1])
     else:
         p[0] = ASTNode('array_access', [p[3]], p[1])
     p[0].line = p.lineno(1)
@@ -435,53 +466,195 @@ def p_func_call(p):
     p[0] = ASTNode('function_call', [p[3]], p[1])
     p[0].line = p.lineno(1)
 
+# ===== RECUPERAÇÃO DE ERROS =====
+
+# Um comando inválido é descartado até ao próximo ';', 'end' ou 'else'
+def p_statement_error(p):
+    '''statement : error'''
+    # p[1] é o token que provocou o erro. Se o mesmo token volta a ser reduzido
+    # aqui, a recuperação está num ciclo (o token não pode seguir-se ao comando
+    # neste contexto): errok() faz com que o próximo erro chame o errorfunc,
+    # que o descarta (ver discard_if_stuck)
+    if p[1] is getattr(p.parser, 'stuck_token', None):
+        p.parser.errok()
+    p.parser.stuck_token = p[1]
+    p[0] = None
+
+# Uma declaração de variáveis, constante ou tipo inválida é descartada até ao ';'
+def p_var_item_error(p):
+    '''var_item : error SEMICOLON'''
+    p[0] = None
+
+def p_const_item_error(p):
+    '''const_item : error SEMICOLON'''
+    p[0] = None
+
+def p_type_item_error(p):
+    '''type_item : error SEMICOLON'''
+    p[0] = None
+
 # Regra vazia
 def p_empty(p):
     '''empty :'''
     p[0] = None
 
 # Tratamento de erros
+class SyntaxDiagnostic:
+    """Erro sintático encontrado durante a análise (token é None no fim do ficheiro)."""
+    __slots__ = ('line', 'start', 'token_type', 'token_value', 'message')
+
+    def __init__(self, token):
+        if token is not None:
+            self.line = token.lineno
+            self.start = token.lexpos
+            self.token_type = token.type
+            self.token_value = token.value
+            self.message = f"Erro sintático na linha {token.lineno}: Token inesperado '{token.value}' ({token.type})"
+        else:
+            self.line = self.start = None
+            self.token_type = self.token_value = None
+            self.message = "Erro sintático: Fim de arquivo inesperado"
+
+    def __str__(self):
+        return self.message
+
+    def __repr__(self):
+        return f"SyntaxDiagnostic({self.message!r})"
+
 def p_error(p):
-    if p:
-        print(f"Erro sintático na linha {p.lineno}: Token inesperado '{p.value}' ({p.type})")
-    else:
-        print("Erro sintático: Fim de arquivo inesperado")
+    print(SyntaxDiagnostic(p).message)
+
+def discard_if_stuck(parser, token):
+    """Descarta o token em que a recuperação de erros ficou parada (ver p_statement_error).
 
-# Construir o parser
-parser = yacc.yacc()
+    Devolve True se o token foi descartado: o erro já foi reportado e o PLY
+    passa ao token seguinte.
+    """
+    if token is not None and token is getattr(parser, 'stuck_token', None):
+        parser.errok()  # Com errok(), o token devolvido pelo errorfunc (None) substitui este
+        return True
+    return False
+
+# ===== INTERVALOS DOS NÓS NO TEXTO =====
+
+def production_span(p):
+    """Intervalo do texto coberto por uma regra: do primeiro ao último dos seus
+    tokens e nós (os símbolos que não têm posição, como os vazios, são ignorados)."""
+    start = end = None
+    for symbol in p.slice[1:]:
+        if symbol.__class__ is LexToken:
+            if start is None:
+                start = symbol.lexpos
+            end = symbol.endlexpos
+            continue
+        value = symbol.value
+        if value.__class__ is list:  # Listas de nós (comandos, itens de declarações)
+            if not value:
+                continue
+            first, last = value[0], value[-1]
+        elif value.__class__ is ASTNode:
+            first = last = value
+        else:
+            continue
+        if first.start is None:
+            continue
+        if start is None:
+            start = first.start
+        end = last.end
+    return start, end
+
+def with_span(action):
+    """Envolve a ação de uma regra para registar o intervalo do nó que ela devolve.
+
+    As regras que repassam um filho (fator entre parênteses) alargam o seu
+    intervalo aos tokens da própria regra; as que acrescentam elementos a uma
+    lista (declarações, id_list) prolongam-no até ao último elemento.
+    """
+    def reduce(p):
+        action(p)
+        node = p[0]
+        if node.__class__ is ASTNode:
+            node.start, node.end = production_span(p)
+    return reduce
+
+# Construir o parser (as tabelas LALR ficam em cache, identificadas pelo hash da gramática)
+parser = build_parser(sys.modules[__name__])
+for production in parser.productions:
+    if production.callable is not None:
+        production.callable = with_span(production.callable)
+
+# Implementação usada por omissão: 'ply' (gramática acima) ou 'rd' (rdparser.py)
+PARSER_BACKEND = os.environ.get('PASCAL_PARSER', 'ply')
+
+def make_parser(backend=None):
+    """Cria um parser independente que partilha as tabelas LALR já construídas.
+
+    O estado de cada análise (pilhas de estados e símbolos) é criado em cada
+    chamada a parse(), por isso cópias superficiais podem ser usadas em
+    paralelo por várias threads.
+    """
+    backend = backend or PARSER_BACKEND
+    if backend == 'rd':
+        from rdparser import RDParser  # Importado aqui: o rdparser usa o ASTNode deste módulo
+        return RDParser()
+    if backend != 'ply':
+        raise ValueError(f"Parser desconhecido: {backend}")
+    instance = copy.copy(parser)
+    instance.errorfunc = lambda token: None if discard_if_stuck(instance, token) else p_error(token)
+    return instance
 
 # Função para testar o parser
-def parse_code(code):
-    from lexer import lexer
+def parse_with_diagnostics(code, tokens=None, backend=None):
+    """Analisa o código recuperando dos erros sintáticos.
+
+    Devolve (ast, diagnostics): a lista diagnostics tem um SyntaxDiagnostic
+    por cada erro encontrado e, se não estiver vazia, a AST é parcial (os
+    comandos e declarações com erro são descartados). O parser por descida
+    recursiva pára no primeiro erro.
+    """
+    from lexer import make_lexer, token_function, tokenize
+    diagnostics = []
+
+    def report(token):
+        if discard_if_stuck(parser, token):
+            return None
+        diagnostic = SyntaxDiagnostic(token)
+        print(diagnostic.message)
+        diagnostics.append(diagnostic)
+
+    lexer = make_lexer()
+    parser = make_parser(backend)
+    parser.errorfunc = report  # Cada análise tem o seu parser, por isso a lista não é partilhada
     try:
-        result = parser.parse(code, lexer=lexer)
-        return result
+        if tokens is None:
+            tokens = tokenize(code, lexer)  # Marca o fim de cada token (endlexpos), usado nos intervalos
+        result = parser.parse(lexer=lexer, tokenfunc=token_function(tokens))
+        return result, diagnostics
     except Exception as e:
         print(f"Erro durante o parsing: {e}")
         import traceback
         traceback.print_exc()  # Imprime o stack trace para depuração
-        return None
+        return None, diagnostics
+
+def parse_code(code, tokens=None, backend=None):
+    """Analisa o código; se for dado um iterável de tokens, consome-o em vez de reanalisar o texto.
+
+    Devolve None se houver erros sintáticos.
+    """
+    ast, diagnostics = parse_with_diagnostics(code, tokens, backend)
+    return None if diagnostics else ast
 
 # Função para imprimir a AST
 def print_ast(node, indent=0):
-    if node is None:
-        return
-    
-    spaces = "  " * indent
-    if isinstance(node.value, list):
-        value_str = ", ".join(str(v) for v in node.value)
-        print(f"{spaces}{node.type}: [{value_str}]")
-    elif node.value is not None:
-        print(f"{spaces}{node.type}: {node.value}")
-    else:
-        print(f"{spaces}{node.type}")
-    
-    for child in node.children:
-        if isinstance(child, list):
-            for item in child:
-                print_ast(item, indent + 1)
+    for node, depth in preorder(node, indent):
+        spaces = "  " * depth
+        if isinstance(node.value, list):
+            value_str = ", ".join(str(v) for v in node.value)
+            print(f"{spaces}{node.type}: [{value_str}]")
+        elif node.value is not None:
+            print(f"{spaces}{node.type}: {node.value}")
         else:
-            print_ast(child, indent + 1)
+            print(f"{spaces}{node.type}")
 
 # Exemplo de uso
 if __name__ == "__main__":
@@ -0,0 +1,511 @@
+# rdparser.py - Analisador sintático alternativo: descida recursiva com precedências (Pratt)
+from parser import ASTNode, p_error
+
+# ===== PRECEDÊNCIA DOS OPERADORES BINÁRIOS =====
+
+# Poder de ligação de cada operador: ExprBool (relacionais) < Expr (aditivos) < Termo (multiplicativos)
+REL_POWER, ADD_POWER, MUL_POWER = 1, 2, 3
+
+BINDING_POWER = {
+    'EQ': REL_POWER, 'NEQ': REL_POWER, 'LT': REL_POWER,
+    'LTE': REL_POWER, 'GT': REL_POWER, 'GTE': REL_POWER,
+    'PLUS': ADD_POWER, 'MINUS': ADD_POWER, 'OR': ADD_POWER,
+    'TIMES': MUL_POWER, 'DIV': MUL_POWER, 'DIVIDE': MUL_POWER,
+    'MOD': MUL_POWER, 'AND': MUL_POWER,
+}
+
+# Tokens que podem seguir um comando vazio
+STATEMENT_FOLLOW = frozenset(('SEMICOLON', 'END', 'ELSE'))
+
+# Tokens que iniciam uma declaração
+DECLARATION_START = frozenset(('VAR', 'CONST', 'TYPE', 'FUNCTION', 'PROCEDURE'))
+
+SIMPLE_TYPES = frozenset(('INTEGER', 'REAL', 'BOOLEAN', 'STRING'))
+
+CONSTANTS = frozenset(('INTEGER_CONST', 'REAL_CONST', 'STRING_CONST', 'TRUE', 'FALSE'))
+
+
+class ParseError(Exception):
+    """Token inesperado (None no fim do texto)."""
+
+    def __init__(self, token):
+        super().__init__(token)
+        self.token = token
+
+
+class RDParser:
+    """Parser por descida recursiva com a mesma interface (parse) e as mesmas
+    árvores que o parser LALR de parser.py.
+
+    As linhas dos nós seguem as do PLY: a linha do token indicado em cada
+    regra, e 0 nos nós cuja linha vinha de um não-terminal (binary_op).
+    Os intervalos (start, end) também: do primeiro ao último token da regra,
+    e None nas listas e declarações vazias.
+    """
+
+    def __init__(self):
+        self.errorfunc = p_error  # Chamada com o token inesperado, como no PLY
+
+    def parse(self, input=None, lexer=None, tokenfunc=None):
+        from lexer import make_lexer, token_function, tokenize
+        if lexer is None:
+            lexer = make_lexer()
+        if tokenfunc is None:
+            tokenfunc = token_function(tokenize(input, lexer))
+        self.next_token = tokenfunc
+        self.token = None
+        self.last_end = None
+        try:
+            self.advance()
+            program = self.program()
+            if self.type != '$end':
+                raise ParseError(self.token)
+            return program
+        except ParseError as error:
+            self.errorfunc(error.token)
+            return None
+
+    def parse_rule(self, rule, lexer):
+        """Analisa uma só construção (o método da regra, como 'function_declaration')
+        a partir da posição atual do lexer, que pode estar a meio do texto.
+
+        Devolve o nó (None se houver um erro sintático); o token seguinte à
+        construção fica em self.token.
+        """
+        from lexer import token_function, tokenize
+        self.next_token = token_function(tokenize(None, lexer))
+        self.token = None
+        self.last_end = None
+        try:
+            self.advance()
+            return getattr(self, rule)()
+        except ParseError as error:
+            self.errorfunc(error.token)
+            return None
+
+    # ===== LEITURA DE TOKENS =====
+
+    def advance(self):
+        if self.token is not None:
+            self.last_end = self.token.endlexpos  # Fim do último token consumido
+        self.token = tok = self.next_token()
+        self.type = tok.type if tok is not None else '$end'
+
+    def expect(self, type):
+        """Consome o token atual, que tem de ser do tipo indicado."""
+        tok = self.token
+        if self.type != type:
+            raise ParseError(tok)
+        self.advance()
+        return tok
+
+    def spanned(self, node, start):
+        """Regista o intervalo do nó, de start até ao fim do último token consumido."""
+        node.start = start
+        node.end = self.last_end
+        return node
+
+    def spanned_by_children(self, node):
+        """Intervalo de uma lista (declarações, parâmetros, ...): do primeiro ao último elemento."""
+        children = node.children
+        if children:
+            node.start = children[0].start
+            node.end = children[-1].end
+        return node
+
+    # ===== PROGRAMA E DECLARAÇÕES =====
+
+    def program(self):
+        start = self.expect('PROGRAM')
+        name = self.expect('ID')
+        self.expect('SEMICOLON')
+        declarations = self.declarations()
+        body = self.compound_statement()
+        self.expect('DOT')
+        node = ASTNode('program', [declarations, body], name.value)
+        node.line = start.lineno
+        return self.spanned(node, start.lexpos)
+
+    def declarations(self):
+        node = ASTNode('declarations', [])
+        while self.type in DECLARATION_START:
+            if self.type == 'VAR':
+                node.children.append(self.var_declaration())
+            elif self.type == 'CONST':
+                node.children.append(self.const_declaration())
+            elif self.type == 'TYPE':
+                node.children.append(self.type_declaration())
+            elif self.type == 'FUNCTION':
+                node.children.append(self.function_declaration())
+            else:
+                node.children.append(self.procedure_declaration())
+        return self.spanned_by_children(node)
+
+    def var_declaration(self):
+        start = self.expect('VAR')
+        items = [self.var_item()]
+        while self.type == 'ID':
+            items.append(self.var_item())
+        node = ASTNode('var_declaration', items)
+        node.line = start.lineno
+        return self.spanned(node, start.lexpos)
+
+    def var_item(self):
+        ids = self.id_list()
+        colon = self.expect('COLON')
+        var_type = self.type_spec()
+        self.expect('SEMICOLON')
+        node = ASTNode('var_item', [ids, var_type])
+        node.line = colon.lineno
+        return self.spanned(node, ids.start)
+
+    def id_list(self):
+        first = self.expect('ID')
+        node = ASTNode('id_list', value=[first.value])
+        node.line = first.lineno
+        while self.type == 'COMMA':
+            self.advance()
+            node.value.append(self.expect('ID').value)
+        return self.spanned(node, first.lexpos)
+
+    def type_spec(self):
+        if self.type == 'ARRAY':
+            return self.array_type()
+        return self.simple_type()
+
+    def simple_type(self):
+        tok = self.token
+        if self.type not in SIMPLE_TYPES:
+            raise ParseError(tok)
+        self.advance()
+        node = ASTNode('type', value=tok.value)
+        node.line = tok.lineno
+        return self.spanned(node, tok.lexpos)
+
+    def array_type(self):
+        start = self.expect('ARRAY')
+        self.expect('LBRACKET')
+        low = self.expect('INTEGER_CONST')
+        self.expect('DOTDOT')
+        high = self.expect('INTEGER_CONST')
+        self.expect('RBRACKET')
+        self.expect('OF')
+        node = ASTNode('array_type', [self.simple_type()], [low.value, high.value])
+        node.line = start.lineno
+        return self.spanned(node, start.lexpos)
+
+    def const_declaration(self):
+        start = self.expect('CONST')
+        items = [self.const_item()]
+        while self.type == 'ID':
+            items.append(self.const_item())
+        node = ASTNode('const_declaration', items)
+        node.line = start.lineno
+        return self.spanned(node, start.lexpos)
+
+    def const_item(self):
+        name = self.expect('ID')
+        eq = self.expect('EQ')
+        value = self.expr_bool()
+        self.expect('SEMICOLON')
+        node = ASTNode('const_item', [value], name.value)
+        node.line = eq.lineno
+        return self.spanned(node, name.lexpos)
+
+    def type_declaration(self):
+        start = self.expect('TYPE')
+        items = [self.type_item()]
+        while self.type == 'ID':
+            items.append(self.type_item())
+        node = ASTNode('type_declaration', items)
+        node.line = start.lineno
+        return self.spanned(node, start.lexpos)
+
+    def type_item(self):
+        name = self.expect('ID')
+        eq = self.expect('EQ')
+        item_type = self.type_spec()
+        self.expect('SEMICOLON')
+        node = ASTNode('type_item', [item_type], name.value)
+        node.line = eq.lineno
+        return self.spanned(node, name.lexpos)
+
+    def function_declaration(self):
+        start = self.expect('FUNCTION')
+        name = self.expect('ID')
+        parameters = self.optional_parameters()
+        self.expect('COLON')
+        return_type = self.simple_type()
+        self.expect('SEMICOLON')
+        declarations = self.declarations()
+        body = self.compound_statement()
+        self.expect('SEMICOLON')
+        node = ASTNode('function_declaration', [parameters, return_type, declarations, body], name.value)
+        node.line = start.lineno
+        return self.spanned(node, start.lexpos)
+
+    def procedure_declaration(self):
+        start = self.expect('PROCEDURE')
+        name = self.expect('ID')
+        parameters = self.optional_parameters()
+        self.expect('SEMICOLON')
+        declarations = self.declarations()
+        body = self.compound_statement()
+        self.expect('SEMICOLON')
+        node = ASTNode('procedure_declaration', [parameters, declarations, body], name.value)
+        node.line = start.lineno
+        return self.spanned(node, start.lexpos)
+
+    def optional_parameters(self):
+        """Lista de parâmetros entre parênteses (vazia se não existirem parênteses)."""
+        if self.type != 'LPAREN':
+            return ASTNode('parameter_list')
+        self.advance()
+        node = ASTNode('parameter_list', [self.parameter()])
+        while self.type == 'SEMICOLON':
+            self.advance()
+            node.children.append(self.parameter())
+        self.expect('RPAREN')
+        return self.spanned_by_children(node)
+
+    def parameter(self):
+        ids = self.id_list()
+        colon = self.expect('COLON')
+        node = ASTNode('parameter', [ids, self.simple_type()])
+        node.line = colon.lineno
+        return self.spanned(node, ids.start)
+
+    # ===== COMANDOS =====
+
+    def compound_statement(self):
+        start = self.expect('BEGIN')
+        statements = self.statement_list()
+        self.expect('END')
+        node = ASTNode('compound_statement', statements)
+        node.line = start.lineno
+        return self.spanned(node, start.lexpos)
+
+    def statement_list(self):
+        statement = self.statement()
+        statements = [statement] if statement else []
+        while self.type == 'SEMICOLON':
+            self.advance()
+            statement = self.statement()
+            if statement:  # Se o statement não for vazio
+                statements.append(statement)
+        return statements
+
+    def statement(self):
+        type = self.type
+        if type == 'ID':
+            return self.id_statement()
+        if type == 'BEGIN':
+            return self.compound_statement()
+        if type == 'IF':
+            return self.if_statement()
+        if type == 'WHILE':
+            return self.while_statement()
+        if type == 'FOR':
+            return self.for_statement()
+        if type == 'READ' or type == 'READLN':
+            return self.read_statement()
+        if type == 'WRITE' or type == 'WRITELN':
+            return self.write_statement()
+        if type in STATEMENT_FOLLOW:
+            return None  # Comando vazio
+        raise ParseError(self.token)
+
+    def id_statement(self):
+        """Atribuição ou chamada de procedimento (ambas começam por um ID)."""
+        name = self.expect('ID')
+        if self.type == 'ASSIGN' or self.type == 'LBRACKET':
+            target = self.var_rest(name)
+            assign = self.expect('ASSIGN')
+            node = ASTNode('assignment', [target, self.expr_bool()])
+            node.line = assign.lineno
+            return self.spanned(node, target.start)
+        if self.type == 'LPAREN':
+            node = ASTNode('procedure_call', [self.arguments()], name.value)
+        else:
+            node = ASTNode('procedure_call', value=name.value)
+        node.line = name.lineno
+        return self.spanned(node, name.lexpos)
+
+    def if_statement(self):
+        start = self.expect('IF')
+        condition = self.expr_bool()
+        self.expect('THEN')
+        then_branch = self.statement()
+        if self.type == 'ELSE':  # O else associa-se ao if mais próximo
+            self.advance()
+            node = ASTNode('if_statement', [condition, then_branch, self.statement()])
+        else:
+            node = ASTNode('if_statement', [condition, then_branch])
+        node.line = start.lineno
+        return self.spanned(node, start.lexpos)
+
+    def while_statement(self):
+        start = self.expect('WHILE')
+        condition = self.expr_bool()
+        self.expect('DO')
+        node = ASTNode('while_statement', [condition, self.statement()])
+        node.line = start.lineno
+        return self.spanned(node, start.lexpos)
+
+    def for_statement(self):
+        start = self.expect('FOR')
+        name = self.expect('ID')
+        self.expect('ASSIGN')
+        initial = self.expr_bool()
+        if self.type == 'TO':
+            direction = 'to'
+        elif self.type == 'DOWNTO':
+            direction = 'downto'
+        else:
+            raise ParseError(self.token)
+        self.advance()
+        final = self.expr_bool()
+        self.expect('DO')
+        node = ASTNode('for_statement', [initial, final, self.statement()], [name.value, direction])
+        node.line = start.lineno
+        return self.spanned(node, start.lexpos)
+
+    def read_statement(self):
+        start = self.token
+        self.advance()
+        if self.type == 'LPAREN':
+            self.advance()
+            variables = ASTNode('variable_list', [self.var()])
+            while self.type == 'COMMA':
+                self.advance()
+                variables.children.append(self.var())
+            self.spanned_by_children(variables)
+            self.expect('RPAREN')
+            node = ASTNode('read_statement', [variables], start.value)
+        elif start.type == 'READLN':  # readln sem argumentos
+            node = ASTNode('read_statement', value=start.value)
+        else:
+            raise ParseError(self.token)
+        node.line = start.lineno
+        return self.spanned(node, start.lexpos)
+
+    def write_statement(self):
+        start = self.token
+        self.advance()
+        if self.type == 'LPAREN':
+            self.advance()
+            if self.type == 'RPAREN':  # write() ou writeln() vazios
+                self.advance()
+                node = ASTNode('write_statement', value=start.value)
+            else:
+                expressions = ASTNode('expression_list', [self.expr_bool()])
+                while self.type == 'COMMA':
+                    self.advance()
+                    expressions.children.append(self.expr_bool())
+                self.spanned_by_children(expressions)
+                self.expect('RPAREN')
+                node = ASTNode('write_statement', [expressions], start.value)
+        elif start.type == 'WRITELN':  # writeln sem argumentos
+            node = ASTNode('write_statement', value=start.value)
+        else:
+            raise ParseError(self.token)
+        node.line = start.lineno
+        return self.spanned(node, start.lexpos)
+
+    def arguments(self):
+        """Lista de argumentos entre parênteses (o primeiro pode ser vazio, como na gramática)."""
+        self.expect('LPAREN')
+        first = self.token
+        if self.type == 'COMMA' or self.type == 'RPAREN':
+            node = ASTNode('argument_list', [])
+        else:
+            node = ASTNode('argument_list', [self.expr_bool()])
+        while self.type == 'COMMA':
+            self.advance()
+            node.children.append(self.expr_bool())
+        if first is not self.token:  # Como na gramática, o intervalo começa na primeira vírgula se o primeiro argumento for vazio
+            self.spanned(node, first.lexpos)
+        self.expect('RPAREN')
+        return node
+
+    def var(self):
+        return self.var_rest(self.expect('ID'))
+
+    def var_rest(self, name):
+        """Variável simples ou acesso a array, depois de lido o ID."""
+        if self.type == 'LBRACKET':
+            self.advance()
+            index = self.expr()
+            self.expect('RBRACKET')
+            node = ASTNode('array_access', [index], name.value)
+        else:
+            node = ASTNode('variable', value=name.value)
+        node.line = name.lineno
+        return self.spanned(node, name.lexpos)
+
+    # ===== EXPRESSÕES =====
+
+    def expr_bool(self):
+        return self.expression(REL_POWER)
+
+    def expr(self):
+        return self.expression(ADD_POWER)
+
+    def expression(self, min_power):
+        """Expressão binária por precedências (Pratt), associativa à esquerda."""
+        left = self.fator()
+        while True:
+            power = BINDING_POWER.get(self.type)
+            if power is None or power < min_power:
+                return left
+            operator = self.token.value
+            self.advance()
+            right = self.expression(power + 1)
+            left = self.spanned(ASTNode('binary_op', [left, right], operator), left.start)
+            if power == REL_POWER:
+                return left  # Os operadores relacionais não são associativos
+
+    def fator(self):
+        tok = self.token
+        type = self.type
+        if type == 'ID':
+            self.advance()
+            if self.type == 'LPAREN':
+                node = ASTNode('function_call', [self.arguments()], tok.value)
+                node.line = tok.lineno
+                return self.spanned(node, tok.lexpos)
+            return self.var_rest(tok)
+        if type in CONSTANTS:
+            self.advance()
+            return self.const(tok)
+        if type == 'LPAREN':
+            self.advance()
+            node = self.expr_bool()
+            self.expect('RPAREN')
+            return self.spanned(node, tok.lexpos)  # Os parênteses fazem parte do intervalo
+        if type == 'MINUS' or type == 'NOT':
+            self.advance()
+            node = ASTNode('unary_op', [self.fator()], tok.value)
+            node.line = tok.lineno
+            return self.spanned(node, tok.lexpos)
+        if type == 'LENGTH':
+            self.advance()
+            self.expect('LPAREN')
+            node = ASTNode('length_call', [self.expr_bool()], 'length')
+            self.expect('RPAREN')
+            node.line = tok.lineno
+            return self.spanned(node, tok.lexpos)
+        raise ParseError(tok)
+
+    def const(self, tok):
+        value = tok.value
+        if value in ['true', 'false', 'TRUE', 'FALSE']:
+            node = ASTNode('boolean', value=value)
+        elif isinstance(value, int):
+            node = ASTNode('number', value=value)
+        elif isinstance(value, float):
+            node = ASTNode('number', value=value)
+        else:
+            node = ASTNode('string', value=value)
+        node.line = tok.lineno
+        return self.spanned(node, tok.lexpos)
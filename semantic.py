@@ -1,11 +1,23 @@
 # semantic.py - Analisador semântico para Pascal Standard (CORRIGIDO)
-from symboltable import SymbolTable
+from astwalk import preorder, walk
+from constfold import evaluate_constant, operator_name, value_type
+from identifiers import identifier_key
+from nodekinds import dispatch_table, node_kind, K_STRING
+from semanticcache import subprogram_key, save_body, restore_body
+from symboltable import SymbolTable, GLOBAL, LOCAL
+from typesystem import ArrayType, INTEGER, REAL, BOOLEAN, STRING, NUMERIC, type_of, is_assignable
+
+# Nós que referem um símbolo pelo nome (anotados com o Symbol resolvido)
+NAME_KINDS = frozenset(node_kind(type) for type in ('variable', 'array_access', 'function_call'))
 
 class SemanticAnalyzer:
-    def __init__(self):
+    def __init__(self, cache=None):
         self.symbol_table = SymbolTable()
         self.errors = []
         self.warnings = []
+        self.global_size = 0     # Posições ocupadas na pilha global (os arrays ocupam uma por elemento)
+        self.local_count = None  # Variáveis locais do subprograma atual (None no programa principal)
+        self.cache = cache       # SemanticCache dos corpos dos subprogramas de topo (None: sem cache)
     
     def analyze(self, ast):
         """Analisa a árvore sintática abstrata."""
@@ -53,17 +65,29 @@ class SemanticAnalyzer:
             id_list_node = var_item.children[0]
             type_node = var_item.children[1]
             
-            var_type = self.get_type_name(type_node)
+            var_type = type_of(type_node)
             
             # Adiciona cada variável à tabela de símbolos
             for var_name in id_list_node.value:
-                if not self.symbol_table.add_symbol(var_name, var_type, 'variable', var_item.line):
+                var_symbol = self.symbol_table.add_symbol(var_name, var_type, 'variable', var_item.line)
+                if not var_symbol:
                     self.errors.append(f"Erro na linha {var_item.line}: Variável '{var_name}' já declarada no escopo atual")
-                
-                # Se for um array, adiciona as dimensões
-                if type_node.type == 'array_type':
-                    dimensions = type_node.value  # [start, end]
-                    self.symbol_table.add_array_dimensions(var_name, dimensions)
+                else:
+                    self.allocate_variable(var_symbol)
+    
+    def allocate_variable(self, var_symbol):
+        """Atribui à variável a sua posição: índice na pilha global ou offset local.
+
+        A ordem é a da geração de código: as globais pela ordem de declaração
+        (cada uma ocupa o tamanho do seu tipo) e as locais a partir do
+        offset 1 (o offset 0 guarda o valor de retorno das funções).
+        """
+        if self.local_count is None:
+            var_symbol.storage = (GLOBAL, self.global_size)
+            self.global_size += var_symbol.type.size
+        else:
+            self.local_count += 1
+            var_symbol.storage = (LOCAL, self.local_count)
     
     def analyze_const_declaration(self, const_declaration_node):
         """Analisa declarações de constantes."""
@@ -86,7 +110,7 @@ class SemanticAnalyzer:
             type_name = type_item.value
             type_node = type_item.children[0]
             
-            type_value = self.get_type_name(type_node)
+            type_value = type_of(type_node)
             
             if not self.symbol_table.add_symbol(type_name, type_value, 'type', type_item.line):
                 self.errors.append(f"Erro na linha {type_item.line}: Tipo '{type_name}' já declarado no escopo atual")
@@ -95,76 +119,122 @@ class SemanticAnalyzer:
         """Analisa declarações de funções."""
         function_name = function_node.value
         return_type_node = function_node.children[1]
-        return_type = self.get_type_name(return_type_node)
+        return_type = type_of(return_type_node)
         
         # Adiciona a função à tabela de símbolos
-        if not self.symbol_table.add_symbol(function_name, return_type, 'function', function_node.line):
+        function_node.symbol = self.symbol_table.add_symbol(function_name, return_type, 'function', function_node.line)
+        if not function_node.symbol:
             self.errors.append(f"Erro na linha {function_node.line}: Função '{function_name}' já declarada no escopo atual")
             return
         
-        # Entra no escopo da função
-        self.symbol_table.enter_scope(function_name)
-        
-        # Analisa os parâmetros
-        params_node = function_node.children[0]
-        self.analyze_parameters(params_node, function_name)
-        
-        # Analisa as declarações locais
-        local_declarations = function_node.children[2]
-        self.analyze_declarations(local_declarations)
-        
-        # Analisa o corpo da função
-        body_node = function_node.children[3]
-        self.analyze_compound_statement(body_node)
-        
-        # Verifica se a função tem um valor de retorno
-        self.check_function_return(function_name, body_node)
-        
-        # Sai do escopo da função
-        self.symbol_table.exit_scope()
+        # Analisa os parâmetros, as declarações locais e o corpo da função
+        self.declare_subprogram_parameters(function_node)
+        self.analyze_subprogram_body(function_node)
     
     def analyze_procedure_declaration(self, procedure_node):
         """Analisa declarações de procedimentos."""
         procedure_name = procedure_node.value
         
         # Adiciona o procedimento à tabela de símbolos
-        if not self.symbol_table.add_symbol(procedure_name, None, 'procedure', procedure_node.line):
+        procedure_node.symbol = self.symbol_table.add_symbol(procedure_name, None, 'procedure', procedure_node.line)
+        if not procedure_node.symbol:
             self.errors.append(f"Erro na linha {procedure_node.line}: Procedimento '{procedure_name}' já declarado no escopo atual")
             return
         
-        # Entra no escopo do procedimento
-        self.symbol_table.enter_scope(procedure_name)
+        # Analisa os parâmetros, as declarações locais e o corpo do procedimento
+        self.declare_subprogram_parameters(procedure_node)
+        self.analyze_subprogram_body(procedure_node)
+    
+    def declare_subprogram_parameters(self, subprogram_node):
+        """Declara os parâmetros no escopo do subprograma (completa a assinatura do símbolo)."""
+        self.symbol_table.enter_scope(subprogram_node.value)
+        self.analyze_parameters(subprogram_node.children[0], subprogram_node.value)
+        self.symbol_table.exit_scope()
+    
+    def analyze_subprogram_body(self, subprogram_node):
+        """Analisa as declarações locais e o corpo de uma função ou procedimento.
+
+        Só depende dos parâmetros e dos símbolos dos escopos envolventes
+        declarados antes do subprograma (semanticpool analisa assim os
+        corpos dos subprogramas de topo em paralelo, e semanticcache guarda
+        o resultado dos de topo).
+        """
+        cache_key = self.body_cache_key(subprogram_node)
+        if cache_key is not None and self.load_cached_body(subprogram_node, cache_key):
+            return
+        error_count, warning_count = len(self.errors), len(self.warnings)
+        
+        subprogram_name = subprogram_node.value
+        local_declarations, body_node = subprogram_node.children[-2:]
         
-        # Analisa os parâmetros
-        params_node = procedure_node.children[0]
-        self.analyze_parameters(params_node, procedure_name)
+        # Entra no escopo do subprograma
+        self.symbol_table.enter_scope(subprogram_name)
+        outer_local_count, self.local_count = self.local_count, 0
         
-        # Analisa as declarações locais
-        local_declarations = procedure_node.children[1]
         self.analyze_declarations(local_declarations)
-        
-        # Analisa o corpo do procedimento
-        body_node = procedure_node.children[2]
         self.analyze_compound_statement(body_node)
         
-        # Sai do escopo do procedimento
+        # Verifica se a função tem um valor de retorno
+        if subprogram_node.type == 'function_declaration':
+            self.check_function_return(subprogram_name, body_node)
+        
+        # Sai do escopo do subprograma
         self.symbol_table.exit_scope()
+        self.local_count = outer_local_count
+        
+        if cache_key is not None:
+            self.store_cached_body(subprogram_node, cache_key,
+                                   self.errors[error_count:], self.warnings[warning_count:])
+    
+    def body_cache_key(self, subprogram_node):
+        """Chave do corpo no cache (None sem cache ou num subprograma aninhado)."""
+        table = self.symbol_table
+        if self.cache is None or table.scope is not table.root:
+            return None
+        return subprogram_key(subprogram_node, table.root)
+    
+    def load_cached_body(self, subprogram_node, cache_key):
+        """Aplica o resultado guardado da análise do corpo; devolve False se não houver."""
+        data = self.cache.load(cache_key)
+        if data is None:
+            return False
+        root = self.symbol_table.root
+        scope = root.children[identifier_key(subprogram_node.value)]
+        try:
+            errors, warnings = restore_body(data, subprogram_node, scope, root)
+        except Exception:
+            return False  # Resultado ilegível: o corpo é analisado
+        self.errors.extend(errors)
+        self.warnings.extend(warnings)
+        self.symbol_table.generation += 1  # Os símbolos locais são novos objetos
+        return True
+    
+    def store_cached_body(self, subprogram_node, cache_key, errors, warnings):
+        root = self.symbol_table.root
+        scope = root.children[identifier_key(subprogram_node.value)]
+        self.cache.store(cache_key, save_body(subprogram_node, scope, root, errors, warnings))
     
     def analyze_parameters(self, params_node, subprogram_name):
         """Analisa os parâmetros de funções e procedimentos."""
         if params_node.type != 'parameter_list':
             return
         
+        # Os parâmetros ficam antes da moldura da chamada: o primeiro no offset -n, o último em -1
+        offset = -sum(len(param_node.children[0].value) for param_node in params_node.children)
         for param_node in params_node.children:
             id_list_node = param_node.children[0]
             type_node = param_node.children[1]
             
-            param_type = self.get_type_name(type_node)
+            param_type = type_of(type_node)
             
             # Adiciona cada parâmetro à tabela de símbolos
             for param_name in id_list_node.value:
-                if not self.symbol_table.add_symbol(param_name, param_type, 'parameter', param_node.line):
+                param_symbol = self.symbol_table.add_symbol(param_name, param_type, 'parameter', param_node.line)
+                if not param_symbol:
                     self.errors.append(f"Erro na linha {param_node.line}: Parâmetro '{param_name}' duplicado")
+                else:
+                    param_symbol.storage = (LOCAL, offset)
+                offset += 1
                 
                 # Adiciona o parâmetro à lista de parâmetros da função/procedimento
                 self.symbol_table.add_parameter(subprogram_name, param_name, param_type)
@@ -174,30 +244,28 @@ class SemanticAnalyzer:
         if compound_node.type != 'compound_statement':
             return
         
-        for statement in compound_node.children:
-            self.analyze_statement(statement)
+        self.analyze_statement(compound_node)
     
     def analyze_statement(self, statement_node):
-        """Analisa um comando."""
-        if statement_node is None:
-            return
-        
-        if statement_node.type == 'assignment':
-            self.analyze_assignment(statement_node)
-        elif statement_node.type == 'compound_statement':
-            self.analyze_compound_statement(statement_node)
-        elif statement_node.type == 'if_statement':
-            self.analyze_if_statement(statement_node)
-        elif statement_node.type == 'while_statement':
-            self.analyze_while_statement(statement_node)
-        elif statement_node.type == 'for_statement':
-            self.analyze_for_statement(statement_node)
-        elif statement_node.type == 'procedure_call':
-            self.analyze_procedure_call(statement_node)
-        elif statement_node.type == 'read_statement':
-            self.analyze_read_statement(statement_node)
-        elif statement_node.type == 'write_statement':
-            self.analyze_write_statement(statement_node)
+        """Analisa um comando e os comandos nele aninhados.
+
+        Os comandos aninhados ficam numa pilha explícita (a profundidade dos
+        blocos não está limitada pela recursão): cada tratador analisa o
+        próprio comando e devolve os comandos aninhados, pela ordem em que
+        são analisados.
+        """
+        pending = [statement_node]
+        while pending:
+            node = pending.pop()
+            if node is None:
+                continue
+            nested = self.STATEMENT_HANDLERS[node.kind](self, node)
+            if nested:
+                pending.extend(reversed(nested))
+    
+    def nested_statements(self, compound_node):
+        """Comandos de um bloco (tratador do compound_statement aninhado)."""
+        return compound_node.children
     
     def analyze_assignment(self, assignment_node):
         """Analisa uma atribuição."""
@@ -206,11 +274,12 @@ class SemanticAnalyzer:
         
         # Verifica se a variável existe
         var_name = var_node.value
-        var_symbol = self.symbol_table.lookup(var_name)
+        var_symbol = var_node.symbol = self.symbol_table.lookup(var_name)
         
         if not var_symbol:
             self.errors.append(f"Erro na linha {var_node.line}: Variável '{var_name}' não declarada")
             return
+        self.resolve_names(var_node.children)  # Índice do array (não verificado)
         
         if var_symbol.kind == 'constant':
             self.errors.append(f"Erro na linha {var_node.line}: Não é possível atribuir valor à constante '{var_name}'")
@@ -230,20 +299,14 @@ class SemanticAnalyzer:
     def analyze_if_statement(self, if_node):
         """Analisa um comando if."""
         condition_node = if_node.children[0]
-        then_node = if_node.children[1]
         
         # Verifica se a condição é booleana
         condition_type = self.check_expression_type(condition_node)
-        if condition_type is not None and condition_type != 'boolean':
+        if condition_type is not None and condition_type is not BOOLEAN:
             self.errors.append(f"Erro na linha {if_node.line}: Condição do if deve ser booleana, encontrado '{condition_type}'")
         
-        # Analisa o bloco then
-        self.analyze_statement(then_node)
-        
-        # Analisa o bloco else, se existir
-        if len(if_node.children) > 2:
-            else_node = if_node.children[2]
-            self.analyze_statement(else_node)
+        # Os blocos then e else (se existir) são analisados a seguir
+        return if_node.children[1:]
     
     def analyze_while_statement(self, while_node):
         """Analisa um comando while."""
@@ -252,11 +315,11 @@ class SemanticAnalyzer:
         
         # Verifica se a condição é booleana
         condition_type = self.check_expression_type(condition_node)
-        if condition_type is not None and condition_type != 'boolean':
+        if condition_type is not None and condition_type is not BOOLEAN:
             self.errors.append(f"Erro na linha {while_node.line}: Condição do while deve ser booleana, encontrado '{condition_type}'")
         
-        # Analisa o corpo do loop
-        self.analyze_statement(body_node)
+        # O corpo do loop é analisado a seguir
+        return (body_node,)
     
     def analyze_for_statement(self, for_node):
         """Analisa um comando for."""
@@ -267,30 +330,30 @@ class SemanticAnalyzer:
         body_node = for_node.children[2]
         
         # Verifica se a variável de controle existe e é inteira
-        var_symbol = self.symbol_table.lookup(var_name)
+        var_symbol = for_node.symbol = self.symbol_table.lookup(var_name)
         if not var_symbol:
             self.errors.append(f"Erro na linha {for_node.line}: Variável de controle '{var_name}' não declarada")
-        elif var_symbol.type != 'integer':
+        elif var_symbol.type is not INTEGER:
             self.errors.append(f"Erro na linha {for_node.line}: Variável de controle '{var_name}' deve ser do tipo integer")
         
         # Verifica se as expressões de início e fim são inteiras
         start_type = self.check_expression_type(start_expr)
-        if start_type is not None and start_type != 'integer':
+        if start_type is not None and start_type is not INTEGER:
             self.errors.append(f"Erro na linha {for_node.line}: Expressão inicial do for deve ser inteira, encontrado '{start_type}'")
         
         end_type = self.check_expression_type(end_expr)
-        if end_type is not None and end_type != 'integer':
+        if end_type is not None and end_type is not INTEGER:
             self.errors.append(f"Erro na linha {for_node.line}: Expressão final do for deve ser inteira, encontrado '{end_type}'")
         
-        # Analisa o corpo do loop
-        self.analyze_statement(body_node)
+        # O corpo do loop é analisado a seguir
+        return (body_node,)
     
     def analyze_procedure_call(self, call_node):
         """Analisa uma chamada de procedimento."""
         proc_name = call_node.value
         
         # Verifica se o procedimento existe
-        proc_symbol = self.symbol_table.lookup(proc_name)
+        proc_symbol = call_node.symbol = self.symbol_table.lookup(proc_name)
         if not proc_symbol:
             self.errors.append(f"Erro na linha {call_node.line}: Procedimento '{proc_name}' não declarado")
             return
@@ -314,12 +377,21 @@ class SemanticAnalyzer:
         var_list_node = read_node.children[0]
         for var_node in var_list_node.children:
             var_name = var_node.value
-            var_symbol = self.symbol_table.lookup(var_name)
+            var_symbol = var_node.symbol = self.symbol_table.lookup(var_name)
             
             if not var_symbol:
                 self.errors.append(f"Erro na linha {var_node.line}: Variável '{var_name}' não declarada")
             elif var_symbol.kind == 'constant':
                 self.errors.append(f"Erro na linha {var_node.line}: Não é possível ler para constante '{var_name}'")
+            self.resolve_names(var_node.children)  # Índice do array (não verificado)
+    
+    def resolve_names(self, nodes):
+        """Anota com o Symbol os nomes usados em subárvores que não passam por
+        check_expression_type (índices dos arrays atribuídos ou lidos)."""
+        for root in nodes:
+            for node, _ in preorder(root):
+                if node.kind in NAME_KINDS:
+                    node.symbol = self.symbol_table.lookup(node.value)
     
     def analyze_write_statement(self, write_node):
         """Analisa um comando write/writeln."""
@@ -337,265 +409,278 @@ class SemanticAnalyzer:
         # Simplificação: apenas verifica se há uma atribuição para a função no corpo
         has_return = False
         
-        # Função recursiva para procurar atribuições à função
-        def find_return(node):
-            nonlocal has_return
-            if node is None:
-                return
-            
+        # Procura atribuições à função (percurso iterativo)
+        function_key = identifier_key(function_name)
+        for node, _ in preorder(body_node):
             if node.type == 'assignment':
                 var_node = node.children[0]
-                if var_node.type == 'variable' and var_node.value == function_name:
+                if var_node.type == 'variable' and identifier_key(var_node.value) == function_key:
                     has_return = True
-            
-            for child in node.children:
-                if isinstance(child, list):
-                    for item in child:
-                        find_return(item)
-                else:
-                    find_return(child)
-        
-        find_return(body_node)
+                    break
         
         if not has_return:
             self.warnings.append(f"Aviso: Função '{function_name}' pode não retornar um valor")
     
     def check_arguments(self, args_node, subprogram_symbol, line):
         """Verifica os argumentos de uma chamada de função/procedimento."""
-        if args_node.type != 'argument_list':
+        if not self.check_argument_count(args_node, subprogram_symbol, line):
             return
         
-        # Verifica o número de argumentos
+        # Verifica o tipo de cada argumento
+        for i, arg_node in enumerate(args_node.children):
+            self.check_argument_type(i, self.check_expression_type(arg_node), subprogram_symbol, line)
+    
+    def check_argument_count(self, args_node, subprogram_symbol, line):
+        """Verifica o número de argumentos (devolve False se não for possível verificar os tipos)."""
+        if args_node.type != 'argument_list':
+            return False
+        
         if len(args_node.children) != len(subprogram_symbol.params):
             self.errors.append(f"Erro na linha {line}: Número incorreto de argumentos para '{subprogram_symbol.name}'. Esperado {len(subprogram_symbol.params)}, encontrado {len(args_node.children)}")
-            return
+            return False
+        return True
+    
+    def check_argument_type(self, i, arg_type, subprogram_symbol, line):
+        """Verifica o tipo do argumento i face ao parâmetro correspondente."""
+        param_type = subprogram_symbol.params[i].type
         
-        # Verifica o tipo de cada argumento
-        for i, arg_node in enumerate(args_node.children):
-            arg_type = self.check_expression_type(arg_node)
-            param_type = subprogram_symbol.params[i].type
-            
-            if arg_type is not None and not self.are_types_compatible(param_type, arg_type):
-                self.errors.append(f"Erro na linha {line}: Tipo incompatível para argumento {i+1} de '{subprogram_symbol.name}'. Esperado '{param_type}', encontrado '{arg_type}'")
+        if arg_type is not None and not self.are_types_compatible(param_type, arg_type):
+            self.errors.append(f"Erro na linha {line}: Tipo incompatível para argumento {i+1} de '{subprogram_symbol.name}'. Esperado '{param_type}', encontrado '{arg_type}'")
     
     def check_expression_type(self, expr_node):
-        """Verifica o tipo de uma expressão."""
-        if expr_node is None:
+        """Verifica o tipo de uma expressão.
+        
+        A expressão é percorrida com uma pilha explícita: à entrada de cada nó
+        são feitas as verificações que decidem que subexpressões visitar e, à
+        saída, o tipo é calculado a partir dos tipos dos filhos. O tratamento
+        de cada tipo de nó é escolhido nas tabelas ENTER_EXPRESSION e
+        EXPRESSION_TYPE.
+        
+        O tipo de cada nó fica registado em node.expr_type, onde a geração de
+        código o lê em vez de o recalcular. Cada análise volta a registar os
+        tipos (uma nova análise da mesma árvore pode ter declarações diferentes).
+        """
+        return walk(expr_node, self.enter_expression, self.leave_expression)
+    
+    def enter_expression(self, expr_node):
+        """Entrada num nó de expressão: devolve as subexpressões a verificar (None se não houver tipo)."""
+        return self.ENTER_EXPRESSION[expr_node.kind](self, expr_node)
+    
+    def leave_expression(self, expr_node, child_types):
+        """Saída de um nó de expressão: calcula o seu tipo a partir dos tipos dos filhos."""
+        expr_type = expr_node.expr_type = self.EXPRESSION_TYPE[expr_node.kind](self, expr_node, child_types)
+        return expr_type
+    
+    def enter_operands(self, expr_node):
+        return expr_node.children
+    
+    def enter_leaf(self, expr_node):
+        return ()
+    
+    def enter_other(self, expr_node):
+        return None  # Nó que não é uma expressão: sem tipo
+    
+    def enter_variable(self, expr_node):
+        var_name = expr_node.value
+        var_symbol = expr_node.symbol = self.symbol_table.lookup(var_name)
+        
+        if not var_symbol:
+            self.errors.append(f"Erro na linha {expr_node.line}: Variável '{var_name}' não declarada")
             return None
         
-        if expr_node.type == 'number':
-            # Verifica se é inteiro ou real
-            if isinstance(expr_node.value, int):
-                return 'integer'
-            else:
-                return 'real'
+        return ()
+    
+    def enter_array_access(self, expr_node):
+        array_name = expr_node.value
         
-        elif expr_node.type == 'string':
-            return 'string'
+        # Verifica se a variável existe
+        var_symbol = expr_node.symbol = self.symbol_table.lookup(array_name)
+        if not var_symbol:
+            self.errors.append(f"Erro na linha {expr_node.line}: Variável '{array_name}' não declarada")
+            return None
         
-        elif expr_node.type == 'boolean':
-            return 'boolean'
+        # Se não for nem string nem array
+        if var_symbol.type is not STRING and var_symbol.type.__class__ is not ArrayType:
+            self.errors.append(f"Erro na linha {expr_node.line}: '{array_name}' não é um array nem uma string")
+            return None
         
-        elif expr_node.type == 'variable':
-            var_name = expr_node.value
-            var_symbol = self.symbol_table.lookup(var_name)
-            
-            if not var_symbol:
-                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Variável '{var_name}' não declarada")
-                return None
-            
-            return var_symbol.type
+        return expr_node.children  # Verifica o índice
+    
+    def enter_function_call(self, expr_node):
+        func_name = expr_node.value
         
-        elif expr_node.type == 'array_access':
-            array_name = expr_node.value
-            index_node = expr_node.children[0]
-            
-            # Verifica se a variável existe
-            var_symbol = self.symbol_table.lookup(array_name)
-            if not var_symbol:
-                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Variável '{array_name}' não declarada")
-                return None
-            
-            # Se for uma string, trata como acesso a caractere
-            if var_symbol.type == 'string':
-                # Verifica se o índice é inteiro
-                index_type = self.check_expression_type(index_node)
-                if index_type is not None and index_type != 'integer':
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Índice de string deve ser inteiro, encontrado '{index_type}'")
-                # Em Pascal, um caractere de string é tratado como integer (código ASCII)
-                return 'integer'
-            
-            # Se for um array
-            elif var_symbol.array_dims:
-                # Verifica se o índice é inteiro
-                index_type = self.check_expression_type(index_node)
-                if index_type is not None and index_type != 'integer':
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Índice de array deve ser inteiro, encontrado '{index_type}'")
-                
-                # Retorna o tipo do elemento do array
-                if 'array of' in var_symbol.type:
-                    return var_symbol.type.split(' of ')[1]
+        # Verifica se a função existe
+        func_symbol = expr_node.symbol = self.symbol_table.lookup(func_name)
+        if not func_symbol:
+            self.errors.append(f"Erro na linha {expr_node.line}: Função '{func_name}' não declarada")
+            return None
+        
+        if func_symbol.kind != 'function':
+            self.errors.append(f"Erro na linha {expr_node.line}: '{func_name}' não é uma função")
+            return None
+        
+        # Verifica o número de argumentos; os tipos são verificados à saída
+        if len(expr_node.children) > 0:
+            args_node = expr_node.children[0]
+            if self.check_argument_count(args_node, func_symbol, expr_node.line):
+                return args_node.children
+        return ()
+    
+    def type_other(self, expr_node, child_types):
+        return None
+    
+    def type_number(self, expr_node, child_types):
+        # Verifica se é inteiro ou real
+        if isinstance(expr_node.value, int):
+            return INTEGER
+        else:
+            return REAL
+    
+    def type_string(self, expr_node, child_types):
+        return STRING
+    
+    def type_boolean(self, expr_node, child_types):
+        return BOOLEAN
+    
+    def type_variable(self, expr_node, child_types):
+        return expr_node.symbol.type
+    
+    def type_array_access(self, expr_node, child_types):
+        var_symbol = expr_node.symbol
+        index_type = child_types[0]
+        
+        # Se for uma string, trata como acesso a caractere
+        if var_symbol.type is STRING:
+            # Verifica se o índice é inteiro
+            if index_type is not None and index_type is not INTEGER:
+                self.errors.append(f"Erro na linha {expr_node.line}: Índice de string deve ser inteiro, encontrado '{index_type}'")
+            # Em Pascal, um caractere de string é tratado como integer (código ASCII)
+            return INTEGER
+        
+        # Se for um array: verifica se o índice é inteiro
+        if index_type is not None and index_type is not INTEGER:
+            self.errors.append(f"Erro na linha {expr_node.line}: Índice de array deve ser inteiro, encontrado '{index_type}'")
+        
+        # Retorna o tipo do elemento do array
+        return var_symbol.type.element
+    
+    def type_length_call(self, expr_node, child_types):
+        arg_type = child_types[0]
+        
+        if arg_type is not None and arg_type is not STRING:
+            self.errors.append(f"Erro na linha {expr_node.line}: Função length() requer argumento string, encontrado '{arg_type}'")
+            return None
+        
+        return INTEGER  # length() retorna um inteiro
+    
+    def type_function_call(self, expr_node, child_types):
+        func_symbol = expr_node.symbol
+        
+        # Verifica o tipo de cada argumento (só visitados se o número estava certo)
+        for i, arg_type in enumerate(child_types):
+            self.check_argument_type(i, arg_type, func_symbol, expr_node.line)
+        
+        return func_symbol.type
+    
+    def type_binary_op(self, expr_node, child_types):
+        operator = expr_node.value  # O lexema ('+', 'div'), usado nas mensagens
+        name = operator_name(operator)
+        left_type, right_type = child_types
+        
+        if left_type is None or right_type is None:
+            return None
+        
+        # Operadores aritméticos
+        if name in ['PLUS', 'MINUS', 'TIMES', 'DIVIDE']:
+            if left_type in NUMERIC and right_type in NUMERIC:
+                # Se um dos operandos for real, o resultado é real
+                if left_type is REAL or right_type is REAL:
+                    return REAL
                 else:
-                    return 'integer'
-            
-            # Se não for nem string nem array
+                    return INTEGER
             else:
-                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: '{array_name}' não é um array nem uma string")
-                return None
-            
-        # Em semantic.py, no método check_expression_type
-        elif expr_node.type == 'length_call':
-                arg_node = expr_node.children[0]
-                arg_type = self.check_expression_type(arg_node)
-
-                if arg_type is not None and arg_type != 'string':
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Função length() requer argumento string, encontrado '{arg_type}'")
-                    return None
-
-                return 'integer'  # length() retorna um inteiro
-
-        elif expr_node.type == 'function_call':
-            func_name = expr_node.value
-            
-            # Verifica se a função existe
-            func_symbol = self.symbol_table.lookup(func_name)
-            if not func_symbol:
-                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Função '{func_name}' não declarada")
+                self.errors.append(f"Erro na linha {expr_node.line}: Operador '{operator}' requer operandos numéricos")
                 return None
-            
-            if func_symbol.kind != 'function':
-                self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: '{func_name}' não é uma função")
+        
+        # Operadores div e mod
+        elif name in ['DIV', 'MOD']:
+            if left_type is INTEGER and right_type is INTEGER:
+                return INTEGER
+            else:
+                self.errors.append(f"Erro na linha {expr_node.line}: Operador '{operator}' requer operandos inteiros")
                 return None
-            
-            # Verifica os argumentos
-            if len(expr_node.children) > 0:
-                args_node = expr_node.children[0]
-                self.check_arguments(args_node, func_symbol, getattr(expr_node, 'line', 0))
-            
-            return func_symbol.type
         
-        elif expr_node.type == 'binary_op':
-            left_node = expr_node.children[0]
-            right_node = expr_node.children[1]
-            operator = expr_node.value
-            
-            left_type = self.check_expression_type(left_node)
-            right_type = self.check_expression_type(right_node)
-            
-            if left_type is None or right_type is None:
+        # Operadores relacionais: integer e real comparam-se pelos dois lados; um literal
+        # de um caractere é o seu código (como na geração de código) e compara-se com integer
+        elif name in ['EQ', 'NEQ', 'LT', 'GT', 'LTE', 'GTE']:
+            left, right = expr_node.children
+            if (self.are_types_compatible(left_type, right_type)
+                    or self.are_types_compatible(right_type, left_type)
+                    or (left_type is INTEGER and self.is_character_literal(right))
+                    or (right_type is INTEGER and self.is_character_literal(left))):
+                return BOOLEAN
+            else:
+                self.errors.append(f"Erro na linha {expr_node.line}: Tipos incompatíveis para operador '{operator}'")
                 return None
-            
-            # Operadores aritméticos
-            if operator in ['PLUS', 'MINUS', 'TIMES', 'DIVIDE']:
-                if left_type in ['integer', 'real'] and right_type in ['integer', 'real']:
-                    # Se um dos operandos for real, o resultado é real
-                    if left_type == 'real' or right_type == 'real':
-                        return 'real'
-                    else:
-                        return 'integer'
-                else:
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador '{operator}' requer operandos numéricos")
-                    return None
-            
-            # Operadores div e mod
-            elif operator in ['DIV', 'MOD']:
-                if left_type == 'integer' and right_type == 'integer':
-                    return 'integer'
-                else:
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador '{operator}' requer operandos inteiros")
-                    return None
-            
-            # Operadores relacionais
-            elif operator in ['EQ', 'NEQ', 'LT', 'GT', 'LTE', 'GTE']:
-                if self.are_types_compatible(left_type, right_type):
-                    return 'boolean'
-                else:
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Tipos incompatíveis para operador '{operator}'")
-                    return None
-            
-            # Operadores lógicos
-            elif operator in ['AND', 'OR']:
-                if left_type == 'boolean' and right_type == 'boolean':
-                    return 'boolean'
-                else:
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador '{operator}' requer operandos booleanos")
-                    return None
         
-        elif expr_node.type == 'unary_op':
-            operand_node = expr_node.children[0]
-            operator = expr_node.value
-            
-            operand_type = self.check_expression_type(operand_node)
-            
-            if operand_type is None:
+        # Operadores lógicos
+        elif name in ['AND', 'OR']:
+            if left_type is BOOLEAN and right_type is BOOLEAN:
+                return BOOLEAN
+            else:
+                self.errors.append(f"Erro na linha {expr_node.line}: Operador '{operator}' requer operandos booleanos")
                 return None
-            
-            # Operador unário -
-            if operator == 'MINUS':
-                if operand_type in ['integer', 'real']:
-                    return operand_type
-                else:
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador unário '-' requer operando numérico")
-                    return None
-            
-            # Operador not
-            elif operator == 'NOT':
-                if operand_type == 'boolean':
-                    return 'boolean'
-                else:
-                    self.errors.append(f"Erro na linha {getattr(expr_node, 'line', 0)}: Operador 'not' requer operando booleano")
-                    return None
         
         return None
     
-    def get_type_name(self, type_node):
-        """Obtém o nome do tipo a partir do nó de tipo."""
-        if type_node.type == 'type':
-            return type_node.value
-        elif type_node.type == 'array_type':
-            element_type = self.get_type_name(type_node.children[0])
-            return f"array of {element_type}"
-        return None
-    
-    def are_types_compatible(self, type1, type2):
-        """Verifica se dois tipos são compatíveis."""
-        if type1 is None or type2 is None:
-            return False
-        
-        # Tipos iguais são compatíveis
-        if type1 == type2:
-            return True
+    def type_unary_op(self, expr_node, child_types):
+        operator = operator_name(expr_node.value)
+        operand_type = child_types[0]
         
-        # Integer é compatível com real (mas não o contrário)
-        if type1 == 'real' and type2 == 'integer':
-            return True
+        if operand_type is None:
+            return None
         
-        # Para strings e caracteres (representados como integer em Pascal)
-        # Caractere individual pode ser tratado como integer
-        if type1 == 'integer' and type2 == 'string':
-            return False  # String não pode ser atribuída a integer diretamente
+        # Operador unário -
+        if operator == 'MINUS':
+            if operand_type in NUMERIC:
+                return operand_type
+            else:
+                self.errors.append(f"Erro na linha {expr_node.line}: Operador unário '-' requer operando numérico")
+                return None
         
-        if type1 == 'string' and type2 == 'integer':
-            return False  # Integer não pode ser atribuído a string diretamente
+        # Operador not
+        elif operator == 'NOT':
+            if operand_type is BOOLEAN:
+                return BOOLEAN
+            else:
+                self.errors.append(f"Erro na linha {expr_node.line}: Operador 'not' requer operando booleano")
+                return None
         
-        return False
+        return None
+    
+    def is_character_literal(self, expr_node):
+        """Literal string de um só caractere (o código gerado empilha o código ASCII)."""
+        return expr_node.kind == K_STRING and len(expr_node.value) == 1
+    
+    def are_types_compatible(self, type1, type2):
+        """Verifica se dois tipos são compatíveis.
+
+        Os tipos são únicos: tipos iguais são o mesmo objeto. Integer é
+        compatível com real (mas não o contrário); string e integer (os
+        caracteres) não são compatíveis entre si.
+        """
+        return is_assignable(type1, type2)
     
     def evaluate_constant_expression(self, expr_node):
-        """Avalia uma expressão constante para determinar seu tipo e valor."""
-        if expr_node.type == 'number':
-            if isinstance(expr_node.value, int):
-                return 'integer', expr_node.value
-            else:
-                return 'real', expr_node.value
-        
-        elif expr_node.type == 'string':
-            return 'string', expr_node.value
-        
-        elif expr_node.type == 'boolean':
-            return 'boolean', expr_node.value.lower() == 'true'
-        
-        # Para simplificar, não avaliamos expressões complexas
-        return None, None
+        """Avalia uma expressão constante para determinar seu tipo e valor.
+
+        Aceita literais, operadores sobre constantes, length de strings
+        constantes e referências a constantes já declaradas.
+        """
+        value = evaluate_constant(expr_node, self.symbol_table.lookup)
+        if value is None:
+            return None, None
+        return value_type(value), value
     
     def print_errors(self):
         """Imprime os erros encontrados."""
@@ -612,6 +697,43 @@ class SemanticAnalyzer:
             print("\n=== AVISOS ===")
             for warning in self.warnings:
                 print(warning)
+    
+    # ===== TABELAS DE DESPACHO (indexadas por ASTNode.kind) =====
+    
+    STATEMENT_HANDLERS = dispatch_table({
+        'assignment': analyze_assignment,
+        'compound_statement': nested_statements,
+        'if_statement': analyze_if_statement,
+        'while_statement': analyze_while_statement,
+        'for_statement': analyze_for_statement,
+        'procedure_call': analyze_procedure_call,
+        'read_statement': analyze_read_statement,
+        'write_statement': analyze_write_statement,
+    }, default=lambda self, node: None)
+    
+    ENTER_EXPRESSION = dispatch_table({
+        'number': enter_leaf,
+        'string': enter_leaf,
+        'boolean': enter_leaf,
+        'variable': enter_variable,
+        'array_access': enter_array_access,
+        'function_call': enter_function_call,
+        'length_call': enter_operands,
+        'binary_op': enter_operands,
+        'unary_op': enter_operands,
+    }, default=enter_other)
+    
+    EXPRESSION_TYPE = dispatch_table({
+        'number': type_number,
+        'string': type_string,
+        'boolean': type_boolean,
+        'variable': type_variable,
+        'array_access': type_array_access,
+        'length_call': type_length_call,
+        'function_call': type_function_call,
+        'binary_op': type_binary_op,
+        'unary_op': type_unary_op,
+    }, default=type_other)
 
 # Exemplo de uso
 if __name__ == "__main__":
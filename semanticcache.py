@@ -0,0 +1,302 @@
+# semanticcache.py - Cache em disco da análise semântica dos subprogramas de topo
+#
+# O resultado da análise do corpo de um subprograma de topo (diagnósticos,
+# símbolos locais e anotações symbol e expr_type dos nós) só depende da sua
+# subárvore e dos símbolos globais a que os seus nomes se referem. Fica
+# guardado num ficheiro cujo nome é o hash dessas duas coisas: numa nova
+# compilação, um subprograma que não mudou (nem as assinaturas dos globais
+# que usa) é lido do cache em vez de ser analisado. Os símbolos globais e os
+# parâmetros entram no pickle pela chave do nome e são, ao ler, os da
+# compilação atual.
+import hashlib
+import io
+import marshal
+import os
+import pickle
+import sys
+import tempfile
+
+from astwalk import subtree_nodes
+from identifiers import identifier_key
+from nodekinds import node_kind, K_FOR_STATEMENT
+from symboltable import Symbol
+from typesystem import ArrayType
+
+# Diretório dos resultados: os ficheiros são lidos com pickle, pelo que o diretório tem de
+# ser de confiança. Por omissão fica no cache do utilizador ($XDG_CACHE_HOME ou ~/.cache),
+# não junto das fontes; PASCAL_CACHE_DIR também o redefine (subdiretório semantic)
+CACHE_DIR = os.path.join(
+    os.environ.get('PASCAL_CACHE_DIR')
+    or os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                    'pascal-compiler'),
+    'semantic')
+
+# Tamanho máximo do cache; quando é excedido saem os ficheiros usados há mais
+# tempo até o cache ocupar EVICT_TO desse tamanho (não se limpa a cada escrita)
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+EVICT_TO = 0.75
+
+# Módulos de que depende o resultado da análise (o semantic e os que ele importa, incluindo
+# as tabelas de despacho e os percursos da árvore): alterá-los invalida o cache
+ANALYZER_MODULES = ('semantic', 'astwalk', 'constfold', 'identifiers', 'nodekinds',
+                    'semanticcache', 'symboltable', 'typesystem')
+
+# Nós cujo valor é um nome procurado na tabela de símbolos (no for, é o primeiro elemento)
+NAME_KINDS = frozenset(node_kind(type) for type in
+                       ('variable', 'array_access', 'function_call', 'procedure_call'))
+
+# Referências nos pickles: escopo do subprograma, símbolos globais e parâmetros (pela chave)
+SCOPE_REF = 'scope'
+GLOBAL_REF = 'global'
+PARAMETER_REF = 'parameter'
+
+_version = None  # Hash dos ANALYZER_MODULES (calculado uma vez)
+
+
+def analyzer_version():
+    """Hash das fontes do analisador e da versão do Python (entra em todas as chaves)."""
+    global _version
+    if _version is None:
+        digest = hashlib.sha256(repr(sys.version_info[:2]).encode('utf-8'))
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in ANALYZER_MODULES:
+            with open(os.path.join(directory, f"{name}.py"), 'rb') as f:
+                digest.update(f.read())
+        _version = digest.digest()
+    return _version
+
+
+def type_signature(type):
+    """Descrição de um tipo (os arrays com limites diferentes têm o mesmo nome)."""
+    if type.__class__ is ArrayType:
+        return ('array', type_signature(type.element), type.start, type.end)
+    return None if type is None else type.name
+
+
+def symbol_signature(symbol):
+    """O que a análise de um corpo pode usar de um símbolo global (None se o nome não existir)."""
+    if symbol is None:
+        return None
+    return (symbol.name, symbol.kind, type_signature(symbol.type), symbol.value,
+            tuple(type_signature(param.type) for param in symbol.params))
+
+
+def subprogram_key(subprogram_node, root):
+    """Chave do resultado da análise do corpo de um subprograma de topo.
+
+    É o hash da subárvore (tipos, valores e linhas dos nós: as linhas
+    aparecem nas mensagens) e das assinaturas dos símbolos globais
+    visíveis com os nomes usados nela. Deve ser calculada no momento em
+    que o corpo seria analisado, com os globais declarados até aí.
+    """
+    names = set()
+    shape = []  # (tipo, valor, linha, nº de filhos) de cada nó, seguidos
+    append = shape.append
+    nodes = [subprogram_node]
+    for node in nodes:
+        if node is None:
+            append(None)
+            continue
+        children = node.children
+        append(node.type)
+        append(node.value)
+        append(node.line)
+        append(len(children))
+        nodes.extend(children)
+        kind = node.kind
+        if kind in NAME_KINDS:
+            names.add(identifier_key(node.value))
+        elif kind == K_FOR_STATEMENT:
+            names.add(identifier_key(node.value[0]))
+    symbols = root.symbols
+    for name in sorted(names):
+        append(name)
+        append(symbol_signature(symbols.get(name)))
+    return hashlib.sha256(analyzer_version() + marshal.dumps(shape)).hexdigest()
+
+
+class ResultPickler(pickle.Pickler):
+    """Pickler que guarda os símbolos globais, os parâmetros e o escopo do subprograma como referências."""
+
+    def __init__(self, file, root, scope):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.root = root
+        self.scope = scope
+
+    def persistent_id(self, obj):
+        if obj.__class__ is Symbol:
+            # Os globais e os parâmetros são os símbolos com o seu nome no respetivo escopo;
+            # os locais são copiados
+            key = identifier_key(obj.name)
+            if self.root.symbols.get(key) is obj:
+                return GLOBAL_REF, key
+            if obj.kind == 'parameter' and self.scope.symbols.get(key) is obj:
+                return PARAMETER_REF, key
+            return None
+        if obj is self.scope:
+            return SCOPE_REF
+        return None
+
+
+class ResultUnpickler(pickle.Unpickler):
+    def __init__(self, file, root, scope):
+        super().__init__(file)
+        self.root = root
+        self.scope = scope
+
+    def persistent_load(self, ref):
+        if ref == SCOPE_REF:
+            return self.scope
+        kind, key = ref
+        # KeyError se o símbolo não existir nesta compilação (o resultado não serve)
+        return (self.root.symbols if kind == GLOBAL_REF else self.scope.symbols)[key]
+
+
+def save_body(subprogram_node, scope, root, errors, warnings):
+    """Resultado da análise do corpo, em bytes: diagnósticos, símbolos do escopo e anotações."""
+    nodes = subtree_nodes(subprogram_node)
+    result = (errors, warnings, scope.symbols, scope.children, len(nodes),
+              [node and node.symbol for node in nodes[1:]], [node and node.expr_type for node in nodes[1:]])
+    buffer = io.BytesIO()
+    ResultPickler(buffer, root, scope).dump(result)
+    return buffer.getvalue()
+
+
+def restore_body(data, subprogram_node, scope, root):
+    """Aplica um resultado de save_body ao subprograma; devolve (erros, avisos).
+
+    O escopo deve ter só os parâmetros. Se o resultado não servir (ficheiro
+    corrompido, símbolo inexistente, árvore com outra forma) é lançada uma
+    exceção antes de se alterar o escopo ou a árvore.
+    """
+    errors, warnings, symbols, children, count, node_symbols, expr_types = ResultUnpickler(
+        io.BytesIO(data), root, scope).load()
+    nodes = subtree_nodes(subprogram_node)
+    if count != len(nodes):
+        raise ValueError("resultado de outra árvore")
+    scope.symbols = symbols
+    scope.children = children
+    for index in range(1, count):  # A raiz (a declaração) já foi anotada
+        node = nodes[index]
+        if node is not None:
+            node.symbol = node_symbols[index - 1]
+            node.expr_type = expr_types[index - 1]
+    return errors, warnings
+
+
+def is_trusted_directory(directory):
+    """O diretório pertence ao utilizador e só ele lá pode escrever?
+
+    Ler um pickle executa o código que ele indicar: um diretório onde outros
+    podem escrever (partilhado, ou junto de fontes alheias) não é usado.
+    """
+    try:
+        stat = os.stat(directory)
+    except OSError:
+        return False
+    if not hasattr(os, 'getuid'):  # Sem donos nem permissões POSIX
+        return True
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+class SemanticCache:
+    """Resultados em disco, um ficheiro por chave, com tamanho limitado (LRU).
+
+    A data de modificação de cada ficheiro marca o seu último uso: é
+    atualizada em cada leitura e os ficheiros mais antigos saem primeiro.
+    Os erros de escrita e leitura são ignorados (o corpo é analisado).
+
+    Os resultados são pickles: o diretório tem de ser de confiança. É
+    criado só para o utilizador e, se existir e não lhe pertencer ou outros
+    puderem escrever nele, o cache não é usado.
+    """
+
+    def __init__(self, directory=None, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory or CACHE_DIR
+        self.max_bytes = max_bytes
+        self.size = None  # Bytes ocupados (contados na primeira escrita)
+        self.trusted = None  # Resultado de is_trusted_directory (verificado uma vez)
+
+    def usable(self, create=False):
+        """O diretório existe (ou, com create, foi criado) e é de confiança?"""
+        if self.trusted is None:
+            if create:
+                try:
+                    os.makedirs(self.directory, mode=0o700, exist_ok=True)
+                except OSError:
+                    return False
+            elif not os.path.isdir(self.directory):
+                return False
+            self.trusted = is_trusted_directory(self.directory)
+        return self.trusted
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.pickle")
+
+    def load(self, key):
+        """Conteúdo guardado com a chave (None se não existir)."""
+        if not self.usable():
+            return None
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def store(self, key, data):
+        """Guarda o conteúdo de forma atómica (os.replace) e limita o tamanho do cache."""
+        if not self.usable(create=True):
+            return False
+        try:
+            if self.size is None:
+                self.size = sum(size for _, size, _ in self.entries())
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        except OSError:
+            return False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.evict()
+        return True
+
+    def entries(self):
+        """(data do último uso, tamanho, caminho) de cada resultado guardado."""
+        entries = []
+        try:
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if entry.name.endswith('.pickle'):
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue  # Retirado entretanto por outro processo
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            pass
+        return entries
+
+    def evict(self):
+        """Retira os resultados usados há mais tempo até o cache ocupar EVICT_TO do máximo."""
+        entries = sorted(self.entries())
+        self.size = sum(size for _, size, _ in entries)
+        limit = self.max_bytes * EVICT_TO
+        for _, size, path in entries:
+            if self.size <= limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.size -= size
@@ -0,0 +1,218 @@
+# semanticpool.py - Análise semântica dos corpos dos subprogramas num conjunto de processos
+#
+# Depois de declarados os símbolos globais e os parâmetros de cada
+# subprograma de topo, o corpo de cada um só depende desses símbolos: os
+# corpos são analisados em paralelo por processos criados nesse momento
+# (com fork), que herdam a árvore e uma cópia congelada do escopo global sem
+# a serializar. Cada processo devolve os diagnósticos, os símbolos locais e
+# as anotações (symbol e expr_type) dos nós; os símbolos globais voltam a
+# ser os objetos do processo principal.
+import io
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from astwalk import subtree_nodes
+from identifiers import identifier_key
+from semantic import SemanticAnalyzer
+from symboltable import Scope, Symbol
+
+# Abaixo deste número de subprogramas de topo o arranque dos processos não compensa
+MIN_PARALLEL_SUBPROGRAMS = 16
+
+# Referência ao escopo do subprograma analisado nos pickles dos resultados
+SCOPE_REF = 'scope'
+
+
+class GlobalSnapshot:
+    """Cópia congelada do escopo global, feita depois de declarados os subprogramas.
+
+    symbols são os pares (chave, símbolo) globais pela ordem de declaração e
+    parameters os pares dos parâmetros de cada subprograma de topo, pela
+    chave do nome. Os símbolos são referidos nos pickles dos resultados
+    pela sua posição em shared.
+    """
+
+    def __init__(self, symbol_table):
+        root = symbol_table.root
+        self.symbols = tuple(root.symbols.items())
+        self.parameters = {key: tuple(scope.symbols.items()) for key, scope in root.children.items()}
+        shared = [symbol for _, symbol in self.symbols]
+        for parameters in self.parameters.values():
+            shared.extend(symbol for _, symbol in parameters)
+        self.shared = tuple(shared)
+
+
+class SharedPickler(pickle.Pickler):
+    """Pickler que guarda os símbolos partilhados e o escopo indicado como referências."""
+
+    def __init__(self, file, references, scope):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.references = references  # id(símbolo partilhado) -> posição
+        self.scope = scope
+
+    def persistent_id(self, obj):
+        if obj.__class__ is Symbol:
+            return self.references.get(id(obj))  # Os símbolos locais são copiados
+        if obj is self.scope:
+            return SCOPE_REF
+        return None
+
+
+class SharedUnpickler(pickle.Unpickler):
+    def __init__(self, file, shared, scope):
+        super().__init__(file)
+        self.shared = shared
+        self.scope = scope
+
+    def persistent_load(self, ref):
+        if ref == SCOPE_REF:
+            return self.scope
+        return self.shared[ref]
+
+
+class Worker:
+    """Estado de um processo: a cópia do escopo global e uma tabela reutilizada entre subprogramas."""
+
+    def __init__(self, snapshot, subprograms):
+        self.snapshot = snapshot
+        self.subprograms = subprograms  # (nó, nº de símbolos globais visíveis)
+        self.references = {id(symbol): index for index, symbol in enumerate(snapshot.shared)}
+        self.analyzer = SemanticAnalyzer()
+        self.visible = 0  # Símbolos globais já no escopo global da tabela
+
+    def show_globals(self, count):
+        """Deixa visíveis os count primeiros símbolos globais (os declarados antes do subprograma).
+
+        Os subprogramas chegam por ordem de declaração: o escopo global só
+        cresce e raramente é refeito.
+        """
+        table = self.analyzer.symbol_table
+        if count < self.visible:
+            table.root.symbols.clear()
+            self.visible = 0
+        table.root.symbols.update(self.snapshot.symbols[self.visible:count])
+        self.visible = count
+        table.generation += 1  # Invalida as resoluções de nomes em cache
+
+    def analyze(self, index):
+        node, visible = self.subprograms[index]
+        self.show_globals(visible)
+        analyzer = self.analyzer
+        analyzer.errors, analyzer.warnings = [], []
+        root = analyzer.symbol_table.root
+
+        # O escopo do subprograma começa só com os parâmetros (declarados no processo principal)
+        key = identifier_key(node.value)
+        scope = root.children[key] = Scope(f"{root.name}.{node.value}", root)
+        scope.symbols.update(self.snapshot.parameters.get(key, ()))
+        analyzer.analyze_subprogram_body(node)
+        del root.children[key]
+
+        nodes = subtree_nodes(node)
+        result = (analyzer.errors, analyzer.warnings, scope.symbols, scope.children,
+                  [node and node.symbol for node in nodes], [node and node.expr_type for node in nodes])
+        buffer = io.BytesIO()
+        SharedPickler(buffer, self.references, scope).dump(result)
+        return buffer.getvalue()
+
+
+_worker = None  # Estado do processo (criado por start_worker)
+
+
+def start_worker(snapshot, subprograms):
+    global _worker
+    _worker = Worker(snapshot, subprograms)
+
+
+def analyze_in_worker(index):
+    return _worker.analyze(index)
+
+
+class ParallelSemanticAnalyzer(SemanticAnalyzer):
+    """Análise semântica com os corpos dos subprogramas de topo analisados em paralelo.
+
+    O resultado (erros e avisos pela mesma ordem, tabela de símbolos e
+    anotações da árvore) é o da análise sequencial. Os programas com
+    poucos subprogramas, e as plataformas sem fork, são analisados
+    sequencialmente. Com um cache, só os corpos que não estão nele vão
+    para os processos (e os seus resultados são guardados).
+    """
+
+    def __init__(self, workers=None, cache=None):
+        super().__init__(cache)
+        self.workers = workers or os.cpu_count() or 1
+        self.deferred = None  # Subprogramas por analisar: (nó, chave no cache, nº de erros, nº de avisos)
+        self.snapshot = None
+        self.pool = None
+        self.results = None
+
+    def analyze(self, ast):
+        if not self.worth_parallel(ast):
+            return super().analyze(ast)
+        self.deferred = []
+        try:
+            super().analyze(ast)  # Os corpos são analisados nos processos enquanto corre o bloco principal
+            if self.results is not None:
+                self.merge_results()
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+            self.deferred = self.snapshot = self.pool = self.results = None
+        return len(self.errors) == 0
+
+    def worth_parallel(self, ast):
+        if self.workers < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+            return False
+        if ast is None or ast.type != 'program':
+            return False
+        declarations = ast.children[0].children
+        count = sum(1 for node in declarations if node.type in ('function_declaration', 'procedure_declaration'))
+        return count >= MIN_PARALLEL_SUBPROGRAMS
+
+    def analyze_subprogram_body(self, subprogram_node):
+        if self.deferred is None:
+            super().analyze_subprogram_body(subprogram_node)
+            return
+        cache_key = self.body_cache_key(subprogram_node)
+        if cache_key is None or not self.load_cached_body(subprogram_node, cache_key):
+            # Os diagnósticos do corpo entram depois nesta posição
+            self.deferred.append((subprogram_node, cache_key, len(self.errors), len(self.warnings)))
+
+    def analyze_declarations(self, declarations_node):
+        super().analyze_declarations(declarations_node)
+        if self.deferred:
+            # Declarações globais completas: os processos herdam a árvore e a cópia do escopo global
+            self.snapshot = GlobalSnapshot(self.symbol_table)
+            positions = {id(symbol): count for count, (_, symbol) in enumerate(self.snapshot.symbols, 1)}
+            subprograms = [(node, positions[id(node.symbol)]) for node, _, _, _ in self.deferred]
+            self.pool = ProcessPoolExecutor(self.workers, multiprocessing.get_context('fork'),
+                                            initializer=start_worker, initargs=(self.snapshot, subprograms))
+            chunksize = max(1, len(subprograms) // (self.workers * 4))
+            self.results = self.pool.map(analyze_in_worker, range(len(subprograms)), chunksize=chunksize)
+
+    def merge_results(self):
+        """Junta os resultados dos processos, pela ordem das declarações."""
+        root = self.symbol_table.root
+        merged = []
+        for (node, cache_key, error_count, warning_count), data in zip(self.deferred, self.results):
+            scope = root.children[identifier_key(node.value)]
+            errors, warnings, symbols, children, node_symbols, expr_types = SharedUnpickler(
+                io.BytesIO(data), self.snapshot.shared, scope).load()
+            scope.symbols = symbols
+            scope.children = children
+            nodes = subtree_nodes(node)
+            for index in range(1, len(nodes)):  # A raiz (a declaração) já foi anotada aqui
+                child = nodes[index]
+                if child is not None:
+                    child.symbol = node_symbols[index]
+                    child.expr_type = expr_types[index]
+            if cache_key is not None:
+                self.store_cached_body(node, cache_key, errors, warnings)
+            merged.append((error_count, errors, warning_count, warnings))
+        self.symbol_table.generation += 1
+        # Da última posição para a primeira, para as anteriores continuarem válidas
+        for error_count, errors, warning_count, warnings in reversed(merged):
+            self.errors[error_count:error_count] = errors
+            self.warnings[warning_count:warning_count] = warnings
@@ -1,14 +1,39 @@
 # symboltable.py - Tabela de símbolos para o compilador Pascal
+from identifiers import identifier_key
+from typesystem import ArrayType, subprogram_type
+
+# Lista de parâmetros dos símbolos que não os têm (partilhada; a lista é criada no primeiro add_param)
+NO_PARAMS = ()
+
 class Symbol:
+    __slots__ = ('name', 'type', 'kind', 'scope', 'line', 'value', 'params', 'storage')
+
     def __init__(self, name, type, kind, scope, line, value=None):
         self.name = name        # Nome do símbolo
-        self.type = type        # Tipo do símbolo (integer, real, boolean, string, array, etc.)
+        self.type = type        # Tipo do símbolo (typesystem; o tipo devolvido nas funções)
         self.kind = kind        # Tipo de símbolo (variable, constant, function, procedure, parameter)
         self.scope = scope      # Escopo do símbolo
         self.line = line        # Linha onde o símbolo foi declarado
         self.value = value      # Valor (para constantes)
-        self.params = []        # Parâmetros (para funções e procedimentos)
-        self.array_dims = None  # Dimensões (para arrays)
+        self.params = NO_PARAMS # Parâmetros (para funções e procedimentos)
+        self.storage = None     # Endereço das variáveis e parâmetros: (GLOBAL, índice) ou (LOCAL, offset)
+
+    def add_param(self, param):
+        if not self.params:
+            self.params = []
+        self.params.append(param)
+
+    @property
+    def array_dims(self):
+        """Limites [start, end] dos índices (para arrays)."""
+        if self.type.__class__ is ArrayType:
+            return [self.type.start, self.type.end]
+        return None
+
+    @property
+    def signature(self):
+        """Assinatura de uma função ou procedimento (tipo único: comparável por identidade)."""
+        return subprogram_type([param.type for param in self.params], self.type)
 
     def __str__(self):
         result = f"{self.name} ({self.kind}, {self.type}, escopo: {self.scope}, linha: {self.line})"
@@ -21,67 +46,116 @@ class Symbol:
             result += f", parâmetros: [{params_str}]"
         return result
 
+# Onde fica guardada uma variável: na pilha global (pushg/storeg) ou na
+# função (pushl/storel, parâmetros com offset negativo)
+GLOBAL = 'global'
+LOCAL = 'local'
+
+# Marca de "nome sem resolução em cache" (None é uma resolução válida: o nome não existe)
+MISSING = object()
+
+class Scope:
+    """Escopo: os seus símbolos, o escopo envolvente e a cache das resoluções de nomes."""
+    __slots__ = ('name', 'parent', 'symbols', 'children', 'resolved', 'generation')
+
+    def __init__(self, name, parent=None):
+        self.name = name          # Nome completo ("global.f.g"), como no Symbol.scope
+        self.parent = parent      # Escopo envolvente (None no global)
+        self.symbols = {}         # Chave do nome -> Symbol declarado neste escopo
+        self.children = {}        # Chave do nome -> Scope aninhado
+        self.resolved = {}        # Chave do nome -> Symbol (ou None) visível a partir deste escopo
+        self.generation = 0       # Geração da tabela em que a cache foi preenchida
+
 class SymbolTable:
     def __init__(self):
-        self.symbols = {}       
-        self.scopes = ["global"] 
-        self.current_scope = "global"
+        self.root = self.scope = Scope("global")
+        self.generation = 0  # Incrementada em cada add_symbol: invalida as caches de resolução
+
+    @property
+    def current_scope(self):
+        return self.scope.name
+
+    @property
+    def scopes(self):
+        """Nomes dos escopos abertos, do global ao atual."""
+        names = []
+        scope = self.scope
+        while scope is not None:
+            names.append(scope.name)
+            scope = scope.parent
+        return names[::-1]
+
+    @property
+    def symbols(self):
+        """Todos os símbolos, indexados por "escopo.nome"."""
+        result = {}
+        pending = [self.root]
+        while pending:
+            scope = pending.pop()
+            for symbol in scope.symbols.values():
+                result[f"{scope.name}.{symbol.name}"] = symbol
+            pending.extend(scope.children.values())
+        return result
     
     def enter_scope(self, scope_name):
-        """Entra em um novo escopo."""
-        new_scope = f"{self.current_scope}.{scope_name}"
-        self.scopes.append(new_scope)
-        self.current_scope = new_scope
-        return new_scope
+        """Entra em um novo escopo (voltar a entrar num escopo já visto reutiliza-o)."""
+        key = identifier_key(scope_name)
+        scope = self.scope.children.get(key)
+        if scope is None:
+            scope = self.scope.children[key] = Scope(f"{self.scope.name}.{scope_name}", self.scope)
+        self.scope = scope
+        return scope.name
     
     def exit_scope(self):
         """Sai do escopo atual."""
-        if len(self.scopes) > 1:
-            self.scopes.pop()
-            self.current_scope = self.scopes[-1]
-        return self.current_scope
+        if self.scope.parent is not None:
+            self.scope = self.scope.parent
+        return self.scope.name
     
     def add_symbol(self, name, type, kind, line, value=None):
-        """Adiciona um símbolo à tabela."""
-        key = f"{self.current_scope}.{name}"
-        
-        if key in self.symbols:
-            return False
+        """Adiciona um símbolo à tabela e devolve-o (None se já existir no escopo atual).
+
+        Os nomes são comparados sem distinguir maiúsculas; o símbolo guarda a
+        grafia da declaração.
+        """
+        key = identifier_key(name)
+        symbols = self.scope.symbols
+        if key in symbols:
+            return None
         
-        self.symbols[key] = Symbol(name, type, kind, self.current_scope, line, value)
-        return True
+        symbol = symbols[key] = Symbol(name, type, kind, self.scope.name, line, value)
+        self.generation += 1  # O novo símbolo pode esconder outro já resolvido
+        return symbol
     
     def lookup(self, name, current_scope_only=False):
-        """Procura um símbolo na tabela."""
-        # Procura no escopo atual
-        key = f"{self.current_scope}.{name}"
-        if key in self.symbols:
-            return self.symbols[key]
+        """Procura um símbolo na tabela (sem distinguir maiúsculas)."""
+        name = identifier_key(name)
+        scope = self.scope
+        if current_scope_only:
+            return scope.symbols.get(name)
         
-        if not current_scope_only:
-            scope = self.current_scope
-            while "." in scope:
-                scope = scope.rsplit(".", 1)[0]  
-                key = f"{scope}.{name}"
-                if key in self.symbols:
-                    return self.symbols[key]
-        
-        return None
-    
-    def add_array_dimensions(self, name, dimensions):
-        """Adiciona dimensões a um array."""
-        symbol = self.lookup(name, True)
-        if symbol:
-            symbol.array_dims = dimensions
-            return True
-        return False
+        resolved = scope.resolved
+        if scope.generation != self.generation:
+            resolved.clear()
+            scope.generation = self.generation
+        symbol = resolved.get(name, MISSING)
+        if symbol is MISSING:
+            # Procura do escopo atual para os envolventes
+            symbol = None
+            while scope is not None:
+                symbol = scope.symbols.get(name)
+                if symbol is not None:
+                    break
+                scope = scope.parent
+            resolved[name] = symbol
+        return symbol
     
     def add_parameter(self, function_name, param_name, param_type):
         """Adiciona um parâmetro a uma função ou procedimento."""
         function = self.lookup(function_name)
         if function and (function.kind == "function" or function.kind == "procedure"):
             param = Symbol(param_name, param_type, "parameter", function.scope, function.line)
-            function.params.append(param)
+            function.add_param(param)
             return True
         return False
     
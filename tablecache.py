@@ -0,0 +1,129 @@
+# tablecache.py - Cache persistente das tabelas geradas pelo PLY
+import hashlib
+import importlib.util
+import os
+import shutil
+import tempfile
+
+import ply
+import ply.lex as lex
+import ply.yacc as yacc
+
+# Diretório onde ficam as tabelas (pode ser redefinido com PASCAL_CACHE_DIR)
+CACHE_DIR = os.environ.get('PASCAL_CACHE_DIR') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '__pascache__')
+
+
+def rules_signature(*parts):
+    """Calcula o hash que identifica um conjunto de regras (e a versão do PLY)."""
+    digest = hashlib.sha256(ply.__version__.encode('utf-8'))
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def lexer_signature(module):
+    """Hash dos tokens e das expressões regulares t_* de um módulo léxico."""
+    rules = []
+    for name, value in vars(module).items():
+        if not name.startswith('t_'):
+            continue
+        if callable(value):
+            rules.append((name, getattr(value, 'regex', value.__doc__)))
+        else:
+            rules.append((name, value))
+    return rules_signature(tuple(module.tokens), getattr(module, 'literals', ''),
+                           getattr(module, 'states', ()), rules)
+
+
+def grammar_signature(module):
+    """Hash da gramática (produções p_*, precedência e símbolo inicial)."""
+    productions = sorted(
+        (value.__code__.co_firstlineno, name, value.__doc__)
+        for name, value in vars(module).items()
+        if name.startswith('p_') and name != 'p_error' and callable(value)
+    )
+    return rules_signature(tuple(module.tokens), getattr(module, 'precedence', ()),
+                           getattr(module, 'start', None),
+                           [(name, doc) for _, name, doc in productions])
+
+
+def build_lexer(module):
+    """Constrói o lexer, reutilizando a lextab em cache quando as regras não mudaram."""
+    name = f"lextab_{lexer_signature(module)}"
+    path = os.path.join(CACHE_DIR, f"{name}.py")
+
+    tabmodule = _load_table_module(name, path)
+    if tabmodule is not None:
+        try:
+            return lex.lex(module=module, optimize=True, lextab=tabmodule)
+        except Exception:
+            pass  # Tabela inválida: volta a gerar
+
+    # Construção completa (com validação das regras) e escrita da tabela
+    lexer = lex.lex(module=module)
+    _publish(path, lambda tmpdir: _write_lextab(lexer, name, tmpdir))
+    return lexer
+
+
+def build_parser(module):
+    """Constrói o parser LALR, reutilizando as tabelas em cache quando a gramática não mudou."""
+    name = f"parsetab_{grammar_signature(module)}"
+    path = os.path.join(CACHE_DIR, f"{name}.pickle")
+
+    if os.path.exists(path):
+        try:
+            return yacc.yacc(module=module, optimize=True, picklefile=path, debug=False)
+        except Exception:
+            pass  # Tabela inválida: volta a gerar
+
+    built = {}
+
+    def write_tables(tmpdir):
+        tmp_path = os.path.join(tmpdir, f"{name}.pickle")
+        built['parser'] = yacc.yacc(module=module, picklefile=tmp_path, debug=False)
+        return tmp_path
+
+    _publish(path, write_tables)
+    if 'parser' not in built:
+        # Sem cache disponível: gera as tabelas apenas em memória
+        built['parser'] = yacc.yacc(module=module, debug=False, write_tables=False)
+    return built['parser']
+
+
+def _load_table_module(name, path):
+    """Carrega uma lextab do cache (ou devolve None se não existir/for inválida)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    except Exception:
+        return None
+
+
+def _write_lextab(lexer, name, tmpdir):
+    lexer.writetab(name, tmpdir)
+    return os.path.join(tmpdir, f"{name}.py")
+
+
+def _publish(path, write):
+    """Escreve um ficheiro do cache num diretório temporário e move-o de forma atómica.
+
+    Vários processos podem gerar a mesma tabela ao mesmo tempo; como o
+    os.replace é atómico, nenhum leitor vê um ficheiro escrito a meio.
+    """
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmpdir = tempfile.mkdtemp(dir=CACHE_DIR, prefix='.tmp')
+    except OSError:
+        return False
+    try:
+        os.replace(write(tmpdir), path)
+        return True
+    except OSError:
+        return False
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
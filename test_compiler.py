@@ -1,6 +1,9 @@
 # test_compiler.py - Testes para o compilador Pascal
+import io
 import os
+import sys
 import tempfile
+from contextlib import redirect_stdout
 from main import compile_file
 
 # Exemplos do projeto
@@ -191,5 +194,863 @@ def run_tests():
             else:
                 print(f"❌ Teste falhou!")
 
+def test_palavras_reservadas():
+    """Palavras reservadas são reconhecidas sem distinguir maiúsculas."""
+    from lexer import test_lexer
+    tokens = test_lexer("Program programa; BEGIN EndX end. WriteLn writeln_")
+    assert tokens == [
+        ('PROGRAM', 'Program', 1), ('ID', 'programa', 1), ('SEMICOLON', ';', 1),
+        ('BEGIN', 'BEGIN', 1), ('ID', 'EndX', 1), ('END', 'end', 1), ('DOT', '.', 1),
+        ('WRITELN', 'WriteLn', 1), ('ID', 'writeln_', 1),
+    ]
+
+def test_cache_tabelas(tmp_path, monkeypatch):
+    """As tabelas são escritas no cache e regeneradas quando a gramática muda."""
+    import types
+    import parser as pascal_parser
+    import tablecache
+    monkeypatch.setattr(tablecache, 'CACHE_DIR', str(tmp_path))
+
+    tablecache.build_parser(pascal_parser)
+    cached = sorted(os.listdir(tmp_path))
+    assert len(cached) == 1 and cached[0].endswith('.pickle')
+    reloaded = tablecache.build_parser(pascal_parser)
+    from lexer import make_lexer
+    assert reloaded.parse(examples["Exemplo 1: Olá, Mundo!"], lexer=make_lexer()) is not None
+
+    changed = types.ModuleType('gramatica_alterada')
+    changed.__dict__.update(vars(pascal_parser))
+    changed.precedence = pascal_parser.precedence[1:]
+    assert tablecache.grammar_signature(changed) != tablecache.grammar_signature(pascal_parser)
+
+def test_fluxo_de_tokens(tmp_path):
+    """O ficheiro mapeado em memória é analisado a partir de um gerador de tokens."""
+    import types
+    from lexer import read_source, tokenize, make_lexer
+    from parser import parse_code
+    source_file = tmp_path / "crlf.pas"
+    source_file.write_bytes(examples["Exemplo 3: Fatorial"].replace("\n", "\r\n").encode('utf-8'))
+
+    source = read_source(str(source_file))
+    lexer = make_lexer()
+    stream = tokenize(source, lexer)
+    assert isinstance(stream, types.GeneratorType)
+    ast = parse_code(source, tokens=stream)
+    assert ast is not None and ast.value == 'Fatorial'
+    assert lexer.lineno == source.count('\n') + 1
+
+def test_buffer_de_tokens():
+    """O buffer compacto reproduz exatamente o fluxo de tokens do lexer."""
+    from lexer import TokenBuffer, test_lexer
+    for code in examples.values():
+        buffer = TokenBuffer.from_source(code)
+        assert list(buffer) == test_lexer(code)
+        assert buffer.kinds.itemsize == 1
+
+def test_buffer_reproduzido_no_parser(monkeypatch):
+    """Em debug o código é analisado lexicalmente uma única vez."""
+    import lexer
+    from parser import parse_code
+    code = examples["Exemplo 7: Binário para Inteiro (com função)"]
+    buffer = lexer.TokenBuffer.from_source(code)
+    replayed = list(buffer.lex_tokens())
+    assert [(tok.type, tok.value, tok.lineno, tok.lexpos) for tok in replayed] == [
+        (tok.type, tok.value, tok.lineno, tok.lexpos) for tok in lexer.tokenize(code)]
+    assert dump_ast(parse_code(code, tokens=buffer.lex_tokens())) == dump_ast(parse_code(code))
+
+    # Em debug o main.py não volta a gerar tokens a partir do texto
+    import main
+    monkeypatch.setattr(main, 'tokenize', None)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "prog.pas")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(code)
+        assert compile_file(path, debug=True, cache_dir=os.path.join(temp_dir, 'cache'))
+
+def test_comentarios_e_strings():
+    """Comentários { } e (* *) são ignorados e as aspas duplicadas preservadas."""
+    from lexer import test_lexer
+    tokens = test_lexer("a (* x\n * y *) b { c\n } 'it''s' '' c (x)")
+    assert tokens == [
+        ('ID', 'a', 1), ('ID', 'b', 2), ('STRING_CONST', "it's", 3),
+        ('STRING_CONST', '', 3), ('ID', 'c', 3), ('LPAREN', '(', 3),
+        ('ID', 'x', 3), ('RPAREN', ')', 3),
+    ]
+
+def test_escala_linear_comentarios_e_strings():
+    """Comentários e strings grandes são lidos em tempo linear: cada caractere é examinado uma vez."""
+    from lexer import tokenize
+
+    class CountingText(str):
+        """Texto que conta os caracteres percorridos pelas procuras do lexer."""
+        scanned = 0
+
+        def find(self, sub, start=0, end=None):
+            found = str.find(self, sub, start, end)
+            stop = len(self) if end is None else end
+            CountingText.scanned += (found + len(sub) if found >= 0 else stop) - start
+            return found
+
+        def count(self, sub, start=0, end=None):
+            CountingText.scanned += (len(self) if end is None else end) - start
+            return str.count(self, sub, start, end)
+
+    def scanned(size):
+        body = "x" * size
+        table = "ab''" * (size // 8)
+        source = CountingText(
+            f"program P; var s: string; begin {{ {body} }} (* {body} *) s := '{table}'; end.")
+        CountingText.scanned = 0
+        values = [tok.value for tok in tokenize(source)]
+        assert values[-4] == "ab'" * (size // 8)
+        return CountingText.scanned, len(source)
+
+    for size in (1_000, 100_000):
+        count, length = scanned(size)
+        assert count <= 2 * length  # Quadrático seria da ordem de length ** 2
+
+def random_program(rng, statements=60):
+    """Gera um programa Pascal aleatório (com comentários, strings e números)."""
+    names = ['a', 'Soma', 'x_1', 'BEGINx', 'i']
+    pieces = ['program Aleatorio;', 'var a, x_1, i: integer;', 'begin']
+    for _ in range(statements):
+        pieces.append(rng.choice([
+            f"{rng.choice(names)} := {rng.randint(0, 9999)} {rng.choice(['+', '-', '*', 'div', 'mod', '/'])} {rng.choice(names)};",
+            f"writeln('{rng.choice(['', 'texto', 'it' + chr(39) * 2 + 's', 'linha' + chr(10) + 'dupla'])}', {rng.random() * 100:.3f});",
+            f"if {rng.choice(names)} {rng.choice(['<>', '<=', '>=', '<', '>', '='])} {rng.randint(0, 9)} then i := i + 1;",
+            f"{{ comentário {rng.randint(0, 99)} }}",
+            f"(* bloco\n {rng.choice(names)} *)",
+            f"for i := 1 to {rng.randint(1, 99)} do a[i..2]:=(a);",
+            rng.choice(['\n', '\r\n', '\t', '  ']),
+        ]))
+    pieces.append('end.')
+    return rng.choice([' ', '\n']).join(pieces)
+
+def test_lexer_dfa_equivalente():
+    """O lexer por autómato produz exatamente os mesmos tokens que o lexer PLY."""
+    import glob
+    import random
+    from lexer import make_lexer, tokenize, read_source
+
+    def token_stream(backend, source):
+        return [(tok.type, tok.value, tok.lineno, tok.lexpos)
+                for tok in tokenize(source, make_lexer(backend))]
+
+    rng = random.Random(2024)
+    sources = [read_source(path) for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'example*.pas')))]
+    sources += list(examples.values())
+    sources += [random_program(rng) for _ in range(50)]
+    sources += ["1..5 1.5 1. x_1 3abc a<>b<=c>=d:=e (x) '' $ ١٢", "x (* sem fim", "{", "'aberta"]
+    for source in sources:
+        assert token_stream('dfa', source) == token_stream('ply', source)
+
+def dump_ast(node):
+    """Representação estrutural de uma AST, para comparar árvores."""
+    if node is None:
+        return None
+    return (node.type, node.value, node.line, node.start, node.end,
+            [dump_ast(child) for child in node.children])
+
+def test_ast_compacta():
+    """Os nós não têm __dict__ e as folhas partilham o mesmo tuplo de filhos."""
+    from parser import parse_code, NO_CHILDREN
+    ast = parse_code(examples["Exemplo 5: Soma de Array"])
+    nodes, stack = [], [ast]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.children)
+    assert not any(hasattr(node, '__dict__') for node in nodes)
+    leaves = [node for node in nodes if node.type in ('number', 'variable', 'string')]
+    assert leaves and all(node.children is NO_CHILDREN for node in leaves)
+    assert ast.children[0].type is sys.intern(''.join(['declar', 'ations']))
+
+class RandomProgram:
+    """Gerador de programas Pascal sintaticamente válidos, para testes diferenciais."""
+
+    NAMES = ['a', 'b', 'Total', 'x_1', 'f', 'v']
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def choice(self, options):
+        return self.rng.choice(options)
+
+    def program(self):
+        return f"program P;\n{self.declarations(2)}{self.compound(3)}."
+
+    def declarations(self, depth):
+        parts = []
+        for _ in range(self.rng.randint(0, 3)):
+            kind = self.choice(['var', 'const', 'type', 'function', 'procedure'] if depth else ['var', 'const'])
+            if kind == 'var':
+                parts.append("var " + " ".join(f"{self.ids()}: {self.type()};" for _ in range(self.rng.randint(1, 2))))
+            elif kind == 'const':
+                parts.append(f"const {self.choice(self.NAMES)} = {self.expr_bool(2)};")
+            elif kind == 'type':
+                parts.append(f"type T = {self.type()};")
+            else:
+                params = "; ".join(f"{self.ids()}: {self.simple_type()}" for _ in range(self.rng.randint(1, 2)))
+                header = self.choice([f"({params})", ""])
+                result = f": {self.simple_type()}" if kind == 'function' else ""
+                parts.append(f"{kind} {self.choice(self.NAMES)}{header}{result};\n"
+                             f"{self.declarations(depth - 1)}{self.compound(2)};")
+        return "".join(part + "\n" for part in parts)
+
+    def ids(self):
+        return ", ".join(self.rng.sample(self.NAMES, self.rng.randint(1, 3)))
+
+    def simple_type(self):
+        return self.choice(['integer', 'Real', 'BOOLEAN', 'string'])
+
+    def type(self):
+        if self.rng.random() < 0.3:
+            return f"array[{self.rng.randint(0, 3)}..{self.rng.randint(4, 9)}] of {self.simple_type()}"
+        return self.simple_type()
+
+    def compound(self, depth):
+        count = self.rng.randint(0, 4)
+        return "begin\n" + ";\n".join(self.statement(depth) for _ in range(count)) + "\nend"
+
+    def statement(self, depth):
+        options = ['assign', 'call', 'write', 'read', 'empty']
+        if depth:
+            options += ['if', 'while', 'for', 'compound']
+        kind = self.choice(options)
+        if kind == 'assign':
+            return f"{self.var(depth)} := {self.expr_bool(depth)}"
+        if kind == 'call':
+            return self.choice(self.NAMES) + self.choice(["", f"({self.args(depth)})"])
+        if kind == 'write':
+            args = ", ".join(self.expr_bool(depth) for _ in range(self.rng.randint(1, 3)))
+            return self.choice([f"writeln({args})", f"Write({args})", "writeln", "write()", "WriteLn()"])
+        if kind == 'read':
+            variables = ", ".join(self.var(depth) for _ in range(self.rng.randint(1, 2)))
+            return self.choice([f"readln({variables})", f"read({variables})", "readln"])
+        if kind == 'empty':
+            return ""
+        if kind == 'if':
+            branch = f"if {self.expr_bool(depth - 1)} then {self.statement(depth - 1)}"
+            return branch + self.choice(["", f" else {self.statement(depth - 1)}"])
+        if kind == 'while':
+            return f"while {self.expr_bool(depth - 1)} do {self.statement(depth - 1)}"
+        if kind == 'for':
+            direction = self.choice(['to', 'DownTo'])
+            return (f"for {self.choice(self.NAMES)} := {self.expr(depth - 1)} {direction} "
+                    f"{self.expr(depth - 1)} do {self.statement(depth - 1)}")
+        return self.compound(depth - 1)
+
+    def var(self, depth):
+        name = self.choice(self.NAMES)
+        return name + self.choice(["", f"[{self.expr(depth - 1)}]"]) if depth > 0 else name
+
+    def args(self, depth):
+        args = [self.expr_bool(depth - 1) for _ in range(self.rng.randint(0, 3))]
+        return ", ".join(args)
+
+    def expr_bool(self, depth):
+        expr = self.expr(depth)
+        if self.rng.random() < 0.3:
+            expr += f" {self.choice(['=', '<>', '<', '<=', '>', '>='])} {self.expr(depth)}"
+        return expr
+
+    def expr(self, depth):
+        terms = [self.fator(depth) for _ in range(self.rng.randint(1, 3))]
+        expr = terms[0]
+        for term in terms[1:]:
+            expr += f" {self.choice(['+', '-', 'or', 'OR', '*', '/', 'div', 'Mod', 'and'])} {term}"
+        return expr
+
+    def fator(self, depth):
+        constants = [str(self.rng.randint(0, 999)), f"{self.rng.random() * 10:.2f}",
+                     "'texto'", "'it''s'", "''", 'true', 'FALSE', 'True']
+        if depth <= 0:
+            return self.choice(constants + self.NAMES)
+        kind = self.choice(['const', 'var', 'paren', 'call', 'unary', 'length'])
+        if kind == 'const':
+            return self.choice(constants)
+        if kind == 'var':
+            return self.var(depth)
+        if kind == 'paren':
+            return f"({self.expr_bool(depth - 1)})"
+        if kind == 'call':
+            return f"{self.choice(self.NAMES)}({self.args(depth)})"
+        if kind == 'unary':
+            return f"{self.choice(['-', 'not '])}{self.fator(depth - 1)}"
+        return f"length({self.expr_bool(depth - 1)})"
+
+def test_parser_rd_equivalente():
+    """O parser por descida recursiva constrói as mesmas árvores que o parser LALR."""
+    import glob
+    import io
+    import random
+    from contextlib import redirect_stdout
+    from lexer import read_source
+    from parser import parse_code
+
+    rng = random.Random(7)
+    sources = [read_source(path) for path in
+               sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'example*.pas')))]
+    sources += list(examples.values())
+    sources += [RandomProgram(rng).program() for _ in range(300)]
+    for source in sources:
+        expected = dump_ast(parse_code(source))
+        assert expected is not None, source
+        assert dump_ast(parse_code(source, backend='rd')) == expected, source
+
+    # Programas inválidos são rejeitados pelos dois parsers
+    invalid = ["program P; begin a < b < c end.", "program P; begin x[1] end.",
+               "program P; begin read end.", "program P; function f(): integer; begin end; begin end.",
+               "program P; begin a := b[i = 1] end.", "program P; begin end. x", "program P; begin"]
+    with redirect_stdout(io.StringIO()):
+        for source in invalid:
+            assert parse_code(source) is None and parse_code(source, backend='rd') is None, source
+
+def test_expressoes_profundas():
+    """Expressões muito aninhadas são analisadas e geradas sem RecursionError."""
+    from parser import parse_code, print_ast
+    from semantic import SemanticAnalyzer
+    from codegen import CodeGenerator
+    depth = sys.getrecursionlimit() * 3
+    source = (f"program Profundo; var a, b: integer; begin "
+              f"a := {' + '.join(['b'] * depth)}; b := {'- ' * depth}a end.")
+    ast = parse_code(source)
+    analyzer = SemanticAnalyzer()
+    assert analyzer.analyze(ast), analyzer.errors
+    code = CodeGenerator(analyzer.symbol_table).generate(ast)
+    assert code.count("pushg 1") == depth and code.count("pushi -1") == depth
+    printed = io.StringIO()
+    with redirect_stdout(printed):
+        print_ast(ast)
+    assert printed.getvalue().count("variable: b") == depth + 1  # Inclui o destino da atribuição
+
+def test_comandos_profundos():
+    """Blocos begin, if e while muito aninhados são analisados e gerados sem RecursionError."""
+    from parser import parse_code
+    from semantic import SemanticAnalyzer
+    from codegen import CodeGenerator
+    depth = sys.getrecursionlimit() * 3
+    source = ("program Profundo; var x: integer; begin "
+              + "begin " * depth + "x := 1" + " end" * depth + "; "
+              + "if x > 0 then " * depth + "x := 2 else x := 3; "
+              + "while x > 3 do " * depth + "x := 4 end.")
+    ast = parse_code(source)
+    analyzer = SemanticAnalyzer()
+    assert analyzer.analyze(ast), analyzer.errors
+    code = CodeGenerator(analyzer.symbol_table).generate(ast)
+    assert sum(line.startswith("jz ") for line in code) == 2 * depth
+    # O else pertence ao if mais interior: o seu código vem logo a seguir ao primeiro rótulo ELSE
+    first_else = next(index for index, line in enumerate(code) if line.startswith("ELSE"))
+    assert code[first_else + 1:first_else + 3] == ["// Atribuição para x", "// Gerando expressão do tipo: number"]
+    assert code[first_else + 3:first_else + 5] == ["pushi 3", "storeg 0"]
+
+def test_codigos_dos_tipos_de_no():
+    """Cada nó guarda o código inteiro do seu tipo, usado nas tabelas de despacho."""
+    from astwalk import preorder
+    from nodekinds import NODE_TYPES, K_OTHER, dispatch_table
+    from parser import parse_code, ASTNode
+    for code in examples.values():
+        for node, _ in preorder(parse_code(code)):
+            assert NODE_TYPES[node.kind] == node.type
+    assert ASTNode('desconhecido').kind == K_OTHER
+    table = dispatch_table({'number': 'n'}, default='?')
+    assert table[ASTNode('number', value=1).kind] == 'n' and table[K_OTHER] == '?'
+
+def test_recuperacao_de_erros_sintaticos():
+    """Todos os erros sintáticos são reportados numa só análise."""
+    from parser import parse_code, parse_with_diagnostics
+    source = """program Erros;
+var a: integer;
+    b: intger;
+begin
+  a := 1 +;
+  if a > 0 then a := else a := 2;
+  writeln('ok');
+  while do a := 1
+end."""
+    with redirect_stdout(io.StringIO()) as output:
+        ast, diagnostics = parse_with_diagnostics(source)
+        assert parse_code(source) is None
+    assert [(d.line, d.token_type) for d in diagnostics] == [
+        (3, 'ID'), (5, 'SEMICOLON'), (6, 'ELSE'), (8, 'DO')]
+    assert str(diagnostics[0]) in output.getvalue()
+    # A árvore parcial mantém o que foi reconhecido
+    assert [item.children[0].value for item in ast.children[0].children[0].children] == [['a']]
+    assert [node.type for node in ast.children[1].children] == ['if_statement', 'write_statement']
+
+    # Um token que não pode seguir um comando ('x if ...') não deixa a recuperação em ciclo
+    with redirect_stdout(io.StringIO()):
+        ast, diagnostics = parse_with_diagnostics(
+            "program P; var x: integer; begin x := 1; x if x > 0 then x := 2 else x := 3 end.")
+    assert diagnostics[0].token_type == 'IF'
+    assert [node.type for node in ast.children[1].children] == ['assignment']
+
+    ast, diagnostics = parse_with_diagnostics(examples["Exemplo 4: Número Primo"])
+    assert ast is not None and diagnostics == []
+
+def test_arena_ast():
+    """A arena reproduz a árvore e é percorrida pelas fases semântica e de geração."""
+    import pickle
+    from astarena import ASTArena
+    from parser import parse_code
+    from semantic import SemanticAnalyzer
+    from codegen import CodeGenerator
+
+    def compile_tree(root):
+        analyzer = SemanticAnalyzer()
+        assert analyzer.analyze(root), analyzer.errors
+        return CodeGenerator(analyzer.symbol_table).generate(root)
+
+    for code in examples.values():
+        tree = parse_code(code)
+        arena = ASTArena.from_tree(tree)
+        assert dump_ast(arena.root) == dump_ast(tree)
+        assert dump_ast(arena.to_tree()) == dump_ast(tree)
+        assert dump_ast(pickle.loads(pickle.dumps(arena)).root) == dump_ast(tree)
+        with redirect_stdout(io.StringIO()):
+            assert compile_tree(arena.root) == compile_tree(parse_code(code))
+
+    # Filhos None (comandos vazios) e valores escalares partilhados
+    arena = ASTArena.from_tree(parse_code("program P; var a: integer; begin if a = a then else a := a end."))
+    if_node = arena.root.children[1].children[0]
+    assert if_node.children[1] is None and if_node.children[2].type == 'assignment'
+    assert arena.value_table.count('a') == 1
+
+def test_arena_otimizacoes():
+    """fold_constants e remove_dead_stores alteram a arena como alteram a árvore."""
+    from astarena import ASTArena
+    from parser import parse_code
+    from semantic import SemanticAnalyzer
+    from codegen import CodeGenerator
+    from constfold import fold_constants
+    from dataflow import build_routines, remove_dead_stores
+
+    def optimize(root):
+        analyzer = SemanticAnalyzer()
+        assert analyzer.analyze(root), analyzer.errors
+        counts = fold_constants(root), remove_dead_stores(build_routines(root, analyzer.symbol_table))
+        with redirect_stdout(io.StringIO()):
+            return counts, dump_ast(root), CodeGenerator(analyzer.symbol_table).generate(root)
+
+    code = "program P; const N = 2*3; var a,b: integer; begin a := N + 1; a := 5; writeln(a) end."
+    tree = parse_code(code)
+    arena = ASTArena.from_tree(parse_code(code))
+    counts, tree_dump, tree_code = optimize(tree)
+    assert counts == (2, 1)
+    assert optimize(arena.root) == (counts, tree_dump, tree_code)
+    assert "Erro" not in tree_code
+    assert dump_ast(arena.to_tree()) == tree_dump
+    assert arena.root.children[1].children[1].children[1].expr_type is not None
+    assert isinstance(arena.root.children, tuple)  # Só de leitura: as alterações usam set_child
+
+    for code in examples.values():
+        arena = ASTArena.from_tree(parse_code(code))
+        assert optimize(arena.root) == optimize(parse_code(code))
+
+def test_intervalos_dos_nos():
+    """Cada nó cobre o seu texto e o LineIndex converte as posições em linha e coluna."""
+    from astwalk import preorder
+    from lexer import LineIndex, tokenize
+    from parser import parse_code
+    code = ("program P;\nvar a: integer;\nfunction f(x: integer): integer;\nbegin f := (x + 1) * 2 end;\n"
+            "begin\n  a := f(a) + length('ab');\n  if a > 1 then writeln(a)\nend.")
+    spans = {}
+    for node, _ in preorder(parse_code(code)):
+        spans.setdefault(node.type, code[node.start:node.end])
+    assert spans['program'] == code
+    assert spans['function_declaration'].startswith('function f') and spans['function_declaration'].endswith('end;')
+    assert spans['binary_op'] == '(x + 1) * 2'
+    assert spans['assignment'] == 'f := (x + 1) * 2'
+    assert spans['if_statement'] == 'if a > 1 then writeln(a)'
+    assert spans['length_call'] == "length('ab')"
+
+    index = LineIndex(code)
+    assert len(index) == code.count('\n') + 1
+    for tok in tokenize(code):
+        line, column = index.position(tok.lexpos)
+        assert line == tok.lineno
+        assert index.line_start(line) + column - 1 == tok.lexpos
+    assert index.position(code.index('a :=')) == (6, 3)
+
+def test_reanalise_incremental():
+    """Uma edição dentro de uma função só reanalisa essa função e dá a árvore da análise completa."""
+    from incremental import reparse, TextEdit
+    from parser import parse_code
+    source = examples["Exemplo 7: Binário para Inteiro (com função)"]
+    ast = parse_code(source)
+    function, variables, main_block = ast.children[0].children + [ast.children[1]]
+    edits = [
+        TextEdit(source.index('potencia := 1;'), source.index('potencia := 1;') + 13, 'potencia := 2\n  ;'),
+        TextEdit(source.index('valor := BinToInt'), source.index('valor := BinToInt'), 'writeln;\n'),
+    ]
+    for edit in edits:
+        ast, diagnostics = reparse(ast, source, edit)
+        source = edit.apply(source)
+        assert diagnostics == [] and dump_ast(ast) == dump_ast(parse_code(source))
+    # Cada edição substituiu só a parte editada
+    assert ast.children[0].children[0] is not function and ast.children[1] is not main_block
+    assert ast.children[0].children[1] is variables
+
+    # A edição que altera onde a declaração acaba obriga à análise completa
+    edit = TextEdit(source.index('end; \n\nvar'), source.index('end; \n\nvar') + 4, 'end; procedure p; begin end;')
+    ast, diagnostics = reparse(ast, source, edit)
+    assert dump_ast(ast) == dump_ast(parse_code(edit.apply(source)))
+    assert [node.type for node in ast.children[0].children][:2] == ['function_declaration', 'procedure_declaration']
+
+def test_tabela_de_simbolos_em_arvore():
+    """A resolução guardada em cache é refeita quando um símbolo novo esconde outro."""
+    from symboltable import SymbolTable
+    table = SymbolTable()
+    table.add_symbol('x', 'integer', 'variable', 1)
+    assert table.enter_scope('f') == 'global.f'
+    assert table.enter_scope('g') == 'global.f.g'
+    assert table.lookup('x').scope == 'global'
+    assert table.lookup('y') is None
+    table.exit_scope()
+    table.add_symbol('x', 'real', 'variable', 2)
+    table.add_symbol('y', 'string', 'variable', 2)
+    table.enter_scope('g')
+    assert table.lookup('x').type == 'real' and table.lookup('y').type == 'string'
+    assert table.lookup('x', current_scope_only=True) is None
+    assert table.scopes == ['global', 'global.f', 'global.f.g']
+    table.exit_scope()
+    table.exit_scope()
+    assert table.exit_scope() == 'global' and table.lookup('x').type == 'integer'
+    assert sorted(table.symbols) == ['global.f.x', 'global.f.y', 'global.x']
+
+def test_nomes_anotados_com_simbolos():
+    """A análise semântica anota os nomes com o Symbol e a posição que o codegen usa."""
+    from parser import parse_code
+    from semantic import SemanticAnalyzer
+    from codegen import CodeGenerator
+    from symboltable import GLOBAL, LOCAL
+    ast = parse_code("""program p;
+var n: integer; v: array[1..3] of integer; s: string;
+function f(a, b: integer): integer;
+var s: string;
+begin
+  s := 'x';
+  writeln(s);
+  f := a + n
+end;
+begin
+  n := f(1, 2) + v[2];
+  s := 'y'
+end.""")
+    analyzer = SemanticAnalyzer()
+    assert analyzer.analyze(ast)
+    function = ast.children[0].children[1]
+    _, _, _, body = function.children
+    local_s, global_s = body.children[0].children[0].symbol, ast.children[1].children[1].children[0].symbol
+    assert local_s.storage == (LOCAL, 1) and global_s.storage == (GLOBAL, 4)
+    assert body.children[2].children[0].symbol is function.symbol
+    a, n = body.children[2].children[1].children
+    assert a.symbol.storage == (LOCAL, -2) and n.symbol.storage == (GLOBAL, 0)
+    code = CodeGenerator(analyzer.symbol_table).generate(ast)
+    # A string local é escrita com writes (o tipo vem do símbolo anotado, não do escopo global)
+    assert code[code.index("storel 1"):code.index("// Return da função")].count("writes") == 1
+
+def test_identificadores_sem_distinguir_maiusculas():
+    """Grafias diferentes do mesmo nome designam o mesmo símbolo; o codegen usa a da declaração."""
+    from lexer import make_lexer
+    from parser import parse_code
+    from semantic import SemanticAnalyzer
+    from codegen import CodeGenerator
+    from symboltable import Symbol, NO_PARAMS
+    code = """program p;
+var Soma: integer;
+procedure Mostra(Valor: integer);
+begin
+  writeln(valor)
+end;
+begin
+  soma := 2;
+  SOMA := Soma + 1;
+  mostra(SOMA)
+end."""
+    lexer = make_lexer()
+    lexer.input(code)
+    names = [token.value for token in iter(lexer.token, None) if token.type == 'ID' and token.value == 'Soma']
+    assert len(names) == 2 and names[0] is names[1]
+    analyzer = SemanticAnalyzer()
+    ast = parse_code(code)
+    assert analyzer.analyze(ast), analyzer.errors
+    generated = CodeGenerator(analyzer.symbol_table).generate(ast)
+    assert "pusha Mostra" in generated and "storeg 0" in generated
+    assert not hasattr(Symbol('x', 'integer', 'variable', 'global', 1), '__dict__')
+    assert analyzer.symbol_table.lookup('SOMA').params is NO_PARAMS
+    assert [param.name for param in analyzer.symbol_table.lookup('MOSTRA').params] == ['Valor']
+    # As chaves são a mesma cadeia para todas as grafias e o cache delas tem tamanho limitado
+    from identifiers import identifier_key, MAX_CACHED_NAMES
+    assert identifier_key('SOMA') is identifier_key('soma') is identifier_key(''.join(['So', 'ma']))
+    for index in range(2 * MAX_CACHED_NAMES):
+        identifier_key(f"Nome{index}")
+    assert identifier_key.cache_info().currsize <= MAX_CACHED_NAMES
+
+def test_tipos_registados_nas_expressoes():
+    """A escrita usa o tipo que a análise semântica registou em cada expressão."""
+    from parser import parse_code
+    from semantic import SemanticAnalyzer
+    from codegen import CodeGenerator
+    from typesystem import INTEGER, REAL, STRING, BOOLEAN
+    ast = parse_code("""program p;
+var r: real; a: array[1..2] of real; s: string;
+begin
+  writeln(r, a[1], s, s[1], length(s))
+end.""")
+    analyzer = SemanticAnalyzer()
+    assert analyzer.analyze(ast)
+    expressions = ast.children[1].children[0].children[0].children
+    assert [expr.expr_type for expr in expressions] == [REAL, REAL, STRING, INTEGER, INTEGER]
+    assert expressions[1].children[0].expr_type is INTEGER
+    code = CodeGenerator(analyzer.symbol_table).generate(ast)
+    assert [line for line in code if line.startswith('write')] == [
+        'writef', 'writef', 'writes', 'writei', 'writei', 'writeln']
+
+    # Os operadores binários guardam o lexema ('*', 'div', '>'), normalizado na análise
+    ast = parse_code("""program p;
+var r: real; i: integer; b: boolean; s: string;
+begin
+  writeln(r * 2.0, i + 1, i div 2, -i, i < r, s[1] = 'a', b and not b)
+end.""")
+    analyzer = SemanticAnalyzer()
+    assert analyzer.analyze(ast), analyzer.errors
+    expressions = ast.children[1].children[0].children[0].children
+    assert [expr.expr_type for expr in expressions] == [REAL, INTEGER, INTEGER, INTEGER, BOOLEAN, BOOLEAN, BOOLEAN]
+    code = CodeGenerator(analyzer.symbol_table).generate(ast)
+    assert [line for line in code if line.startswith('write')][:4] == ['writef', 'writei', 'writei', 'writei']
+    analyzer = SemanticAnalyzer()
+    assert not analyzer.analyze(parse_code("program p; var b: boolean; begin b := b + 1 end."))
+    assert len(analyzer.errors) == 1 and analyzer.errors[0].endswith("Operador '+' requer operandos numéricos")
+
+def test_avaliacao_de_constantes():
+    """Constantes definidas por expressões e subexpressões constantes passam a literais."""
+    from parser import parse_code
+    from semantic import SemanticAnalyzer
+    from codegen import CodeGenerator
+    from constfold import fold_constants
+    from typesystem import INTEGER, BOOLEAN, STRING
+    ast = parse_code("""program p;
+const N = 10 * 4; M = N div 3 - -2; S = 'ab' + 'cd'; B = not (length(S) > M);
+var x: integer;
+begin
+  x := N + M * 2 + x * (7 / 2);
+  writeln(S, -7 div 2, -7 mod 2, 1 / 0, B)
+end.""")
+    analyzer = SemanticAnalyzer()
+    assert analyzer.analyze(ast), analyzer.errors
+    constants = {name: analyzer.symbol_table.lookup(name) for name in 'NMSB'}
+    assert [(c.type, c.value) for c in constants.values()] == [
+        (INTEGER, 40), (INTEGER, 15), (STRING, 'abcd'), (BOOLEAN, True)]
+    assert fold_constants(ast) == 9
+    assignment, write = ast.children[1].children
+    left, right = assignment.children[1].children
+    assert (left.type, left.value, left.expr_type) == ('number', 70, INTEGER)
+    assert right.children[1].value == 3  # A divisão de inteiros é truncada, como o div gerado
+    assert [(e.type, e.value) for e in write.children[0].children if e.type != 'binary_op'] == [
+        ('string', 'abcd'), ('number', -3), ('number', -1), ('boolean', 'true')]
+    code = CodeGenerator(analyzer.symbol_table).generate(ast)
+    assert "pushi 70" in code and "mul" in code and not any("não encontrada" in line for line in code)
+
+def test_compilacao_concorrente():
+    """Várias threads analisam código ao mesmo tempo sem partilhar estado."""
+    from concurrent.futures import ThreadPoolExecutor
+    from parser import parse_code
+    sources = list(examples.values()) * 8
+    expected = [dump_ast(parse_code(code)) for code in sources]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda code: dump_ast(parse_code(code)), sources))
+    assert results == expected
+
+def test_tipos_unicos():
+    """Os tipos são objetos únicos: compara-se por identidade, mesmo depois de um pickle."""
+    import pickle
+    from parser import parse_code
+    from semantic import SemanticAnalyzer
+    from typesystem import INTEGER, REAL, array_type, base_type, subprogram_type
+    vector = array_type(INTEGER, 1, 5)
+    assert vector is array_type(INTEGER, 1, 5) and vector is not array_type(INTEGER, 0, 4)
+    assert (str(vector), vector.size, vector.stride) == ('array of integer', 5, 1)
+    assert base_type('Integer') is INTEGER
+    assert pickle.loads(pickle.dumps([vector, REAL])) == [vector, REAL]
+    assert pickle.loads(pickle.dumps(vector)) is vector
+    ast = parse_code("""program p;
+var v: array[1..5] of Integer;
+function f(a: integer; b: real): real;
+begin f := a + b end;
+begin writeln(v[1]) end.""")
+    analyzer = SemanticAnalyzer()
+    assert analyzer.analyze(ast)
+    assert analyzer.symbol_table.lookup('v').type is vector
+    assert analyzer.symbol_table.lookup('f').signature is subprogram_type([INTEGER, REAL], REAL)
+
+def test_analise_paralela_dos_subprogramas(monkeypatch):
+    """Os corpos analisados em processos dão os mesmos diagnósticos, símbolos e anotações."""
+    import semanticpool
+    from codegen import CodeGenerator
+    from parser import parse_code
+    from semantic import SemanticAnalyzer
+    monkeypatch.setattr(semanticpool, 'MIN_PARALLEL_SUBPROGRAMS', 1)
+    code = """program p;
+var g: integer;
+function f(a: integer): integer;
+var t: real;
+begin t := a; f := a + g + h end;
+procedure q(s: string);
+begin writeln(f(length(s)), 'x'); s := 1 end;
+function k: boolean;
+begin q('abc') end;
+var h: integer;
+begin g := f(2); q('y') end."""
+    sequential, parallel = SemanticAnalyzer(), semanticpool.ParallelSemanticAnalyzer(workers=2)
+    sequential.analyze(parse_code(code))
+    ast = parse_code(code)
+    assert not parallel.analyze(ast)
+    assert (parallel.errors, parallel.warnings) == (sequential.errors, sequential.warnings)
+    assert len(parallel.errors) == 2 and parallel.errors[0].startswith("Erro na linha 5: Variável 'h'")
+    assert ({key: str(symbol) for key, symbol in parallel.symbol_table.symbols.items()}
+            == {key: str(symbol) for key, symbol in sequential.symbol_table.symbols.items()})
+    # Os nomes globais usados nos corpos voltam a ser os símbolos do processo principal
+    table = parallel.symbol_table
+    body = ast.children[0].children[1].children[3]
+    assert body.children[1].children[1].children[0].children[1].symbol is table.lookup('g')
+    assert table.root.children['f'].symbols['t'].storage == ('local', 1)
+    assert body.children[0].children[1].expr_type is table.lookup('f').type
+    ast = parse_code(code.replace(" + h", "").replace("s := 1", "s := 'z'"))
+    parallel = semanticpool.ParallelSemanticAnalyzer(workers=2)
+    assert parallel.analyze(ast)
+    assert CodeGenerator(parallel.symbol_table).generate(ast)
+
+def test_fluxo_de_dados():
+    """Avisos das variáveis nunca usadas ou nunca lidas e remoção das atribuições mortas."""
+    from parser import parse_code
+    from semantic import SemanticAnalyzer
+    from codegen import CodeGenerator
+    from dataflow import build_routines, variable_warnings, remove_dead_stores
+    ast = parse_code("""program p;
+var a, b, c, u, n: integer;
+function f(x: integer): integer;
+var t, k: integer;
+begin t := x; t := t + 1; k := 5; f := t; a := 2 end;
+begin
+  b := 7; b := b * 2; c := 3;
+  for u := 1 to 3 do c := c + u;
+  writeln(c, f(1))
+end.""")
+    analyzer = SemanticAnalyzer()
+    assert analyzer.analyze(ast), analyzer.errors
+    table = analyzer.symbol_table
+    routines = build_routines(ast, table)
+    assert variable_warnings(routines, table) == [
+        "Aviso na linha 2: Variável 'a' recebe valores mas nunca é lida",
+        "Aviso na linha 2: Variável 'n' declarada mas nunca usada",
+        "Aviso na linha 4: Variável 'k' recebe valores mas nunca é lida",
+    ]
+    main, function = routines
+    body = ast.children[1].children
+    live_before, live_after = main.live_at(body[3])
+    assert {s.name for s in live_before} == {'c'} and {s.name for s in live_after} == {'c', 'u'}
+    definitions, chains = function.def_use_chains()
+    f_body = next(d for d in ast.children[0].children if d.type == 'function_declaration').children[-1].children
+    uses = {node.statement: [use.statement for use in chains[index]]
+            for index, (node, _) in enumerate(definitions) if node.statement is not None}
+    assert uses[f_body[0]] == [f_body[1]] and uses[f_body[1]] == [f_body[3]] and uses[f_body[2]] == []
+    # b := b * 2 só alimenta uma atribuição morta: as duas são retiradas; a := 2 é global e fica
+    assert remove_dead_stores(routines) == 3
+    assert [s is None for s in body] == [True, True, False, False, False]
+    assert [s is None for s in f_body] == [False, False, True, False, False]
+    code = CodeGenerator(table).generate(ast)
+    assert "pushi 7" not in code and "pushi 5" not in code and "pushi 2" in code
+    # Blocos muito aninhados: o grafo é construído sem recursão
+    depth = sys.getrecursionlimit() * 3
+    ast = parse_code("program p; var x, y: integer; begin "
+                     + "if x > 0 then begin " * depth + "y := 1; x := 2" + " end" * depth + " end.")
+    analyzer = SemanticAnalyzer()
+    assert analyzer.analyze(ast), analyzer.errors
+    routines = build_routines(ast, analyzer.symbol_table)
+    assert variable_warnings(routines, analyzer.symbol_table) == [
+        "Aviso na linha 1: Variável 'y' recebe valores mas nunca é lida"]
+    assert remove_dead_stores(routines) == 2
+
+def test_cache_da_analise_semantica(tmp_path):
+    """Os subprogramas que não mudaram (nem os globais que usam) são lidos do cache."""
+    import os
+    from parser import parse_code
+    from semantic import SemanticAnalyzer
+    from semanticcache import SemanticCache
+    from codegen import CodeGenerator
+
+    class CountingAnalyzer(SemanticAnalyzer):
+        def analyze_compound_statement(self, compound_node):
+            self.analyzed.append(compound_node.line)
+            super().analyze_compound_statement(compound_node)
+
+    def analyze(code, cache):
+        analyzer = CountingAnalyzer(cache)
+        analyzer.analyzed = []
+        ast = parse_code(code)
+        analyzer.analyze(ast)
+        table = {key: str(symbol) for key, symbol in analyzer.symbol_table.symbols.items()}
+        return analyzer, ast, (analyzer.errors, analyzer.warnings, table)
+
+    code = """program p;
+var g: integer;
+function f(a: integer): integer;
+var t: integer;
+begin t := a + g; f := t end;
+procedure q(s: string);
+begin writeln(s, x) end;
+begin g := f(2); q('y') end."""
+    cache = SemanticCache(str(tmp_path))
+    _, _, expected = analyze(code, None)
+    assert expected[0] == ["Erro na linha 7: Variável 'x' não declarada"]
+    analyzer, _, result = analyze(code, cache)
+    assert result == expected and len(os.listdir(tmp_path)) == 2
+    # Só o bloco principal muda: os dois corpos vêm do cache, com os símbolos e as anotações
+    analyzer, ast, result = analyze(code.replace("q('y')", "q('z')"), SemanticCache(str(tmp_path)))
+    assert analyzer.analyzed == [8] and result == expected
+    f_body = ast.children[0].children[1].children[-1]
+    g_use = f_body.children[0].children[1].children[1]
+    assert g_use.symbol is analyzer.symbol_table.lookup('g') and g_use.expr_type is g_use.symbol.type
+    assert f_body.children[1].children[1].symbol is analyzer.symbol_table.root.children['f'].symbols['t']
+    assert CodeGenerator(analyzer.symbol_table).generate(ast)
+    # Mudar o tipo de g invalida só o corpo de f (que o usa)
+    changed = code.replace("g: integer", "g: real")
+    _, _, expected = analyze(changed, None)
+    analyzer, _, result = analyze(changed, SemanticCache(str(tmp_path)))
+    assert analyzer.analyzed == [5, 8] and result == expected
+    # LRU: os ficheiros usados há mais tempo saem quando o tamanho máximo é excedido
+    lru = SemanticCache(str(tmp_path / 'lru'), max_bytes=350)
+    for age, key in enumerate('abc', 1):
+        lru.store(key, bytes(100))
+        os.utime(lru.path(key), (age, age))
+    assert lru.load('a') == bytes(100)
+    lru.store('d', bytes(100))
+    assert sorted(os.listdir(tmp_path / 'lru')) == ['a.pickle', 'd.pickle']
+    # A chave depende de todos os módulos do projeto que o analisador importa
+    import ast as pyast
+    import semantic
+    import semanticcache
+    directory = os.path.dirname(semantic.__file__)
+    with open(semantic.__file__, encoding='utf-8') as f:
+        imported = {node.module for node in pyast.parse(f.read()).body if isinstance(node, pyast.ImportFrom)}
+    assert {name for name in imported if os.path.exists(os.path.join(directory, f"{name}.py"))} <= set(
+        semanticcache.ANALYZER_MODULES)
+    # Sem cache, a compilação não escreve resultados
+    path = tmp_path / 'prog.pas'
+    path.write_text(code.replace("writeln(s, x)", "writeln(s)"), encoding='utf-8')
+    with redirect_stdout(io.StringIO()):
+        assert compile_file(str(path), debug=False, use_cache=False, cache_dir=str(tmp_path / 'off'))
+        assert compile_file(str(path), debug=False, cache_dir=str(tmp_path / 'on'))
+    assert not os.path.exists(tmp_path / 'off') and len(os.listdir(tmp_path / 'on')) == 2
+    # O cache por omissão não fica junto das fontes; um diretório onde outros escrevem não é usado
+    assert not semanticcache.CACHE_DIR.startswith(directory + os.sep)
+    assert not os.stat(tmp_path / 'on').st_mode & 0o077  # Criado só para o utilizador
+    shared = tmp_path / 'shared'
+    shared.mkdir()
+    os.chmod(shared, 0o777)
+    cache = SemanticCache(str(shared))
+    assert not cache.store('k', b'x') and cache.load('k') is None and os.listdir(shared) == []
+
 if __name__ == "__main__":
     run_tests()
\ No newline at end of file
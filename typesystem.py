@@ -0,0 +1,113 @@
+# typesystem.py - Tipos do Pascal como objetos únicos (hash-consing)
+#
+# Cada tipo existe uma só vez: os tipos base são constantes do módulo e os
+# tipos compostos são criados por array_type e subprogram_type, que devolvem
+# sempre o mesmo objeto para os mesmos componentes. Dois tipos são iguais se
+# e só se forem o mesmo objeto, pelo que as comparações são por identidade.
+
+# Tipos compostos já criados: (classe, componentes) -> tipo
+_INTERNED = {}
+
+
+class Type:
+    """Tipo do Pascal. str(tipo) é o nome usado nas mensagens de erro."""
+    __slots__ = ('name', 'size')
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return f"<tipo {self.name}>"
+
+
+class BaseType(Type):
+    """Tipo simples (integer, real, boolean, string): ocupa uma posição da pilha."""
+    __slots__ = ()
+
+    def __init__(self, name):
+        self.name = name
+        self.size = 1
+
+    def __reduce__(self):
+        # Ao ser lido de um pickle volta a ser a constante do módulo
+        return base_type, (self.name,)
+
+
+class ArrayType(Type):
+    """Array de elementos de um tipo simples, com índices de start a end."""
+    __slots__ = ('element', 'start', 'end', 'stride')
+
+    def __init__(self, element, start, end):
+        self.element = element
+        self.start = start
+        self.end = end
+        self.stride = element.size                      # Posições ocupadas por elemento
+        self.size = max(end - start + 1, 0) * self.stride
+        self.name = f"array of {element}"
+
+    def __reduce__(self):
+        return array_type, (self.element, self.start, self.end)
+
+
+class SubprogramType(Type):
+    """Assinatura de uma função (result é o tipo devolvido) ou de um procedimento (result None)."""
+    __slots__ = ('params', 'result')
+
+    def __init__(self, params, result):
+        self.params = params
+        self.result = result
+        self.size = 0
+        params = ", ".join(str(param) for param in params)
+        self.name = f"function({params}): {result}" if result is not None else f"procedure({params})"
+
+    def __reduce__(self):
+        return subprogram_type, (self.params, self.result)
+
+
+INTEGER = BaseType('integer')
+REAL = BaseType('real')
+BOOLEAN = BaseType('boolean')
+STRING = BaseType('string')
+
+BASE_TYPES = {base.name: base for base in (INTEGER, REAL, BOOLEAN, STRING)}
+NUMERIC = frozenset((INTEGER, REAL))
+
+# Pares (destino, origem) de tipos diferentes em que a atribuição é permitida
+ASSIGNABLE = frozenset(((REAL, INTEGER),))
+
+
+def base_type(name):
+    """Tipo simples pelo nome (sem distinguir maiúsculas: 'Integer' é integer)."""
+    return BASE_TYPES.get(name.lower())
+
+
+def array_type(element, start, end):
+    key = (ArrayType, element, start, end)
+    array = _INTERNED.get(key)
+    if array is None:
+        array = _INTERNED.setdefault(key, ArrayType(element, start, end))
+    return array
+
+
+def subprogram_type(params, result):
+    params = tuple(params)
+    key = (SubprogramType, params, result)
+    signature = _INTERNED.get(key)
+    if signature is None:
+        signature = _INTERNED.setdefault(key, SubprogramType(params, result))
+    return signature
+
+
+def type_of(type_node):
+    """Tipo descrito por um nó type ou array_type da AST (None se não for um tipo)."""
+    if type_node.type == 'type':
+        return base_type(type_node.value)
+    if type_node.type == 'array_type':
+        start, end = type_node.value
+        return array_type(type_of(type_node.children[0]), start, end)
+    return None
+
+
+def is_assignable(target, source):
+    """Um valor do tipo source pode ser guardado numa variável do tipo target?"""
+    return target is not None and (target is source or (target, source) in ASSIGNABLE)